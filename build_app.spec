@@ -24,7 +24,12 @@ a = Analysis(
         'tracker.apps',
         'tracker.models',
         'tracker.views',
+        'tracker.async_views',
         'tracker.urls',
+        'meal_tracker.asgi',
+        'uvicorn.loops.auto',
+        'uvicorn.protocols.http.auto',
+        'uvicorn.lifespan.on',
     ],
     hookspath=[],
     hooksconfig={},
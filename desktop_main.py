@@ -1,19 +1,18 @@
+import argparse
+import importlib.util
+import logging
 import os
 import sys
+import tempfile
 import threading
 import time
 import webbrowser
+from contextlib import contextmanager
+from http.client import HTTPConnection
 
-try:
-    import webview
-except ImportError:
-    webview = None  # type: ignore
-
-try:
-    from waitress import serve
-    from django.core.wsgi import get_wsgi_application
-except ImportError as e:
-    raise ImportError("Make sure you have installed the required packages: waitress, django.") from e
+# Heavy imports (Django, waitress/uvicorn, pywebview) are deferred to the
+# phase that needs them, so startup time is spent (and logged) in one place.
+LAUNCHED = time.perf_counter()
 
 # Set up Django environment
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'meal_tracker.settings')
@@ -22,13 +21,140 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'meal_tracker.settings')
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
-# Get the WSGI application
-application = get_wsgi_application()
-APP_URL = 'http://127.0.0.1:8000/daily-meals/'
+HOST = '127.0.0.1'
+PORT = 8000
+APP_URL = f'http://{HOST}:{PORT}/daily-meals/'
+READY_TIMEOUT = 30  # seconds to wait for the server to answer
+
+# Pages fetched through the server before the window opens: the login page
+# and the start page (a redirect to login until someone signs in).
+WARM_UP_PATHS = ['/login/', '/daily-meals/']
+WARM_UP_TEMPLATES = ['login.html', 'daily_meals.html', 'dashboard.html', 'my_meals.html']
+
+log = logging.getLogger('meal_tracker.desktop')
+
+
+def configure_logging():
+    """Log to stderr, or to a file in the temp directory for the windowed build."""
+    if sys.stderr is not None:
+        handler = logging.StreamHandler()
+    else:
+        handler = logging.FileHandler(os.path.join(tempfile.gettempdir(), 'meal_tracker_desktop.log'))
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+
+@contextmanager
+def phase(name):
+    """Log how long a startup phase took, and the total since launch."""
+    started = time.perf_counter()
+    yield
+    finished = time.perf_counter()
+    log.info("%-14s %8.1f ms  (%.1f ms since launch)", name, (finished - started) * 1000, (finished - LAUNCHED) * 1000)
+
+
+def setup_django(asgi=False):
+    # Only management commands run the system checks; calling django.setup()
+    # directly keeps them (and their imports) out of the desktop startup.
+    if asgi:
+        os.environ['DJANGO_ASYNC_VIEWS'] = 'true'
+    try:
+        import django
+    except ImportError as e:
+        raise ImportError("Make sure you have installed the required packages: waitress, django.") from e
+    django.setup()
+
+
+def prepopulate_meals():
+    """Create this week's meal records up front so clicks only update rows."""
+    # Same work as `manage.py prepopulate_meals --week`, called directly because
+    # management commands aren't discoverable inside the frozen build.
+    from django.db import DatabaseError
+    from tracker import grid
+    from tracker.models import Member
+
+    try:
+        grid.prepopulate(grid.week_days(Member.get_week_start()))
+    except DatabaseError:
+        # Not migrated yet; the pages will create records on first use.
+        pass
+
+
+def create_server(asgi=False):
+    """
+    Load the application and bind the listening socket.
+
+    Returns the server's blocking ``run`` function: waitress (WSGI), or
+    uvicorn with the async views.
+    """
+    if asgi:
+        import uvicorn
+        from meal_tracker.asgi import application
+
+        server = uvicorn.Server(uvicorn.Config(application, host=HOST, port=PORT, log_level='warning'))
+        return server.run
 
+    from django.core.wsgi import get_wsgi_application
+    from waitress import create_server as create_wsgi_server
+
+    return create_wsgi_server(get_wsgi_application(), host=HOST, port=PORT).run
+
+
+def fetch(path, timeout=5):
+    """GET ``path`` from the local server; returns the status code."""
+    connection = HTTPConnection(HOST, PORT, timeout=timeout)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def wait_until_ready(timeout=READY_TIMEOUT):
+    """Poll the login page until the server answers; False on timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if fetch(WARM_UP_PATHS[0], timeout=2) < 500:
+                return True
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+
+
+def warm_up():
+    """
+    Pay the first-request costs before the window opens: compile the main
+    templates, load this week's cached grid and summary, and send the first
+    pages through the server (URL resolver, middleware, DB connection).
+    """
+    from django.conf import settings
+    from django.db import DatabaseError
+    from django.template.loader import get_template
+    from tracker import caching
+    from tracker.models import Member
 
-def run_server():
-    serve(application, host='127.0.0.1', port=8000)
+    for name in WARM_UP_TEMPLATES:
+        get_template(name)
+    try:
+        week_start = Member.get_week_start()
+        if settings.DAILY_MEALS_CLIENT_RENDER:
+            caching.week_grid(week_start)
+        else:
+            caching.week_matrix(week_start)
+        caching.week_summary(week_start)
+    except DatabaseError:
+        pass
+    for path in WARM_UP_PATHS:
+        try:
+            fetch(path)
+        except OSError:
+            pass
 
 
 def open_ui():
@@ -36,6 +162,11 @@ def open_ui():
     Try to open the app in an embedded window (pywebview if available),
     otherwise fall back to the default browser and keep the process alive.
     """
+    try:
+        import webview
+    except ImportError:
+        webview = None  # type: ignore
+
     if webview is not None:
         try:
             webview.create_window('Meal Tracker', APP_URL)
@@ -54,9 +185,30 @@ def open_ui():
 
 
 if __name__ == '__main__':
-    # Start the server in a separate thread
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Run Meal Tracker in a desktop window.")
+    parser.add_argument('--asgi', action='store_true',
+                        help="Serve over ASGI with uvicorn and the async views.")
+    args = parser.parse_args()
+    if args.asgi and importlib.util.find_spec('uvicorn') is None:
+        parser.error("--asgi needs uvicorn; install it with `pip install uvicorn`.")
+
+    with phase('django setup'):
+        setup_django(args.asgi)
+    with phase('prepopulate'):
+        prepopulate_meals()
+    with phase('load app'):
+        run_server = create_server(args.asgi)
+
+    # Serve from a daemon thread; the UI owns the main thread
     t = threading.Thread(target=run_server)
     t.daemon = True
     t.start()
 
+    with phase('server ready'):
+        if not wait_until_ready():
+            log.warning("Server did not answer within %s s; opening the window anyway.", READY_TIMEOUT)
+    with phase('warm-up'):
+        warm_up()
+
     open_ui()
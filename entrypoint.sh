@@ -4,6 +4,9 @@ set -e
 # Run database migrations
 python manage.py migrate --noinput
 
+# Create the cache table (no-op unless DJANGO_CACHE_BACKEND=db)
+python manage.py createcachetable
+
 # Collect static files (can be skipped with COLLECTSTATIC=0)
 if [ "${COLLECTSTATIC:-1}" = "1" ]; then
   python manage.py collectstatic --noinput
@@ -2,6 +2,8 @@
 ASGI config for meal_tracker project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests under ``STATIC_URL`` are answered by WhiteNoise (run in a thread);
+everything else goes to Django with the async views enabled.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -9,8 +11,27 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from whitenoise import WhiteNoise
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'meal_tracker.settings')
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', 'true')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+def _not_found(environ, start_response):
+    start_response('404 Not Found', [('Content-Type', 'text/plain')])
+    return [b'Not Found']
+
+
+static_application = WsgiToAsgi(WhiteNoise(_not_found, root=settings.STATIC_ROOT, prefix=settings.STATIC_URL))
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+        await static_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
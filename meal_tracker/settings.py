@@ -58,6 +58,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracker.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -68,6 +69,20 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-route request metrics, exposed to staff at /metrics/ (Prometheus format)
+METRICS_ENABLED = env_bool('DJANGO_METRICS', True)
+
+# Async variants of the busiest views (my_meals, daily_meals, dashboard).
+# meal_tracker/asgi.py turns this on; under ASGI static files are served by a
+# WhiteNoise app in front of Django so every middleware can stay async.
+ASYNC_VIEWS = env_bool('DJANGO_ASYNC_VIEWS', False)
+if ASYNC_VIEWS:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+# daily_meals renders its grid in the browser from /daily-meals/grid/ (compact
+# JSON); False, or ?render=server on the page, renders it in the template.
+DAILY_MEALS_CLIENT_RENDER = env_bool('DJANGO_DAILY_MEALS_CLIENT_RENDER', True)
+
 ROOT_URLCONF = 'meal_tracker.urls'
 
 TEMPLATES = [
@@ -100,16 +115,106 @@ if os.environ.get('DB_ENGINE'):
             'PASSWORD': os.environ.get('DB_PASSWORD', ''),
             'HOST': os.environ.get('DB_HOST', 'db'),
             'PORT': os.environ.get('DB_PORT', '5432'),
+            # Keep each worker thread's connection open between requests
+            # (seconds; 0 closes it after every request).
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
         }
     }
+
+    # Pooled mode (psycopg 3 only): threads borrow connections from a shared
+    # pool for each request instead of owning one. Django requires
+    # CONN_MAX_AGE=0 with a pool.
+    if env_bool('DB_POOL', False):
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            },
+        }
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            'NAME': os.environ.get('DJANGO_SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
         }
     }
 
+    # Tuned SQLite profile for several threads writing at once (opt-in).
+    # WAL lets readers run alongside the writer, synchronous=NORMAL only
+    # fsyncs at checkpoints (safe with WAL), and IMMEDIATE transactions take
+    # the write lock up front so contending writers queue on busy_timeout
+    # instead of failing with "database is locked".
+    if env_bool('DJANGO_SQLITE_TUNED', False):
+        DATABASES['default'].update({
+            'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA busy_timeout=10000;'
+                    'PRAGMA mmap_size=134217728;'
+                    'PRAGMA cache_size=-32000;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        })
+
+
+# Optional read replica for the reporting pages (dashboard, exports, admin
+# changelists); see tracker/routers.py. Writes, and reads right after a write,
+# stay on the primary. Postgres: DB_REPLICA_HOST (plus DB_REPLICA_PORT/NAME/
+# USER/PASSWORD, defaulting to the primary's). SQLite: DJANGO_SQLITE_REPLICA_PATH,
+# e.g. a copy of db.sqlite3 for local testing.
+REPLICA_MAX_LAG = int(os.environ.get('DB_REPLICA_MAX_LAG', 5))  # seconds
+
+replica_database = None
+if os.environ.get('DB_ENGINE') and os.environ.get('DB_REPLICA_HOST'):
+    replica_database = dict(DATABASES['default'], HOST=os.environ['DB_REPLICA_HOST'])
+    for key in ('PORT', 'NAME', 'USER', 'PASSWORD'):
+        replica_database[key] = os.environ.get(f'DB_REPLICA_{key}', replica_database[key])
+elif not os.environ.get('DB_ENGINE') and os.environ.get('DJANGO_SQLITE_REPLICA_PATH'):
+    replica_database = dict(DATABASES['default'], NAME=os.environ['DJANGO_SQLITE_REPLICA_PATH'])
+
+if replica_database:
+    DATABASES['replica'] = dict(replica_database, TEST={'MIRROR': 'default'})
+    DATABASE_ROUTERS = ['tracker.routers.ReplicaRouter']
+    MIDDLEWARE.insert(1, 'tracker.routers.ReplicaRoutingMiddleware')
+
+# Cache (weekly dashboard summaries and daily meal grids)
+# DJANGO_CACHE_BACKEND: 'locmem' (single process, default), 'file' or 'db'
+# (shared between workers; run `manage.py createcachetable` for 'db').
+# DJANGO_CACHE_LOCATION overrides the directory or table; left empty, the
+# backend's default below is used.
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'meal-tracker'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'tracker_cache'),
+}
+cache_backend, cache_location = CACHE_BACKENDS[os.environ.get('DJANGO_CACHE_BACKEND', 'locmem').lower()]
+CACHES = {
+    'default': {
+        'BACKEND': cache_backend,
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION') or cache_location,
+        'TIMEOUT': int(os.environ.get('DJANGO_CACHE_TIMEOUT', '3600')),
+    }
+}
+TRACKER_CACHE_TIMEOUT = CACHES['default']['TIMEOUT']
+
+# `manage.py archive_meals` moves meal records of months older than this into
+# the archive and compacts them into monthly summaries (see tracker/archive.py).
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('DJANGO_ARCHIVE_AFTER_MONTHS', '12'))
+
+# How live meal attendance is stored: 'rows' (one MealRecord per member and
+# day) or 'weeks' (one MealWeek bitmask row per member and week). Move the data
+# with `manage.py convert_meal_storage` when changing it (see tracker/storage.py).
+MEAL_STORAGE = os.environ.get('DJANGO_MEAL_STORAGE', 'rows')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
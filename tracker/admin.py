@@ -1,9 +1,25 @@
 from django.contrib import admin
-from .models import Member, MealPrice, MealRecord, Payment
+from .models import ArchivedMealRecord, MealWeek, Member, MealPrice, MealRecord, MonthlyMealSummary, Payment, WeeklyLedger
+from .routers import reporting
+from .storage import get_storage
+
+
+class ReportingModelAdmin(admin.ModelAdmin):
+    """Read changelist pages from the replica, when one is configured."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':  # bulk actions and list edits write
+            return super().changelist_view(request, extra_context)
+        with reporting():
+            response = super().changelist_view(request, extra_context)
+            # The rows are only queried while the template renders.
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 
 @admin.register(Member)
-class MemberAdmin(admin.ModelAdmin):
+class MemberAdmin(ReportingModelAdmin):
     list_display = ['serial_number', 'name', 'user', 'is_active', 'created_at']
     list_filter = ['is_active']
     search_fields = ['name', 'user__username']
@@ -12,23 +28,108 @@ class MemberAdmin(admin.ModelAdmin):
 
 
 @admin.register(MealPrice)
-class MealPriceAdmin(admin.ModelAdmin):
+class MealPriceAdmin(ReportingModelAdmin):
     list_display = ['date', 'price_per_meal', 'created_at']
     list_filter = ['date']
     ordering = ['-date']
 
 
 @admin.register(MealRecord)
-class MealRecordAdmin(admin.ModelAdmin):
+class MealRecordAdmin(ReportingModelAdmin):
     list_display = ['member', 'date', 'ate_meal', 'meal_count']
     list_filter = ['date', 'ate_meal', 'member']
     search_fields = ['member__name']
     ordering = ['-date', 'member__serial_number']
 
+    # With the 'weeks' storage the meal pages, billing and exports read
+    # MealWeek; rows edited here would be ignored, so only leftovers are shown.
+    def _is_live(self):
+        return get_storage().model is MealRecord
+
+    def has_add_permission(self, request):
+        return self._is_live() and super().has_add_permission(request)
+
+    def has_change_permission(self, request, obj=None):
+        return self._is_live() and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return self._is_live() and super().has_delete_permission(request, obj)
+
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ReportingModelAdmin):
     list_display = ['member', 'amount', 'payment_date', 'note']
     list_filter = ['payment_date', 'member']
     search_fields = ['member__name', 'note']
     ordering = ['-payment_date']
+
+
+@admin.register(WeeklyLedger)
+class WeeklyLedgerAdmin(ReportingModelAdmin):
+    list_display = ['member', 'week_start', 'meals', 'bill', 'paid', 'updated_at']
+    list_filter = ['week_start']
+    search_fields = ['member__name']
+    ordering = ['-week_start', 'member__serial_number']
+
+    # Rows are derived data; rebuild them with `manage.py rebuild_ledger`.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MonthlyMealSummary)
+class MonthlyMealSummaryAdmin(ReportingModelAdmin):
+    list_display = ['member', 'month', 'meals', 'bill']
+    list_filter = ['month']
+    search_fields = ['member__name']
+    ordering = ['-month', 'member__serial_number']
+
+    # Rows are written (and only ever replaced) by `manage.py archive_meals`.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedMealRecord)
+class ArchivedMealRecordAdmin(ReportingModelAdmin):
+    list_display = ['member', 'date', 'ate_meal', 'meal_count']
+    list_filter = ['date', 'ate_meal']
+    search_fields = ['member__name']
+    ordering = ['-date', 'member__serial_number']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MealWeek)
+class MealWeekAdmin(ReportingModelAdmin):
+    list_display = ['member', 'week_start', 'present_mask', 'ate_mask', 'meal_counts']
+    list_filter = ['week_start']
+    search_fields = ['member__name']
+    ordering = ['-week_start', 'member__serial_number']
+
+    # Bits are changed through the meal pages, which keep derived data in step.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,176 @@
+"""
+Archival of old meal records.
+
+``MealRecord`` grows by one row per member per day. ``archive_before`` moves
+every record dated before a month boundary into ``ArchivedMealRecord`` and
+compacts each member's month into a ``MonthlyMealSummary`` (meals eaten and
+the exact bill), recording each month as an ``ArchivedMonth``. Archiving is
+contiguous: everything before ``archive_boundary()`` is archived, and those
+dates are read-only (``check_live``).
+
+``billing.meal_totals`` reads whole archived months from the summaries and
+partial months from the archived rows, so the ledger, balances and
+statements come out the same before and after archiving. A price change in
+an archived month re-bills the summaries from that month on (``reprice``).
+
+Like the price index, each process caches the boundary under a version
+counter in the shared cache, which ``archive_before`` bumps.
+"""
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import ArchivedMealRecord, ArchivedMonth, MonthlyMealSummary
+from .pricing import ZERO, price_expression
+from .storage import get_storage
+
+BATCH_SIZE = 2000
+
+VERSION_KEY = 'tracker:version:archive'
+
+# ``(version, boundary)``: the boundary and the shared version it was loaded at.
+_loaded = None
+
+
+class ArchivedDateError(ValueError):
+    """A meal change falls in an archived month."""
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def archive_boundary():
+    """First day that is not archived, or ``None`` when nothing is (cached)."""
+    global _loaded
+    from .caching import shared_version
+
+    version = shared_version(VERSION_KEY)
+    loaded = _loaded
+    if loaded is None or loaded[0] != version:
+        last = ArchivedMonth.objects.aggregate(last=Max('month'))['last']
+        loaded = _loaded = (version, next_month(last) if last else None)
+    return loaded[1]
+
+
+def invalidate_boundary():
+    """Make every process's cached boundary stale."""
+    global _loaded
+    from .caching import bump_version
+
+    _loaded = None
+    bump_version(VERSION_KEY)
+
+
+def default_boundary(today=None):
+    """The month boundary ``settings.ARCHIVE_AFTER_MONTHS`` months before this month."""
+    boundary = month_start(today or date.today())
+    for _ in range(getattr(settings, 'ARCHIVE_AFTER_MONTHS', 12)):
+        boundary = month_start(boundary - timedelta(days=1))
+    return boundary
+
+
+def check_live(days):
+    """Raise ``ArchivedDateError`` if any of ``days`` is archived."""
+    boundary = archive_boundary()
+    if boundary and days and min(days) < boundary:
+        raise ArchivedDateError(f"Meals before {boundary:%b %d, %Y} are archived and can't be changed.")
+
+
+def first_meal_date():
+    """Date of the first meal record, archived or live."""
+    return (
+        ArchivedMealRecord.objects.aggregate(first=Min('date'))['first']
+        or get_storage().first_date()
+    )
+
+
+def last_meal_date():
+    """Date of the last meal record, live or archived."""
+    return (
+        get_storage().last_date()
+        or ArchivedMealRecord.objects.aggregate(last=Max('date'))['last']
+    )
+
+
+def _summarize(start_date, end_date):
+    """Recompute the summaries of the archived months in ``[start_date, end_date)``."""
+    rows = (
+        ArchivedMealRecord.objects.filter(date__gte=start_date, date__lt=end_date, ate_meal=True)
+        .order_by()
+        .values('member_id', month=TruncMonth('date'))
+        .annotate(meals=Count('id'), bill=Sum(price_expression(start_date, end_date - timedelta(days=1))))
+    )
+    summaries = [
+        MonthlyMealSummary(member_id=row['member_id'], month=row['month'], meals=row['meals'], bill=row['bill'] or ZERO)
+        for row in rows
+    ]
+    MonthlyMealSummary.objects.filter(month__gte=start_date, month__lt=end_date).delete()
+    MonthlyMealSummary.objects.bulk_create(summaries, batch_size=BATCH_SIZE)
+
+
+def archive_before(boundary):
+    """
+    Archive every meal record dated before ``boundary`` (rounded down to the
+    first of its month). Returns the number of records moved.
+    """
+    from . import caching
+
+    storage = get_storage()
+    boundary = month_start(boundary)
+    with transaction.atomic():
+        last = ArchivedMonth.objects.aggregate(last=Max('month'))['last']
+        first = storage.first_date(before=boundary)
+        starts = [day for day in (next_month(last) if last else None, first and month_start(first)) if day]
+        if not starts or min(starts) >= boundary:
+            return 0
+
+        moved = 0
+        month = min(starts)
+        while month < boundary:
+            # ``take`` sends no signals: the totals don't change, so the ledger
+            # and checkpoints stay valid.
+            rows = [
+                ArchivedMealRecord(
+                    member_id=record.member_id,
+                    date=record.date,
+                    ate_meal=record.ate_meal,
+                    meal_count=record.meal_count,
+                    created_at=record.created_at
+                )
+                for record in storage.take(month, next_month(month))
+            ]
+            # A live row in an already archived month replaces the archived one.
+            ArchivedMealRecord.objects.bulk_create(
+                rows,
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['member', 'date'],
+                update_fields=['ate_meal', 'meal_count']
+            )
+            archived, created = ArchivedMonth.objects.get_or_create(month=month, defaults={'records': len(rows)})
+            if not created and rows:
+                archived.records += len(rows)
+                archived.save(update_fields=['records'])
+            moved += len(rows)
+            month = next_month(month)
+
+        _summarize(min(starts), boundary)
+        invalidate_boundary()
+        transaction.on_commit(invalidate_boundary)
+        caching.invalidate_all()
+    return moved
+
+
+def reprice(since):
+    """Re-bill the archived months from ``since`` on after a price change."""
+    boundary = archive_boundary()
+    if boundary and since < boundary:
+        _summarize(month_start(since), boundary)
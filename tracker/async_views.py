@@ -0,0 +1,128 @@
+"""
+Async variants of the busiest views, used when serving over ASGI.
+
+``tracker.urls`` routes ``my_meals``, ``daily_meals`` (with its JSON grid and
+change feed) and ``dashboard`` here when ``settings.ASYNC_VIEWS`` is on (see
+``meal_tracker/asgi.py``). Simple lookups use the async ORM; cached summaries
+and the transactional meal writes run through ``sync_to_async`` like the
+ORM's own async methods. Page logic and templates are shared with
+``tracker.views``. The change feed can long-poll here, since a waiting
+request doesn't hold a worker thread.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+
+from . import feed, grid, views
+from .archive import ArchivedDateError
+from .models import MealRecord, Member
+from .routers import reporting_view
+
+
+async def _auser(request):
+    """Resolve the user asynchronously and pin it on ``request.user`` for templates."""
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def _redirect_non_staff(request):
+    user = await _auser(request)
+    return None if user.is_staff else views._redirect_non_staff(request)
+
+
+@login_required
+async def my_meals(request):
+    """Async ``views.my_meals``: same page, ETag revalidation and 10:30 AM lock."""
+    user = await _auser(request)
+    member = await Member.objects.filter(user=user).afirst()
+    today = timezone.localdate()
+    _, _, locked = views._meal_deadline()
+
+    if request.method == 'POST':
+        decision = views._my_meals_decision(request, member, locked)
+        if decision is None:
+            return redirect('my_meals')
+        return views._my_meals_saved(request, await MealRecord.objects.aset_meal(member, today, decision == 'eat'))
+
+    etag = await sync_to_async(views._my_meals_etag_for)(request, member)
+    etag = quote_etag(etag) if etag else None
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        context = await sync_to_async(views._my_meals_context)(member, today)
+        response = views._my_meals_response(request, context)
+    if etag and request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+@login_required
+@reporting_view
+async def dashboard(request):
+    """Async ``views.dashboard``."""
+    redirect_resp = await _redirect_non_staff(request)
+    if redirect_resp:
+        return redirect_resp
+
+    return render(request, 'dashboard.html', await sync_to_async(views._dashboard_context)())
+
+
+@login_required
+async def daily_meals(request):
+    """Async ``views.daily_meals``; the toggle is a single awaited upsert."""
+    redirect_resp = await _redirect_non_staff(request)
+    if redirect_resp:
+        return redirect_resp
+
+    if request.method == 'POST':
+        cell = views._toggle_cell(request)
+        if cell:
+            member = await aget_object_or_404(Member, id=cell[0])
+            try:
+                ate_meal = await MealRecord.objects.atoggle_meal(member, cell[1])
+            except ArchivedDateError as exc:
+                return views._toggle_refused(request, exc)
+            return views._toggled(request, member, cell[1], ate_meal)
+
+    context = await sync_to_async(views._daily_meals_context)(request)
+    return render(request, 'daily_meals.html', context)
+
+
+@login_required
+async def daily_meals_grid(request):
+    """Async ``views.daily_meals_grid``."""
+    user = await _auser(request)
+    if not user.is_staff:
+        return JsonResponse({'success': False, 'error': "Admin access required."}, status=403)
+    try:
+        week_start = views._requested_week(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': "Expected week=<Saturday>."}, status=400)
+    return JsonResponse(await sync_to_async(views._daily_meals_grid)(week_start))
+
+
+@login_required
+async def daily_meals_changes(request):
+    """
+    Async ``views.daily_meals_changes`` with long polling: with ``wait`` the
+    request stays open, checking the feed every ``feed.POLL_INTERVAL``
+    seconds, until a newer version appears or ``wait`` seconds have passed.
+    """
+    await _auser(request)
+    parsed = views._meal_changes_request(request)
+    if isinstance(parsed, JsonResponse):
+        return parsed
+    since, week_start, wait = parsed
+    days = grid.week_days(week_start)
+    deadline = time.monotonic() + wait
+    while True:
+        changes = await sync_to_async(feed.changes_since)(since, days)
+        if changes['version'] > since or changes['reset'] or time.monotonic() >= deadline:
+            return JsonResponse({'success': True, **changes})
+        await asyncio.sleep(min(feed.POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
@@ -0,0 +1,147 @@
+"""
+Running balances backed by ``BalanceCheckpoint`` rows.
+
+A checkpoint stores a member's cumulative billed and paid totals for
+everything before the first day of a month. "Balance as of D" reads the
+checkpoint for D's month and adds the meals and payments between that
+boundary and D, so the cost is bounded by one month of data no matter how
+much history exists. Missing checkpoints are built on demand from the
+latest earlier one; ``invalidate`` drops the checkpoints a change makes stale.
+
+Checkpoints are built on the read path, so a build locks its members the way
+ledger writers do (``ledger.lock_members``) before reading their history: a
+back-dated change to one of them either commits before the build reads, or
+waits until the built checkpoint is committed and then drops it.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .archive import first_meal_date
+from .billing import ZERO, meal_totals, paid_totals
+from .ledger import lock_members
+from .models import BalanceCheckpoint, Member, Payment
+from .routers import primary
+
+
+def period_start(day):
+    """Checkpoint boundary at or before ``day`` (first of its month)."""
+    return day.replace(day=1)
+
+
+def _next_period(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _range_totals(member_ids, start_date, end_date):
+    """``{member_id: (billed, paid)}`` for activity between the dates (inclusive)."""
+    if end_date < start_date:
+        return {}
+    meals = meal_totals(member_ids, start_date, end_date)
+    paid = paid_totals(member_ids, start_date, end_date)
+    return {
+        member_id: (meals.get(member_id, (0, ZERO))[1], paid.get(member_id, ZERO))
+        for member_id in meals.keys() | paid.keys()
+    }
+
+
+def _build(member_ids, boundary):
+    """Create checkpoints at ``boundary`` for members that don't have one yet."""
+    latest = dict(
+        BalanceCheckpoint.objects.filter(member_id__in=member_ids, as_of__lt=boundary)
+        .order_by()
+        .values('member_id')
+        .annotate(last=Max('as_of'))
+        .values_list('member_id', 'last')
+    )
+    bases = {}
+    if latest:
+        for checkpoint in BalanceCheckpoint.objects.filter(
+            member_id__in=list(latest),
+            as_of__in=set(latest.values())
+        ).order_by():
+            if latest[checkpoint.member_id] == checkpoint.as_of:
+                bases[checkpoint.member_id] = checkpoint
+
+    # Members sharing the same previous checkpoint are aggregated together.
+    groups = defaultdict(list)
+    for member_id in member_ids:
+        groups[latest.get(member_id, date.min)].append(member_id)
+
+    checkpoints = []
+    for start_date, group in groups.items():
+        delta = _range_totals(group, start_date, boundary - timedelta(days=1))
+        for member_id in group:
+            base = bases.get(member_id)
+            billed, paid = delta.get(member_id, (ZERO, ZERO))
+            checkpoints.append(BalanceCheckpoint(
+                member_id=member_id,
+                as_of=boundary,
+                billed=billed + (base.billed if base else ZERO),
+                paid=paid + (base.paid if base else ZERO)
+            ))
+
+    BalanceCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+    return {checkpoint.member_id: checkpoint for checkpoint in checkpoints}
+
+
+def balances_as_of(members, day):
+    """
+    Return ``{member_id: (billed, paid)}`` covering everything up to ``day``.
+
+    ``members`` is an iterable of members or member ids.
+    """
+    member_ids = [getattr(member, 'pk', member) for member in members]
+    if not member_ids:
+        return {}
+
+    boundary = period_start(day)
+    checkpoints = {
+        checkpoint.member_id: checkpoint
+        for checkpoint in BalanceCheckpoint.objects.filter(member_id__in=member_ids, as_of=boundary).order_by()
+    }
+    missing = [member_id for member_id in member_ids if member_id not in checkpoints]
+    if missing:
+        # Stored checkpoints must not come from a lagging replica, nor from
+        # history a concurrent back-dated change is rewriting.
+        with primary(), transaction.atomic():
+            lock_members(sorted(missing))
+            checkpoints.update(_build(missing, boundary))
+
+    delta = _range_totals(member_ids, boundary, day)
+    balances = {}
+    for member_id in member_ids:
+        checkpoint = checkpoints[member_id]
+        billed, paid = delta.get(member_id, (ZERO, ZERO))
+        balances[member_id] = (checkpoint.billed + billed, checkpoint.paid + paid)
+    return balances
+
+
+def invalidate(since, member_ids=None):
+    """Drop checkpoints that include activity on or after ``since``."""
+    stale = BalanceCheckpoint.objects.filter(as_of__gt=since)
+    if member_ids is not None:
+        stale = stale.filter(member_id__in=member_ids)
+    stale.delete()
+
+
+def rebuild(until=None):
+    """Recreate checkpoints at every month boundary from the first activity to ``until``."""
+    until = until or date.today()
+    first_meal = first_meal_date()
+    first_payment = Payment.objects.aggregate(first=Min('payment_date'))['first']
+    candidates = [day for day in (first_meal, first_payment) if day]
+
+    with transaction.atomic():
+        BalanceCheckpoint.objects.all().delete()
+        if not candidates:
+            return 0
+        member_ids = list(Member.objects.values_list('id', flat=True))
+        lock_members()
+        boundary = _next_period(min(candidates))
+        while boundary <= period_start(until):
+            _build(member_ids, boundary)
+            boundary = _next_period(boundary)
+    return BalanceCheckpoint.objects.count()
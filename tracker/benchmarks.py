@@ -0,0 +1,128 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks run against a throwaway test database (never the configured one)
+and write their results as JSON so runs can be compared across commits.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+
+def summarize(samples):
+    """Latency statistics (milliseconds) for a list of durations in seconds."""
+    ordered = sorted(samples)
+    ms = [sample * 1000 for sample in ordered]
+    return {
+        'runs': len(ms),
+        'min_ms': round(ms[0], 3),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'median_ms': round(statistics.median(ms), 3),
+        'p95_ms': round(ms[min(int(len(ms) * 0.95), len(ms) - 1)], 3),
+        'p99_ms': round(ms[min(int(len(ms) * 0.99), len(ms) - 1)], 3),
+        'max_ms': round(ms[-1], 3),
+    }
+
+
+def time_call(func, repeat=5, warmup=1, before=None):
+    """
+    Time ``func`` ``repeat`` times after ``warmup`` untimed calls.
+
+    ``before``, if given, runs (untimed) ahead of every timed call, e.g. to
+    empty a cache. Returns latency statistics plus the number of queries of
+    the last call.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+    result = summarize(samples)
+    result['queries'] = len(queries.captured_queries)
+    return result
+
+
+@contextmanager
+def scratch_database(keepdb=False):
+    """Run the block against a freshly created test database."""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def run_manage(env, *args):
+    """Run ``manage.py`` in a subprocess with ``env``; returns its stdout."""
+    completed = subprocess.run(
+        [sys.executable, str(settings.BASE_DIR / 'manage.py'), *args],
+        env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+    )
+    if completed.returncode:
+        raise CommandError(f"manage.py {args[0]} failed:\n{completed.stderr}")
+    return completed.stdout
+
+
+@contextmanager
+def scratch_sqlite(**environ):
+    """
+    Environment for subprocesses that use a fresh, migrated SQLite file.
+
+    For benchmarks that need several processes (servers, settings profiles)
+    and so can't share an in-memory test database.
+    """
+    if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3':
+        raise CommandError("This benchmark runs on a scratch SQLite database; unset DB_ENGINE.")
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DJANGO_SQLITE_PATH=str(Path(tmp) / 'bench.sqlite3'), DJANGO_DEBUG='false')
+        env.update(environ)
+        run_manage(env, 'migrate')
+        yield env
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, benchmark, results, **extra):
+    """Write benchmark results with enough context to compare runs."""
+    report = {
+        'benchmark': benchmark,
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        **extra,
+        'results': results,
+    }
+    Path(path).write_text(json.dumps(report, indent=2, default=str))
+    return report
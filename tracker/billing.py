@@ -0,0 +1,161 @@
+"""
+Set-based billing for weekly summaries.
+
+Everything here works on many members at once and issues a fixed number of
+aggregate queries, no matter how many members or meals are involved. Prices
+come from the in-process price index, so a day without its own ``MealPrice``
+row is billed at the most recent earlier price. Weekly meals and bills are
+read from the ``WeeklyLedger`` table maintained by ``tracker.ledger``.
+Archived months (see ``tracker.archive``) are read from their monthly
+summaries and archived rows.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, Q, Sum
+
+from .archive import archive_boundary, month_start, next_month
+from .models import ArchivedMealRecord, Member, MonthlyMealSummary, Payment, WeeklyLedger
+from .pricing import ZERO, price_expression
+from .storage import get_storage
+
+
+def week_end(week_start):
+    """Last day (Friday) of the week starting on ``week_start``."""
+    return week_start + timedelta(days=6)
+
+
+def meal_totals(members, start_date, end_date):
+    """
+    Return ``{member_id: (meals, bill)}`` for meals eaten between the dates.
+
+    ``members`` may be a queryset (used as a subquery) or an iterable of
+    members/ids. Members without meals in the range are absent from the result.
+    Days before the archive boundary add their archived meals.
+    """
+    totals = get_storage().totals(members, start_date, end_date)
+
+    boundary = archive_boundary()
+    if boundary and start_date < boundary:
+        archived_end = min(end_date, boundary - timedelta(days=1))
+        for member_id, (meals, bill) in _archived_totals(members, start_date, archived_end).items():
+            live_meals, live_bill = totals.get(member_id, (0, ZERO))
+            totals[member_id] = (live_meals + meals, live_bill + bill)
+    return totals
+
+
+def _archived_totals(members, start_date, end_date):
+    """
+    ``meal_totals`` for archived days: whole months from ``MonthlyMealSummary``
+    and the partial months at either end from ``ArchivedMealRecord``.
+    """
+    if end_date < start_date:
+        return {}
+    full_start = start_date if start_date.day == 1 else next_month(start_date)
+    full_end = month_start(end_date + timedelta(days=1))  # exclusive
+
+    totals = {}
+    partial = Q()
+    if full_start < full_end:
+        summaries = (
+            MonthlyMealSummary.objects.filter(member__in=members, month__gte=full_start, month__lt=full_end)
+            .order_by()
+            .values('member_id')
+            .annotate(meals=Sum('meals'), bill=Sum('bill'))
+        )
+        totals = {row['member_id']: (row['meals'], row['bill'] or ZERO) for row in summaries}
+        if start_date < full_start:
+            partial |= Q(date__lt=full_start)
+        if full_end <= end_date:
+            partial |= Q(date__gte=full_end)
+    else:
+        partial = Q(date__gte=start_date)
+
+    if partial:
+        rows = (
+            ArchivedMealRecord.objects.filter(
+                partial,
+                member__in=members,
+                date__gte=start_date,
+                date__lte=end_date,
+                ate_meal=True
+            )
+            .order_by()
+            .values('member_id')
+            .annotate(meals=Count('id'), bill=Sum(price_expression(start_date, end_date)))
+        )
+        for row in rows:
+            meals, bill = totals.get(row['member_id'], (0, ZERO))
+            totals[row['member_id']] = (meals + row['meals'], bill + (row['bill'] or ZERO))
+    return totals
+
+
+def week_totals(members, week_start):
+    """
+    Return ``{member_id: (meals, bill)}`` for one week.
+
+    Saturday-aligned weeks are read from the ``WeeklyLedger`` table; any other
+    7-day window is aggregated from the raw meal records.
+    """
+    if week_start != Member.get_week_start(week_start):
+        return meal_totals(members, week_start, week_end(week_start))
+
+    rows = WeeklyLedger.objects.filter(
+        member__in=members,
+        week_start=week_start
+    ).order_by().values_list('member_id', 'meals', 'bill')
+    return {member_id: (meals, bill) for member_id, meals, bill in rows}
+
+
+def paid_totals(members, start_date=None, end_date=None):
+    """
+    Return ``{member_id: total_paid}`` for payments between the dates.
+
+    Without dates this covers each member's whole payment history.
+    """
+    payments = Payment.objects.filter(member__in=members)
+    if start_date:
+        payments = payments.filter(payment_date__gte=start_date)
+    if end_date:
+        payments = payments.filter(payment_date__lte=end_date)
+
+    rows = payments.order_by().values('member_id').annotate(total=Sum('amount'))
+    return {row['member_id']: row['total'] or ZERO for row in rows}
+
+
+def weekly_summary(members, week_start):
+    """
+    Summarize one week for every member.
+
+    ``meals`` and ``total_bill`` cover the week itself; ``paid`` and
+    ``unpaid`` are the running totals at the end of the week (everything
+    paid, and everything billed minus paid, up to Friday). Returns a list of
+    dicts in the order of ``members``.
+    """
+    from .balances import balances_as_of
+
+    member_list = list(members)
+    if not member_list:
+        return []
+
+    totals = week_totals(members, week_start)
+    balances = balances_as_of(member_list, week_end(week_start))
+
+    summary = []
+    for member in member_list:
+        meals, bill = totals.get(member.pk, (0, ZERO))
+        billed_to_date, paid_to_date = balances[member.pk]
+        summary.append({
+            'member': member,
+            'serial': member.serial_number,
+            'name': member.name,
+            'meals': meals,
+            'total_bill': bill,
+            'paid': paid_to_date,
+            'unpaid': billed_to_date - paid_to_date,
+        })
+    return summary
+
+
+def member_summary(member, week_start):
+    """Weekly summary for a single member (same shape as ``weekly_summary`` rows)."""
+    return weekly_summary([member], week_start)[0]
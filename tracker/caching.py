@@ -0,0 +1,167 @@
+"""
+Versioned cache for the weekly dashboard summary and the daily meals grid
+(rendered rows and the compact JSON form).
+
+Cached values are keyed by the week (or member) plus version counters stored
+in the cache itself:
+
+* a per-week version, bumped when a ``MealRecord`` or ``Payment`` dated in
+  that week changes;
+* a per-member version, bumped when one of the member's meals or payments
+  changes (used by ``my_meals`` and its ETag);
+* a global version, bumped when a ``Member`` or ``MealPrice`` changes, or when
+  a meal/payment dated before the current week changes (running balances of
+  every later week move with it).
+
+Bumping a version makes old entries unreachable; they simply expire. Because
+the versions live in Django's cache, this works per process with the
+local-memory backend and across workers with the file or database backends.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import routers
+from .models import Member
+
+GLOBAL_VERSION_KEY = 'tracker:version:global'
+
+
+def _week_version_key(week_start):
+    return f'tracker:version:week:{week_start.isoformat()}'
+
+
+def _timeout():
+    return getattr(settings, 'TRACKER_CACHE_TIMEOUT', 3600)
+
+
+def _member_version_key(member_id):
+    return f'tracker:version:member:{member_id}'
+
+
+def _versions(key):
+    """Return ``(global_version, version of key)``, seeding missing counters."""
+    versions = cache.get_many([GLOBAL_VERSION_KEY, key])
+    for missing in (GLOBAL_VERSION_KEY, key):
+        if missing not in versions:
+            # Seed from the clock so a counter that was evicted never repeats.
+            cache.add(missing, time.time_ns(), timeout=None)
+            versions[missing] = cache.get(missing)
+    return versions[GLOBAL_VERSION_KEY], versions[key]
+
+
+def member_versions(member_id):
+    """``(global_version, member_version)`` identifying one member's data."""
+    return _versions(_member_version_key(member_id))
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def shared_version(key):
+    """
+    Current value of the version counter ``key``, seeding it if missing.
+
+    For state that processes keep in memory (the price index, the archive
+    boundary): a process reloads its copy when the version it was loaded at
+    is no longer current, so a change in one worker reaches the others
+    through the shared cache backend.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    """Move the counter ``key`` on, making copies loaded at older versions stale."""
+    _bump(key)
+
+
+def _bump_now_and_on_commit(key):
+    # Bump again after commit so a reader that cached pre-commit data under
+    # the first bump is invalidated too.
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def invalidate_all():
+    """Invalidate every cached week."""
+    _bump_now_and_on_commit(GLOBAL_VERSION_KEY)
+
+
+def invalidate_cells(cells):
+    """Invalidate the members and weeks of changed ``(member_id, date)`` cells."""
+    for member_id in {member_id for member_id, _ in cells}:
+        _bump_now_and_on_commit(_member_version_key(member_id))
+
+    current_week = Member.get_week_start()
+    week_starts = {Member.get_week_start(day) for _, day in cells}
+    if any(week_start < current_week for week_start in week_starts):
+        invalidate_all()
+        return
+    for week_start in week_starts:
+        _bump_now_and_on_commit(_week_version_key(week_start))
+
+
+def _cached(key, versions, build):
+    key = f'{key}:{versions[0]}:{versions[1]}'
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        timeout = _timeout()
+        if routers.reading_from_replica():
+            # Built from a replica that may trail the version bump: keep it
+            # only as long as the replica may lag.
+            timeout = min(timeout, routers.max_lag())
+        cache.set(key, value, timeout=timeout)
+    return value
+
+
+def week_summary(week_start):
+    """Cached ``billing.weekly_summary`` for all active members."""
+    from . import billing
+
+    return _cached(
+        f'tracker:summary:{week_start.isoformat()}',
+        _versions(_week_version_key(week_start)),
+        lambda: billing.weekly_summary(Member.objects.filter(is_active=True), week_start)
+    )
+
+
+def week_matrix(week_start):
+    """Cached ``grid.build_week_matrix`` for all active members."""
+    from . import grid
+
+    return _cached(
+        f'tracker:matrix:{week_start.isoformat()}',
+        _versions(_week_version_key(week_start)),
+        lambda: grid.build_week_matrix(Member.objects.filter(is_active=True), grid.week_days(week_start))
+    )
+
+
+def week_grid(week_start):
+    """Cached ``grid.compact_week`` for all active members."""
+    from . import grid
+
+    return _cached(
+        f'tracker:grid:{week_start.isoformat()}',
+        _versions(_week_version_key(week_start)),
+        lambda: grid.compact_week(Member.objects.filter(is_active=True), grid.week_days(week_start))
+    )
+
+
+def member_week(member, week_start, build, versions=None):
+    """Cache ``build()`` for one member's week until that member's data changes."""
+    return _cached(
+        f'tracker:member-week:{member.pk}:{week_start.isoformat()}',
+        versions or member_versions(member.pk),
+        build
+    )
@@ -0,0 +1,181 @@
+"""
+Streaming CSV/JSON exports of meal records, payments and member statements.
+
+Raw records are read with ``QuerySet.iterator(chunk_size=...)`` and encoded
+row by row, so an export of any size holds only one chunk in memory and the
+first bytes go out as soon as the first chunk is read. Statements are built
+one period at a time from the set-based totals in ``tracker.billing``.
+Meal exports include archived records (see ``tracker.archive``).
+"""
+import csv
+from itertools import chain
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Min
+
+from .archive import archive_boundary, first_meal_date, last_meal_date
+from .balances import balances_as_of
+from .billing import ZERO, meal_totals, paid_totals
+from .models import ArchivedMealRecord, Member, Payment
+from .storage import get_storage
+
+CHUNK_SIZE = 2000
+
+MEAL_VALUES = ('member_id', 'member__serial_number', 'member__name', 'date', 'ate_meal', 'meal_count')
+
+MEAL_FIELDS = ['member_id', 'serial_number', 'name', 'date', 'ate_meal', 'meal_count']
+PAYMENT_FIELDS = ['member_id', 'serial_number', 'name', 'payment_date', 'amount', 'note']
+STATEMENT_FIELDS = [
+    'member_id', 'serial_number', 'name', 'period_start', 'period_end',
+    'opening_balance', 'meals', 'billed', 'paid', 'closing_balance',
+]
+
+CENT = Decimal('0.01')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+
+def _date_range(queryset, field, start_date, end_date):
+    if start_date:
+        queryset = queryset.filter(**{f'{field}__gte': start_date})
+    if end_date:
+        queryset = queryset.filter(**{f'{field}__lte': end_date})
+    return queryset
+
+
+def meal_rows(start_date=None, end_date=None):
+    """Yield one tuple per meal record, archived or live, between the dates (``MEAL_FIELDS``)."""
+    live = get_storage().export_rows(start_date, end_date, chunk_size=CHUNK_SIZE)
+    boundary = archive_boundary()
+    if not boundary or (start_date is not None and start_date >= boundary):
+        return live
+    # Every archived date comes first.
+    archived = _date_range(ArchivedMealRecord.objects.all(), 'date', start_date, end_date).order_by(
+        'date', 'member__serial_number'
+    ).values_list(*MEAL_VALUES).iterator(chunk_size=CHUNK_SIZE)
+    return chain(archived, live)
+
+
+def payment_rows(start_date=None, end_date=None):
+    """Yield one tuple per ``Payment`` between the dates (``PAYMENT_FIELDS``)."""
+    payments = _date_range(Payment.objects.all(), 'payment_date', start_date, end_date)
+    return payments.order_by('payment_date', 'member__serial_number', 'pk').values_list(
+        'member_id', 'member__serial_number', 'member__name', 'payment_date', 'amount', 'note'
+    ).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _periods(start_date, end_date, period):
+    """Split ``[start_date, end_date]`` into Saturday-Friday weeks or calendar months."""
+    first = start_date
+    while first <= end_date:
+        if period == 'week':
+            last = Member.get_week_start(first) + timedelta(days=6)
+        else:
+            last = (first.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        yield first, min(last, end_date)
+        first = last + timedelta(days=1)
+
+
+def statement_rows(start_date=None, end_date=None, period='month'):
+    """
+    Yield one statement row per member and period (``STATEMENT_FIELDS``).
+
+    Each row carries the balance before the period, the meals, bill and
+    payments inside it, and the balance after it. Members with no balance and
+    no activity in a period are left out. Without dates the statement runs
+    from the first recorded meal or payment to today.
+    """
+    if start_date is None:
+        firsts = [
+            first_meal_date(),
+            Payment.objects.aggregate(first=Min('payment_date'))['first'],
+        ]
+        start_date = min((day for day in firsts if day), default=None)
+    if end_date is None:
+        lasts = [
+            date.today(),
+            last_meal_date(),
+            Payment.objects.aggregate(last=Max('payment_date'))['last'],
+        ]
+        end_date = max(day for day in lasts if day)
+    if start_date is None or end_date < start_date:
+        return
+
+    members = list(Member.objects.order_by('serial_number', 'pk'))
+    balance = {
+        member_id: billed - paid
+        for member_id, (billed, paid) in balances_as_of(members, start_date - timedelta(days=1)).items()
+    }
+
+    for first, last in _periods(start_date, end_date, period):
+        meals = meal_totals(members, first, last)
+        paid = paid_totals(members, first, last)
+        for member in members:
+            count, billed = meals.get(member.pk, (0, ZERO))
+            member_paid = paid.get(member.pk, ZERO)
+            opening = balance.get(member.pk, ZERO)
+            closing = opening + billed - member_paid
+            balance[member.pk] = closing
+            if not count and not member_paid and not opening:
+                continue
+            yield (
+                member.pk, member.serial_number, member.name, first, last,
+                opening.quantize(CENT), count, billed.quantize(CENT),
+                member_paid.quantize(CENT), closing.quantize(CENT),
+            )
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(fields, rows):
+    """Encode ``rows`` as CSV (with a header line), one line at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_json(fields, rows):
+    """Encode ``rows`` as a JSON array of objects, one object at a time."""
+    encoder = DjangoJSONEncoder()
+    separator = '[\n'
+    for row in rows:
+        yield separator + encoder.encode(dict(zip(fields, row)))
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+EXPORTS = {
+    'meals': (MEAL_FIELDS, meal_rows),
+    'payments': (PAYMENT_FIELDS, payment_rows),
+    'statements': (STATEMENT_FIELDS, statement_rows),
+}
+
+
+def export(kind, fmt, start_date=None, end_date=None, period='month'):
+    """
+    Return an iterator of text chunks for one export.
+
+    ``kind`` is a key of ``EXPORTS`` and ``fmt`` a key of ``FORMATS``;
+    ``period`` (``'week'`` or ``'month'``) only applies to statements.
+    Raises ``ValueError`` for unknown kinds, formats or periods.
+    """
+    if kind not in EXPORTS or fmt not in FORMATS or period not in ('week', 'month'):
+        raise ValueError(f"Unsupported export {kind!r} ({fmt}, {period}).")
+    fields, source = EXPORTS[kind]
+    if kind == 'statements':
+        rows = source(start_date, end_date, period)
+    else:
+        rows = source(start_date, end_date)
+    encode = stream_csv if fmt == 'csv' else stream_json
+    return encode(fields, rows)
@@ -0,0 +1,99 @@
+"""
+Change feed for the daily meals grid.
+
+Every meal cell change appends a ``MealChange`` row with the cell's member
+and date (``tracker.signals``); its auto-incrementing id is the feed
+version. A grid page remembers the version it was rendered at and asks for
+``changes_since`` that version: it gets back the current state of just the
+cells of its week that changed, and patches them in place.
+
+Entries carry no values, only which cells to re-read, so replaying one twice
+is harmless. That lets ``changes_since`` re-send the entries of the last
+``LATE_SECONDS`` just below the caller's version: on PostgreSQL a
+transaction can commit after a later id is already visible.
+
+Changes that aren't worth logging cell by cell (members added or renamed,
+bulk imports, generated data) append a reset entry without a member instead,
+and pages reload. Only the last ``KEEP`` entries are kept; a page that has
+fallen further behind also reloads.
+"""
+from datetime import timedelta
+
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import MealChange
+
+KEEP = 10000
+PRUNE_EVERY = 500
+MAX_ENTRIES = 1000
+LATE_SECONDS = 10
+MAX_WAIT = 25  # seconds a long poll may be held open (async views)
+POLL_INTERVAL = 1
+
+
+def current_version():
+    """The version of the latest change (0 before the first one)."""
+    return MealChange.objects.aggregate(version=Max('id'))['version'] or 0
+
+
+def record(cells):
+    """Log changed ``(member_id, date)`` cells."""
+    entries = MealChange.objects.bulk_create([MealChange(member_id=member_id, date=day) for member_id, day in set(cells)])
+    _prune(entries)
+
+
+def reset():
+    """Log a change that needs a full reload of every grid."""
+    _prune([MealChange.objects.create()])
+
+
+def _prune(entries):
+    # Backends that can't return ids from bulk inserts leave ``pk`` unset.
+    last = max((entry.pk for entry in entries if entry.pk), default=None)
+    if last and last % PRUNE_EVERY < len(entries):
+        MealChange.objects.filter(id__lte=last - KEEP).delete()
+
+
+def changes_since(version, days):
+    """
+    Return ``{'version', 'reset', 'cells'}`` for changes after ``version``.
+
+    ``cells`` holds the current state of every changed cell on ``days``
+    (``member_id``, ``date``, ``ate``, ``meal_count``). With ``reset`` the
+    caller must reload instead: members changed, a bulk job ran, or
+    ``version`` is older than the kept entries (or from another database).
+    """
+    from .grid import load_week_records
+
+    bounds = MealChange.objects.aggregate(first=Min('id'), last=Max('id'))
+    latest = bounds['last'] or 0
+    if version > latest or (bounds['first'] and version < bounds['first'] - 1):
+        return {'version': latest, 'reset': True, 'cells': []}
+
+    late = Q(id__gt=version - MAX_ENTRIES, changed_at__gte=timezone.now() - timedelta(seconds=LATE_SECONDS))
+    entries = list(
+        MealChange.objects.filter(Q(id__gt=version) | late)
+        .order_by('id')
+        .values_list('id', 'member_id', 'date')[:MAX_ENTRIES + 1]
+    )
+    if len(entries) > MAX_ENTRIES or any(member_id is None for entry_id, member_id, _ in entries if entry_id > version):
+        return {'version': latest, 'reset': True, 'cells': []}
+
+    days = sorted(days)
+    cells = sorted({(member_id, day) for _, member_id, day in entries if day and days[0] <= day <= days[-1]})
+    lookup = load_week_records({member_id for member_id, _ in cells}, days) if cells else {}
+    states = []
+    for member_id, day in cells:
+        record = lookup.get(member_id, {}).get(day)
+        states.append({
+            'member_id': member_id,
+            'date': day.isoformat(),
+            'ate': record.ate_meal if record else False,
+            'meal_count': record.meal_count if record else None,
+        })
+    return {
+        'version': max([version, *(entry_id for entry_id, _, _ in entries)]),
+        'reset': False,
+        'cells': states,
+    }
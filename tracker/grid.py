@@ -0,0 +1,139 @@
+"""
+Week grid (member x day) used by the daily meals page.
+
+The whole week is loaded with one range query and pivoted in memory, so the
+cost of rendering the grid doesn't grow with the number of cells.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.db import transaction
+
+from .archive import archive_boundary, check_live
+from .models import ArchivedMealRecord, MealRecord, Member
+from .signals import meal_records_changed
+from .storage import get_storage
+
+
+def week_days(week_start):
+    """The seven dates of the week starting on ``week_start``."""
+    return [week_start + timedelta(days=i) for i in range(7)]
+
+
+def load_week_records(members, days):
+    """
+    Return ``{member_id: {date: MealRecord}}`` for the given members and days.
+
+    Live days come from the configured meal storage (``tracker.storage``).
+    Archived days map to their (read-only) ``ArchivedMealRecord``.
+    """
+    records = get_storage().records(members, days[0], days[-1])
+    boundary = archive_boundary()
+    if boundary and days[0] < boundary:
+        records = chain(records, ArchivedMealRecord.objects.filter(
+            member__in=members,
+            date__gte=days[0],
+            date__lte=days[-1]
+        ).order_by())
+
+    lookup = defaultdict(dict)
+    for record in records:
+        lookup[record.member_id][record.date] = record
+    return lookup
+
+
+def build_week_matrix(members, days):
+    """Build the rows rendered by ``daily_meals.html``."""
+    members = list(members)
+    lookup = load_week_records(members, days)
+
+    matrix = []
+    for member in members:
+        member_records = lookup.get(member.pk, {})
+        meals = []
+        for day in days:
+            record = member_records.get(day)
+            meals.append({
+                'date': day,
+                'record': record,
+                'ate': record.ate_meal if record else False
+            })
+        matrix.append({'member': member, 'meals': meals})
+    return matrix
+
+
+def compact_week(members, days):
+    """
+    The week grid in the columnar form served by ``/daily-meals/grid/``.
+
+    ``members`` is a queryset. Returns ``dates`` (ISO), ``members`` as
+    ``[id, name]`` pairs and ``ate``: one string per member with ``'1'`` for
+    each day eaten, in the order of ``dates``.
+    """
+    rows = list(members.values_list('pk', 'name'))
+    lookup = load_week_records([member_id for member_id, _ in rows], days)
+    ate = []
+    for member_id, _ in rows:
+        records = lookup.get(member_id, {})
+        ate.append(''.join('1' if day in records and records[day].ate_meal else '0' for day in days))
+    return {
+        'dates': [day.isoformat() for day in days],
+        'members': [[member_id, name] for member_id, name in rows],
+        'ate': ate,
+    }
+
+
+MAX_BATCH_CHANGES = 5000
+
+
+def apply_meal_changes(changes):
+    """
+    Apply many cell changes in one transaction with bulk upserts.
+
+    ``changes`` is an iterable of ``(member_id, date, ate_meal, meal_count)``
+    tuples where ``meal_count`` may be ``None`` to keep the stored count. When
+    the same cell appears more than once the last change wins. Returns the
+    resulting ``MealRecord`` rows. Raises ``archive.ArchivedDateError`` (and
+    changes nothing) if a change falls in an archived month.
+    """
+    latest = {}
+    for member_id, day, ate_meal, meal_count in changes:
+        latest[(member_id, day)] = (ate_meal, meal_count)
+    if not latest:
+        return []
+    check_live([day for _, day in latest])
+
+    storage = get_storage()
+    with transaction.atomic():
+        storage.write(latest)
+        meal_records_changed.send(sender=MealRecord, cells=list(latest))
+
+    member_ids = {member_id for member_id, _ in latest}
+    days = [day for _, day in latest]
+    records = storage.records(member_ids, min(days), max(days))
+    return [record for record in records if (record.member_id, record.date) in latest]
+
+
+def prepopulate(days, ate_meal=False, members=None):
+    """
+    Create the missing meal records for ``days`` ahead of time.
+
+    Covers ``members`` (default: all active members) and leaves existing rows
+    untouched, so later clicks only update rows that already exist. Archived
+    days are skipped. Returns the number of rows created.
+    """
+    if members is None:
+        members = Member.objects.filter(is_active=True)
+    member_ids = [getattr(member, 'pk', member) for member in members]
+    boundary = archive_boundary()
+    days = sorted(day for day in days if not boundary or day >= boundary)  # archived days are read-only
+    if not member_ids or not days:
+        return 0
+
+    cells = {(member_id, day): (ate_meal, None) for member_id in member_ids for day in days}
+    with transaction.atomic():
+        created = get_storage().write(cells, fill_only=True)
+        if created:
+            meal_records_changed.send(sender=MealRecord, cells=created)
+    return len(created)
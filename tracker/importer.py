@@ -0,0 +1,423 @@
+"""
+Bulk CSV import of members, prices, meals and payments.
+
+Rows are read and validated in chunks of ``CHUNK_SIZE``; each valid chunk is
+written with one ``INSERT ... ON CONFLICT DO UPDATE`` ``executemany`` (or, on
+PostgreSQL, one ``COPY`` into a temporary table followed by one
+``INSERT ... SELECT ... ON CONFLICT``), skipping model instances entirely. The
+whole file is imported in one transaction with the signal handlers muted, and
+the ledger, checkpoints, price index and caches are brought up to date once
+at the end. Invalid rows are reported with their line numbers; by default any
+invalid row rolls the whole import back.
+
+CSV columns (a header row is required, extra columns are ignored):
+
+* ``members``: ``name``, optional ``serial_number`` (existing serials are
+  updated; rows without one are numbered after the file's highest serial) and
+  ``is_active``.
+* ``prices``: ``date``, ``price_per_meal`` (existing dates are updated).
+* ``meals``: ``serial_number`` or ``member_id``, ``date``, ``ate_meal`` and
+  optional ``meal_count`` (existing member/day records are updated; archived
+  months can't be imported into). In the ``weeks`` meal storage the chunk is
+  merged into the ``MealWeek`` rows instead (see ``tracker.storage``).
+* ``payments``: ``serial_number`` or ``member_id``, ``amount``, optional
+  ``payment_date`` (default today) and ``note``.
+"""
+import abc
+import csv
+import io
+import itertools
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import archive, balances, caching, feed, ledger
+from .models import MealPrice, MealRecord, Member, Payment
+from .pricing import invalidate_price_index
+from .signals import muted
+from .storage import get_storage
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 200
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y', 'eat'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n', 'skip'}
+
+
+class RowError(ValueError):
+    """A CSV row that can't be imported."""
+
+
+class ImportResult:
+    """Outcome of one import: row counts and the first ``MAX_REPORTED_ERRORS`` errors."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []  # (line number, message)
+        self.committed = False
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _value(row, column):
+    return (row.get(column) or '').strip()
+
+
+def _bool(row, column, default=None):
+    value = _value(row, column).lower()
+    if not value and default is not None:
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f"{column} must be yes/no, true/false or 1/0, not '{value}'.")
+
+
+def _date(row, column, default=None):
+    value = _value(row, column)
+    if not value and default is not None:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise RowError(f"{column} must be a date in YYYY-MM-DD format, not '{value}'.")
+
+
+def _int(row, column, default=None, minimum=0):
+    value = _value(row, column)
+    if not value and default is not None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f"{column} must be a whole number, not '{value}'.")
+    if number < minimum:
+        raise RowError(f"{column} must be at least {minimum}.")
+    return number
+
+
+def _amount(row, column):
+    value = _value(row, column)
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f"{column} must be a number, not '{value}'.")
+    if not amount.is_finite() or amount < 0 or amount.as_tuple().exponent < -2:
+        raise RowError(f"{column} must be a non-negative amount with at most two decimals.")
+    return amount
+
+
+class _MemberLookup:
+    """Resolve ``member_id``/``serial_number`` columns with one query per import."""
+
+    def __init__(self):
+        self.ids = set()
+        self.by_serial = {}
+        for member_id, serial in Member.objects.values_list('id', 'serial_number'):
+            self.ids.add(member_id)
+            if serial is not None:
+                self.by_serial[serial] = member_id
+
+    def __call__(self, row):
+        if _value(row, 'member_id'):
+            member_id = _int(row, 'member_id', minimum=1)
+            if member_id not in self.ids:
+                raise RowError(f"No member with id {member_id}.")
+            return member_id
+        serial = _int(row, 'serial_number', minimum=1)
+        if serial not in self.by_serial:
+            raise RowError(f"No member with serial number {serial}.")
+        return self.by_serial[serial]
+
+
+class _Importer(abc.ABC):
+    """One kind of import: column checks, row parsing and chunk writing."""
+
+    model = None
+    required = ()
+    fields = ()         # model fields returned by parse(), in order
+    conflict = ()       # natural key (subset of fields); later rows with the same key win
+    update_fields = ()  # columns overwritten on conflict
+    timestamps = ('created_at',)
+
+    def __init__(self, columns):
+        missing = [column for column in self.required if column not in columns]
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(missing)}.")
+        self.first = self.last = None  # date range touched by the import
+
+    @abc.abstractmethod
+    def parse(self, row):
+        """Validate one CSV row and return its values for ``fields``."""
+
+    def touch(self, day):
+        self.first = day if self.first is None else min(self.first, day)
+        self.last = day if self.last is None else max(self.last, day)
+
+    def write(self, rows):
+        if self.conflict:
+            key = [self.fields.index(name) for name in self.conflict]
+            rows = {tuple(row[i] for i in key): row for row in rows}.values()
+        now = timezone.now()
+        _write_rows(
+            self.model,
+            self.fields,
+            rows,
+            {name: now for name in self.timestamps},
+            self.conflict,
+            self.update_fields
+        )
+
+    def flush(self):
+        """Write any rows ``write`` held back until the whole file was read."""
+
+    def finish(self):
+        """Bring derived data up to date after the rows are written."""
+        caching.invalidate_all()
+        feed.reset()  # open grids reload
+
+
+class _MemberImporter(_Importer):
+    model = Member
+    required = ('name',)
+    fields = ('name', 'serial_number', 'is_active')
+    conflict = ('serial_number',)
+    update_fields = ('name', 'is_active')
+
+    def __init__(self, columns):
+        super().__init__(columns)
+        self.unnumbered = []  # (name, is_active) of rows without a serial
+
+    def parse(self, row):
+        name = _value(row, 'name')
+        if not name:
+            raise RowError("name is required.")
+        if len(name) > Member._meta.get_field('name').max_length:
+            raise RowError("name is too long.")
+        serial = _int(row, 'serial_number', minimum=1) if _value(row, 'serial_number') else None
+        return (name, serial, _bool(row, 'is_active', default=True))
+
+    def write(self, rows):
+        # Rows with a serial are written (and the counter moved past them)
+        # right away. The rest are numbered in flush(), once every explicit
+        # serial in the file is reserved, so a later chunk can't upsert over
+        # a member this import just numbered.
+        explicit = [row for row in rows if row[1] is not None]
+        if explicit:
+            Member.objects.reserve_serial(max(serial for _, serial, _ in explicit))
+            super().write(explicit)
+        self.unnumbered.extend((name, is_active) for name, serial, is_active in rows if serial is None)
+
+    def flush(self):
+        if not self.unnumbered:
+            return
+        serials = itertools.count(Member.objects.allocate_serials(len(self.unnumbered)))
+        rows = [(name, next(serials), is_active) for name, is_active in self.unnumbered]
+        self.unnumbered = []
+        for start in range(0, len(rows), CHUNK_SIZE):
+            super().write(rows[start:start + CHUNK_SIZE])
+
+
+class _PriceImporter(_Importer):
+    model = MealPrice
+    required = ('date', 'price_per_meal')
+    fields = ('date', 'price_per_meal')
+    conflict = ('date',)
+    update_fields = ('price_per_meal', 'updated_at')
+    timestamps = ('created_at', 'updated_at')
+
+    def parse(self, row):
+        day = _date(row, 'date')
+        self.touch(day)
+        return (day, _amount(row, 'price_per_meal'))
+
+    def finish(self):
+        invalidate_price_index()
+        transaction.on_commit(invalidate_price_index)
+        if self.first:
+            archive.reprice(self.first)
+            ledger.refresh_for_price(self.first, self.last)
+            balances.invalidate(self.first)
+        super().finish()
+
+
+class _ActivityImporter(_Importer):
+    """Rows that belong to a member (meals and payments)."""
+
+    def __init__(self, columns):
+        super().__init__(columns)
+        if 'member_id' not in columns and 'serial_number' not in columns:
+            raise ValueError("Missing CSV columns: serial_number or member_id.")
+        self.member = _MemberLookup()
+
+    def finish(self):
+        if self.first:
+            ledger.refresh_range(self.first, self.last)
+            balances.invalidate(self.first)
+        super().finish()
+
+
+class _MealImporter(_ActivityImporter):
+    model = MealRecord
+    required = ('date', 'ate_meal')
+    fields = ('member', 'date', 'ate_meal', 'meal_count')
+    conflict = ('member', 'date')
+    update_fields = ('ate_meal', 'meal_count')
+
+    def parse(self, row):
+        member_id = self.member(row)
+        day = _date(row, 'date')
+        try:
+            archive.check_live([day])
+        except archive.ArchivedDateError as exc:
+            raise RowError(str(exc))
+        values = (member_id, day, _bool(row, 'ate_meal'), _int(row, 'meal_count', default=1))
+        self.touch(day)
+        return values
+
+    def write(self, rows):
+        storage = get_storage()
+        if storage.name == 'rows':
+            super().write(rows)
+        else:
+            # Week rows are merged day by day; later rows for a cell win.
+            storage.write({(member_id, day): (ate_meal, meal_count) for member_id, day, ate_meal, meal_count in rows})
+
+
+class _PaymentImporter(_ActivityImporter):
+    model = Payment
+    required = ('amount',)
+    fields = ('member', 'amount', 'payment_date', 'note')
+
+    def parse(self, row):
+        member_id = self.member(row)
+        amount = _amount(row, 'amount')
+        day = _date(row, 'payment_date', default=date.today())
+        self.touch(day)
+        return (member_id, amount, day, _value(row, 'note') or None)
+
+
+IMPORTERS = {
+    'members': _MemberImporter,
+    'prices': _PriceImporter,
+    'meals': _MealImporter,
+    'payments': _PaymentImporter,
+}
+
+
+def _write_rows(model, names, rows, constants, conflict, update_fields):
+    """
+    Insert ``rows`` (tuples of values for the fields ``names``) in one go.
+
+    ``constants`` maps further fields to one value shared by every row (the
+    timestamps). Values are adapted with each field's ``get_db_prep_save`` and
+    written without building model instances: ``COPY`` into a temporary table
+    plus one ``INSERT ... SELECT`` on PostgreSQL, a single ``executemany``
+    elsewhere. With ``conflict`` existing rows are updated
+    (``ON CONFLICT DO UPDATE``).
+    """
+    db = connections[router.db_for_write(model)]
+    opts = model._meta
+    qn = db.ops.quote_name
+    fields = [opts.get_field(name) for name in names]
+    extra = tuple(opts.get_field(name).get_db_prep_save(value, db) for name, value in constants.items())
+    columns = ', '.join(qn(opts.get_field(name).column) for name in (*names, *constants))
+    table = qn(opts.db_table)
+    preps = [field.get_db_prep_save for field in fields]
+    rows = [
+        tuple(prep(value, db) for prep, value in zip(preps, row)) + extra
+        for row in rows
+    ]
+
+    upsert = ''
+    if conflict:
+        target = ', '.join(qn(opts.get_field(name).column) for name in conflict)
+        updates = ', '.join(
+            f'{qn(opts.get_field(name).column)} = EXCLUDED.{qn(opts.get_field(name).column)}'
+            for name in update_fields
+        )
+        upsert = f' ON CONFLICT ({target}) DO UPDATE SET {updates}'
+
+    with db.cursor() as cursor:
+        if db.vendor != 'postgresql':
+            placeholders = ', '.join(['%s'] * (len(fields) + len(extra)))
+            cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders}){upsert}', rows)
+            return
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(['' if value is None else value for value in row] for row in rows)
+        buffer.seek(0)
+
+        staging = qn(f'import_{opts.db_table}')
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        cursor.execute(f'TRUNCATE {staging}')
+        copy_sql = f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)'
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            cursor.copy_expert(copy_sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}{upsert}')
+
+
+def import_csv(kind, stream, skip_invalid=False, dry_run=False):
+    """
+    Import CSV rows of ``kind`` (a key of ``IMPORTERS``) from a text ``stream``.
+
+    With ``skip_invalid`` valid rows are kept even if others fail; otherwise
+    any invalid row rolls the whole import back. ``dry_run`` validates and
+    writes inside the transaction, then always rolls back. Returns an
+    ``ImportResult``; raises ``ValueError`` for an unknown kind or missing
+    columns.
+    """
+    if kind not in IMPORTERS:
+        raise ValueError(f"Unknown import '{kind}'.")
+    reader = csv.DictReader(stream)
+    reader.fieldnames = [name.strip() for name in reader.fieldnames or []]
+    importer = IMPORTERS[kind](reader.fieldnames)
+    result = ImportResult(kind)
+
+    try:
+        with transaction.atomic(), muted():
+            chunk = []
+            for row in reader:
+                result.rows += 1
+                try:
+                    chunk.append(importer.parse(row))
+                except RowError as exc:
+                    result.add_error(reader.line_num, str(exc))
+                if len(chunk) >= CHUNK_SIZE:
+                    importer.write(chunk)
+                    result.imported += len(chunk)
+                    chunk = []
+            if chunk:
+                importer.write(chunk)
+                result.imported += len(chunk)
+            importer.flush()
+
+            if dry_run or (result.error_count and not skip_invalid):
+                raise _Rollback
+            importer.finish()
+    except _Rollback:
+        if not dry_run:
+            result.imported = 0
+        return result
+
+    result.committed = True
+    return result
@@ -0,0 +1,143 @@
+"""
+Maintenance of the ``WeeklyLedger`` table.
+
+Each ledger row holds one member's meals, bill and payments for one
+Saturday-Friday week. Rows are recomputed only for the member-weeks touched by
+a change (see ``tracker.signals``); a price change recomputes every week in
+which that price is in effect. ``rebuild`` recreates the table from scratch.
+
+Rows are recomputed from the meals and payments the writer's transaction can
+see, so writers first lock the members whose rows they recompute: a second
+transaction changing the same member-week waits, then recomputes with the
+first one's committed change instead of overwriting it with a total that
+lacks it.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from .archive import first_meal_date, last_meal_date
+from .billing import ZERO, meal_totals, paid_totals, week_end
+from .models import Member, Payment, WeeklyLedger
+from .pricing import get_price_index
+
+
+def week_start_for(day):
+    """Saturday starting the week that contains ``day``."""
+    return Member.get_week_start(day)
+
+
+def lock_members(member_ids=None):
+    """Lock the members' rows (all members by default) until the transaction ends."""
+    # SQLite has no row locks; it already runs one writer at a time.
+    if not connection.features.has_select_for_update:
+        return
+    members = Member.objects.select_for_update().order_by('pk')
+    if member_ids is not None:
+        members = members.filter(pk__in=member_ids)
+    list(members.values_list('pk', flat=True))
+
+
+def _refresh_week(week_start, member_ids=None):
+    """Recompute ledger rows of one week, for some members or all of them."""
+    scope = Member.objects.all() if member_ids is None else member_ids
+    end_date = week_end(week_start)
+    totals = meal_totals(scope, week_start, end_date)
+    paid = paid_totals(scope, week_start, end_date)
+
+    rows = []
+    for member_id in totals.keys() | paid.keys():
+        meals, bill = totals.get(member_id, (0, ZERO))
+        rows.append(WeeklyLedger(
+            member_id=member_id,
+            week_start=week_start,
+            meals=meals,
+            bill=bill,
+            paid=paid.get(member_id, ZERO)
+        ))
+
+    # Drop rows left without meals or payments (one write per refreshed cell:
+    # the upsert below, or this delete).
+    kept = {row.member_id for row in rows}
+    if member_ids is None:
+        WeeklyLedger.objects.filter(week_start=week_start).exclude(member_id__in=kept).delete()
+    elif set(member_ids) - kept:
+        WeeklyLedger.objects.filter(week_start=week_start, member_id__in=set(member_ids) - kept).delete()
+
+    if rows:
+        WeeklyLedger.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['member', 'week_start'],
+            update_fields=['meals', 'bill', 'paid', 'updated_at']
+        )
+
+
+def refresh(cells):
+    """
+    Recompute the ledger for ``(member_id, day)`` pairs.
+
+    ``day`` may be any date; it is mapped to the week that contains it.
+    """
+    by_week = defaultdict(set)
+    for member_id, day in cells:
+        by_week[week_start_for(day)].add(member_id)
+
+    # No savepoint: writers (the views, admin, grid and import) call this from
+    # their own transaction, so a failed refresh rolls their write back too.
+    # Called outside one, this block is that transaction.
+    with transaction.atomic(savepoint=False):
+        lock_members(sorted({member_id for member_id, _ in cells}))
+        for week_start, member_ids in sorted(by_week.items()):
+            _refresh_week(week_start, member_ids)
+
+
+def refresh_range(start_date, end_date=None):
+    """
+    Recompute every member-week overlapping ``[start_date, end_date]``.
+
+    With no ``end_date`` the range runs to the last recorded meal or payment.
+    """
+    if end_date is None:
+        last_meal = last_meal_date()
+        last_payment = Payment.objects.aggregate(last=Max('payment_date'))['last']
+        candidates = [day for day in (last_meal, last_payment) if day]
+        if not candidates:
+            return
+        end_date = max(candidates)
+    if end_date < start_date:
+        return
+
+    week_start = week_start_for(start_date)
+    with transaction.atomic(savepoint=False):
+        lock_members()
+        while week_start <= end_date:
+            _refresh_week(week_start)
+            week_start += timedelta(days=7)
+
+
+def refresh_for_price(*days):
+    """Recompute the weeks billed by the prices set (or removed) on ``days``."""
+    if not days:
+        return
+    start_date = min(days)
+    dates = get_price_index().dates
+    i = bisect_right(dates, max(days))
+    end_date = dates[i] - timedelta(days=1) if i < len(dates) else None
+    refresh_range(start_date, end_date)
+
+
+def rebuild():
+    """Recreate the whole ledger from raw meals, prices and payments."""
+    first_meal = first_meal_date()
+    first_payment = Payment.objects.aggregate(first=Min('payment_date'))['first']
+    candidates = [day for day in (first_meal, first_payment) if day]
+
+    with transaction.atomic():
+        WeeklyLedger.objects.all().delete()
+        if candidates:
+            refresh_range(min(candidates))
+    return WeeklyLedger.objects.count()
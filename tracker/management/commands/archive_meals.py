@@ -0,0 +1,39 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import archive
+from tracker.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move meal records of closed months into the archive and compact them "
+        "into monthly summaries (default: months older than ARCHIVE_AFTER_MONTHS)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help="Archive months before this date's month (YYYY-MM-DD).")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the records that would move.")
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                boundary = archive.month_start(date.fromisoformat(options['before']))
+            except ValueError:
+                raise CommandError("--before must be a date in YYYY-MM-DD format.")
+        else:
+            boundary = archive.default_boundary()
+        if boundary > archive.month_start(date.today()):
+            raise CommandError("Only closed months can be archived; --before must not be after this month.")
+
+        if options['dry_run']:
+            count = get_storage().count(boundary)
+            self.stdout.write(f"Would archive {count} meal records before {boundary}.")
+            return
+
+        moved = archive.archive_before(boundary)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} meal records before {boundary}. "
+            f"Restart running servers so they pick up the new archive boundary."
+        ))
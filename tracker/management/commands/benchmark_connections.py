@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+
+from tracker.benchmarks import run_manage, scratch_database, summarize, write_results
+from tracker.models import MealRecord, Member
+
+# Environment for each connection mode (see settings.DATABASES).
+MODES = {
+    'per_request': {'DJANGO_CONN_MAX_AGE': '0', 'DB_POOL': 'false'},
+    'persistent': {'DJANGO_CONN_MAX_AGE': '60', 'DB_POOL': 'false'},
+    'pooled': {'DJANGO_CONN_MAX_AGE': '0', 'DB_POOL': 'true'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request latency on PostgreSQL with a new connection per "
+        "request, persistent connections (CONN_MAX_AGE) and the psycopg pool "
+        "(DB_POOL), each on a scratch test database, and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Worker threads (like waitress threads).")
+        parser.add_argument('--requests', type=int, default=300, help="Simulated requests per thread.")
+        parser.add_argument('--members', type=int, default=50, help="Members in the generated data.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for data and requests.")
+        parser.add_argument('--output', default='bench_connections.json', help="Where to write the JSON results.")
+        # Internal: run one mode in a subprocess configured by MODES.
+        parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("benchmark_connections needs PostgreSQL; set DB_ENGINE and the DB_* variables.")
+        if options['run']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        results = []
+        for mode, environ in MODES.items():
+            result = json.loads(run_manage(
+                dict(os.environ, **environ), 'benchmark_connections', '--run',
+                f"--threads={options['threads']}", f"--requests={options['requests']}",
+                f"--members={options['members']}", f"--seed={options['seed']}",
+            ))
+            results.append({'mode': mode, **environ, **result})
+            self.stdout.write(
+                f"{mode:<12} {result['requests_per_second']:>8.1f} req/s  "
+                f"median {result['latency']['median_ms']:>7.2f} ms  p99 {result['latency']['p99_ms']:>7.2f} ms  "
+                f"{result['backend_connections']} server connections"
+            )
+
+        write_results(options['output'], 'connections', results, threads=options['threads'],
+                      requests=options['requests'], members=options['members'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}."))
+
+    def run_mode(self, options):
+        """
+        Simulate requests from several threads: each runs the request signals
+        (which close, keep or return the connection) around a member lookup
+        and a meal toggle.
+        """
+        with scratch_database():
+            call_command('generate_data', members=options['members'], years=0.1, seed=options['seed'],
+                         stdout=StringIO())
+            member_ids = list(Member.objects.values_list('pk', flat=True))
+            backend_pid = "SELECT pg_backend_pid()"
+            barrier = threading.Barrier(options['threads'] + 1)
+            samples, pids = [], set()
+
+            def worker(index):
+                rng = random.Random(options['seed'] + index)
+                barrier.wait()
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    request_started.send(sender=self.__class__, environ={})
+                    try:
+                        member = Member.objects.get(pk=rng.choice(member_ids))
+                        MealRecord.objects.toggle_meal(member, date.today())
+                        with connection.cursor() as cursor:
+                            cursor.execute(backend_pid)
+                            pids.add(cursor.fetchone()[0])
+                    finally:
+                        request_finished.send(sender=self.__class__)
+                    samples.append(time.perf_counter() - started)
+                connections.close_all()
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+            for thread in threads:
+                thread.start()
+            barrier.wait()
+            started = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        return {
+            'requests': len(samples),
+            'requests_per_second': round(len(samples) / elapsed, 1),
+            'latency': summarize(samples),
+            # Distinct server processes seen, i.e. connections opened.
+            'backend_connections': len(pids),
+        }
@@ -0,0 +1,237 @@
+import argparse
+import http.client
+import json
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from tracker.benchmarks import run_manage, scratch_sqlite, summarize, write_results
+from tracker.models import Member
+
+SERVERS = {
+    'waitress': [sys.executable, '-m', 'waitress', '--listen=127.0.0.1:{port}', '--threads={threads}',
+                 'meal_tracker.wsgi:application'],
+    'uvicorn': [sys.executable, '-m', 'uvicorn', '--host=127.0.0.1', '--port={port}', '--no-access-log',
+                'meal_tracker.asgi:application'],
+}
+
+# Deadline rush: members load and revalidate their page and post a decision,
+# while an admin toggles cells on the daily grid and checks the dashboard.
+MIX = [
+    ('my_meals', 0.50),
+    ('my_meals_post', 0.25),
+    ('toggle', 0.20),
+    ('dashboard', 0.05),
+]
+
+CSRF_SECRET = 'b' * 32  # sent as both cookie and X-CSRFToken header
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and latency of the app served by waitress (WSGI) "
+        "and uvicorn (ASGI, async views) under a simulated 10:30 AM deadline "
+        "rush, on a scratch SQLite database, and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=100, help="Members in the generated data.")
+        parser.add_argument('--years', type=float, default=0.5, help="Years of generated meal history.")
+        parser.add_argument('--concurrency', type=int, default=32, help="Simultaneous simulated clients.")
+        parser.add_argument('--duration', type=float, default=15, help="Seconds of load per server.")
+        parser.add_argument('--threads', type=int, default=8, help="waitress worker threads.")
+        parser.add_argument('--servers', default='waitress,uvicorn', help="Comma-separated servers to run.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for data and request mix.")
+        parser.add_argument('--output', default='bench_servers.json', help="Where to write the JSON results.")
+        # Internal: run inside the scratch database to create users and sessions.
+        parser.add_argument('--prepare', type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['prepare'] is not None:
+            self.stdout.write(json.dumps(self.prepare(options['prepare'])))
+            return
+
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"Unknown servers: {', '.join(sorted(unknown))}.")
+
+        with scratch_sqlite() as env:
+            env.pop('DJANGO_ASYNC_VIEWS', None)  # each server's entry point picks its views
+            run_manage(env, 'generate_data', f"--members={options['members']}",
+                       f"--years={options['years']}", f"--seed={options['seed']}")
+            run_manage(env, 'prepopulate_meals', '--week')
+            sessions = json.loads(run_manage(env, 'benchmark_servers', f"--prepare={options['concurrency']}"))
+
+            results = []
+            for name in servers:
+                result = self.run_server(name, env, sessions, options)
+                results.append(result)
+                overall = result['latency']
+                self.stdout.write(
+                    f"{name:<9} {result['requests_per_second']:>8.1f} req/s  "
+                    f"median {overall['median_ms']:>8.2f} ms  p99 {overall['p99_ms']:>8.2f} ms  "
+                    f"{result['errors']} errors"
+                )
+
+        write_results(
+            options['output'], 'servers', results,
+            members=options['members'], years=options['years'], concurrency=options['concurrency'],
+            duration=options['duration'], threads=options['threads'], mix=dict(MIX),
+            deadline_locked=sessions['locked'],
+        )
+        if sessions['locked']:
+            self.stdout.write(self.style.WARNING(
+                "Ran after 10:30 AM: my_meals posts were rejected by the deadline lock."
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}."))
+
+    def prepare(self, clients):
+        """Link users to members and log them in; returns their session cookies."""
+        from tracker.views import _meal_deadline
+
+        members = list(Member.objects.filter(is_active=True).order_by('serial_number')[:clients])
+        if not members:
+            raise CommandError("No active members to log in.")
+        sessions = []
+        for member in members:
+            user = User.objects.create_user(f'bench{member.serial_number}', password='bench')
+            member.user = user
+            member.save(update_fields=['user'])
+            sessions.append(self.login(user))
+        staff = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+        return {
+            'members': sessions,
+            'member_ids': [member.pk for member in members],
+            'staff': self.login(staff),
+            'locked': _meal_deadline()[2],
+        }
+
+    def login(self, user):
+        client = Client()
+        client.force_login(user)
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def run_server(self, name, env, sessions, options):
+        port = free_port()
+        command = [part.format(port=port, threads=options['threads']) for part in SERVERS[name]]
+        with tempfile.TemporaryFile() as log:
+            process = subprocess.Popen(command, env=env, cwd=settings.BASE_DIR, stdout=log, stderr=log)
+            try:
+                self.wait_until_up(name, port, process, log)
+                return {'server': name, **self.load(port, sessions, options)}
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+
+    def wait_until_up(self, name, port, process, log):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                log.seek(0)
+                raise CommandError(f"{name} exited:\n{log.read().decode(errors='replace')}")
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                connection.request('GET', reverse('login'))
+                connection.getresponse().read()
+                connection.close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"{name} did not start within 30 seconds.")
+
+    def load(self, port, sessions, options):
+        samples = {kind: [] for kind, _ in MIX}
+        errors = []
+        today = date.today().isoformat()
+        kinds, weights = zip(*MIX)
+        start_line = threading.Barrier(options['concurrency'] + 1)
+        stop = threading.Event()
+
+        def client(index):
+            rng = random.Random(options['seed'] + index)
+            member_cookie = sessions['members'][index % len(sessions['members'])]
+            staff_cookie = sessions['staff']
+            cookie = f"csrftoken={CSRF_SECRET}; {settings.SESSION_COOKIE_NAME}="
+            etag = None
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            start_line.wait()
+            while not stop.is_set():
+                kind = rng.choices(kinds, weights)[0]
+                headers = {'Cookie': cookie + member_cookie}
+                body = None
+                if kind == 'my_meals':
+                    method, url = 'GET', reverse('my_meals')
+                    if etag:
+                        headers['If-None-Match'] = etag
+                elif kind == 'my_meals_post':
+                    method, url = 'POST', reverse('my_meals')
+                    body = urlencode({'decision': rng.choice(['eat', 'skip'])})
+                elif kind == 'toggle':
+                    method, url = 'POST', reverse('daily_meals')
+                    headers['Cookie'] = cookie + staff_cookie
+                    headers['X-Requested-With'] = 'XMLHttpRequest'
+                    body = urlencode({'member_id': rng.choice(sessions['member_ids']), 'date': today})
+                else:
+                    method, url = 'GET', reverse('dashboard')
+                    headers['Cookie'] = cookie + staff_cookie
+                if body is not None:
+                    headers['Content-Type'] = 'application/x-www-form-urlencoded'
+                    headers['X-CSRFToken'] = CSRF_SECRET
+
+                started = time.perf_counter()
+                try:
+                    connection.request(method, url, body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as exc:
+                    errors.append(f"{kind}: {exc}")
+                    connection.close()
+                    continue
+                samples[kind].append(time.perf_counter() - started)
+                if response.status >= 400:
+                    errors.append(f"{kind}: HTTP {response.status}")
+                elif kind == 'my_meals':
+                    etag = response.getheader('ETag') or etag
+            connection.close()
+
+        workers = [threading.Thread(target=client, args=(i,)) for i in range(options['concurrency'])]
+        for worker in workers:
+            worker.start()
+        start_line.wait()
+        started = time.perf_counter()
+        time.sleep(options['duration'])
+        stop.set()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        every = [sample for kind_samples in samples.values() for sample in kind_samples]
+        if not every:
+            raise CommandError(f"No requests completed; first errors: {errors[:5]}")
+        return {
+            'requests': len(every),
+            'requests_per_second': round(len(every) / elapsed, 1),
+            'errors': len(errors),
+            'error_samples': sorted(set(errors))[:10],
+            'latency': summarize(every),
+            'by_request': {kind: summarize(kind_samples) for kind, kind_samples in samples.items() if kind_samples},
+        }
@@ -0,0 +1,112 @@
+import argparse
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection, connections
+
+from tracker import grid
+from tracker.benchmarks import run_manage, scratch_sqlite, summarize, write_results
+from tracker.models import MealRecord, Member
+
+PROFILES = {
+    'default': 'false',
+    'tuned': 'true',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent meal toggle throughput on SQLite with the default "
+        "settings and with the tuned profile (DJANGO_SQLITE_TUNED), each on a "
+        "scratch database, and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=60, help="Members in the generated data.")
+        parser.add_argument('--threads', type=int, default=8, help="Threads toggling at once (like waitress threads).")
+        parser.add_argument('--toggles', type=int, default=200, help="Toggles per thread.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for data and toggled cells.")
+        parser.add_argument('--output', default='bench_sqlite.json', help="Where to write the JSON results.")
+        # Internal: run the toggles inside the scratch database and print JSON.
+        parser.add_argument('--run-toggles', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['run_toggles']:
+            self.stdout.write(json.dumps(self.run_toggles(options)))
+            return
+
+        results = []
+        for profile, tuned in PROFILES.items():
+            with scratch_sqlite(DJANGO_SQLITE_TUNED=tuned) as env:
+                run_manage(env, 'generate_data', f"--members={options['members']}", '--years=0.25',
+                           f"--seed={options['seed']}")
+                run_manage(env, 'prepopulate_meals', '--week')
+                result = json.loads(run_manage(
+                    env, 'benchmark_sqlite', '--run-toggles', f"--threads={options['threads']}",
+                    f"--toggles={options['toggles']}", f"--seed={options['seed']}",
+                ))
+            results.append({'profile': profile, **result})
+            self.stdout.write(
+                f"{profile:<8} {result['toggles_per_second']:>8.1f} toggles/s  "
+                f"median {result['latency']['median_ms']:>7.2f} ms  p99 {result['latency']['p99_ms']:>8.2f} ms  "
+                f"{result['locked']} 'database is locked' errors"
+            )
+
+        write_results(
+            options['output'], 'sqlite', results,
+            members=options['members'], threads=options['threads'], toggles=options['toggles'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}."))
+
+    def run_toggles(self, options):
+        """Toggle random cells of this week from several threads, one "request" per toggle."""
+        member_ids = list(Member.objects.filter(is_active=True).values_list('pk', flat=True))
+        days = grid.week_days(Member.get_week_start())
+        barrier = threading.Barrier(options['threads'] + 1)
+        samples, locked = [], []
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            barrier.wait()
+            for _ in range(options['toggles']):
+                started = time.perf_counter()
+                try:
+                    MealRecord.objects.toggle_meal(rng.choice(member_ids), rng.choice(days))
+                    samples.append(time.perf_counter() - started)
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    locked.append(exc)
+                finally:
+                    # What request_finished does after each request: closes
+                    # the connection unless CONN_MAX_AGE keeps it open.
+                    close_old_connections()
+            connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        return {
+            'toggles': len(samples),
+            'locked': len(locked),
+            'elapsed_s': round(elapsed, 3),
+            'toggles_per_second': round(len(samples) / elapsed, 1),
+            'latency': summarize(samples or [0]),
+            'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+            'pragmas': pragmas,
+        }
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tracker import billing, grid, storage
+from tracker.benchmarks import run_manage, scratch_sqlite, time_call, write_results
+from tracker.models import MealRecord, Member
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the 'rows' and 'weeks' meal storage formats on the same "
+        "generated data in a scratch SQLite database: table and file size, week "
+        "grid load time, a year's totals and toggles. Writes the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=200, help="Members in the generated data.")
+        parser.add_argument('--years', type=float, default=2, help="Years of daily meal records.")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per measurement.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for data and toggled cells.")
+        parser.add_argument('--output', default='bench_storage.json', help="Where to write the JSON results.")
+        # Internal: measure the scratch database in its current format and print JSON.
+        parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['run']:
+            self.stdout.write(json.dumps(self.measure(options)))
+            return
+
+        results = []
+        end_date = date.today()
+        with scratch_sqlite() as env:
+            run_manage(env, 'generate_data', f"--members={options['members']}", f"--years={options['years']}",
+                       f"--end-date={end_date}", f"--seed={options['seed']}")
+            for name in ('rows', 'weeks'):
+                env['DJANGO_MEAL_STORAGE'] = name
+                if name != 'rows':
+                    run_manage(env, 'convert_meal_storage', f'--to={name}')
+                result = json.loads(run_manage(
+                    env, 'benchmark_storage', '--run', f"--repeat={options['repeat']}", f"--seed={options['seed']}",
+                ))
+                results.append({'storage': name, **result})
+                self.stdout.write(
+                    f"{name:<6} {result['rows']:>8} rows  {result['table_bytes'] / 1024:>9.0f} KiB table  "
+                    f"{result['file_bytes'] / 1024:>9.0f} KiB file  "
+                    f"grid {result['grid']['median_ms']:>7.2f} ms  "
+                    f"year totals {result['year_totals']['median_ms']:>8.2f} ms  "
+                    f"toggle {result['toggle']['median_ms']:>6.2f} ms"
+                )
+
+        write_results(
+            options['output'], 'storage', results,
+            members=options['members'], years=options['years'], repeat=options['repeat'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}."))
+
+    def measure(self, options):
+        """Size and timings of the configured format on the current database."""
+        current = storage.get_storage()
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
+        members = list(Member.objects.filter(is_active=True).order_by('serial_number'))
+        last = current.last_date()
+        week_start = Member.get_week_start(last)
+        days = grid.week_days(week_start)
+        rng = random.Random(options['seed'])
+        cells = [(rng.choice(members).pk, rng.choice(days)) for _ in range(options['repeat'] + 1)]
+        toggles = iter(cells)
+
+        return {
+            'rows': current.model.objects.count(),
+            'records': current.count(last + timedelta(days=1)),
+            'table_bytes': storage.table_sizes()[current.name],
+            'file_bytes': os.path.getsize(connection.settings_dict['NAME']),
+            'grid': time_call(lambda: grid.build_week_matrix(members, days), repeat=options['repeat']),
+            'year_totals': time_call(
+                lambda: billing.meal_totals(members, last - timedelta(days=364), last), repeat=options['repeat']
+            ),
+            'toggle': time_call(lambda: MealRecord.objects.toggle_meal(*next(toggles)), repeat=options['repeat']),
+        }
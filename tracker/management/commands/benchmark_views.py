@@ -0,0 +1,101 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from tracker import caching
+from tracker.benchmarks import scratch_database, time_call, write_results
+from tracker.models import Member
+
+VIEWS = [
+    ('dashboard', 'dashboard', ''),
+    ('daily_meals', 'daily_meals', '?render=server'),
+    # The client-rendered page is a shell; the grid comes from daily_meals_grid.
+    ('daily_meals_shell', 'daily_meals', '?render=client'),
+    ('daily_meals_grid', 'daily_meals_grid', ''),
+    ('my_meals', 'my_meals', ''),
+    ('manage_payments', 'manage_payments', ''),
+    ('admin_member_changelist', 'admin:tracker_member_changelist', ''),
+    ('admin_mealrecord_changelist', 'admin:tracker_mealrecord_changelist', ''),
+    ('admin_mealprice_changelist', 'admin:tracker_mealprice_changelist', ''),
+    ('admin_payment_changelist', 'admin:tracker_payment_changelist', ''),
+]
+
+# Cache modes: 'uncached' drops the cached weeks before every timed request, so
+# it measures the billing and grid work itself; 'cached' times cache hits.
+CACHE_MODES = {
+    'uncached': caching.invalidate_all,
+    'cached': None,
+}
+
+
+def parse_sizes(value):
+    """Parse ``"50x0.5,200x2"`` into ``[(members, years), ...]``."""
+    sizes = []
+    for part in value.split(','):
+        try:
+            members, years = part.lower().split('x')
+            sizes.append((int(members), float(years)))
+        except ValueError:
+            raise CommandError(f"Invalid size '{part}'; expected MEMBERSxYEARS, e.g. 200x2.")
+    return sizes
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main views and admin changelists at several data sizes on a "
+        "scratch database and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='20x0.25,100x1,300x2',
+                            help="Comma-separated MEMBERSxYEARS data sizes.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed requests per view.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for generated data.")
+        parser.add_argument('--output', default='bench_views.json', help="Where to write the JSON results.")
+        parser.add_argument('--cache', choices=['uncached', 'cached', 'both'], default='both',
+                            help="Time requests with the view cache emptied first, warm, or both.")
+
+    def handle(self, *args, **options):
+        sizes = parse_sizes(options['sizes'])
+        modes = list(CACHE_MODES) if options['cache'] == 'both' else [options['cache']]
+        results = []
+
+        with scratch_database():
+            for members, years in sizes:
+                call_command('flush', interactive=False, verbosity=0)
+                call_command('generate_data', members=members, years=years, seed=options['seed'], stdout=StringIO())
+
+                user = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+                Member.objects.filter(pk__in=Member.objects.filter(is_active=True).values('pk')[:1]).update(user=user)
+                client = Client()
+                client.force_login(user)
+
+                for name, url_name, query in VIEWS:
+                    url = reverse(url_name) + query
+                    sizes_seen = []
+
+                    def request():
+                        response = client.get(url)
+                        if response.status_code != 200:
+                            raise CommandError(f"{url} returned {response.status_code}")
+                        sizes_seen.append(len(response.content))
+
+                    for mode in modes:
+                        timing = time_call(request, repeat=options['repeat'], before=CACHE_MODES[mode])
+                        results.append({
+                            'view': name, 'url': url, 'members': members, 'years': years, 'cache': mode,
+                            'bytes': sizes_seen[-1], **timing
+                        })
+                        self.stdout.write(
+                            f"{members:>5} members x {years:<4} years  {name:<28} {mode:<8} "
+                            f"median {timing['median_ms']:>9.2f} ms  p95 {timing['p95_ms']:>9.2f} ms  "
+                            f"{timing['queries']:>4} queries  {sizes_seen[-1] / 1024:>7.1f} KiB"
+                        )
+
+            write_results(options['output'], 'views', results, sizes=sizes, repeat=options['repeat'], cache=modes)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Move every live meal record into the given storage format "
+        "(rows: one MealRecord per day, weeks: one MealWeek bitmask row per week)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', required=True, choices=sorted(storage.STORAGES), help="Target format.")
+
+    def handle(self, *args, **options):
+        try:
+            moved = storage.convert(options['to'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {moved} meal records to the '{options['to']}' format. "
+            f"Set DJANGO_MEAL_STORAGE={options['to']} and restart running servers."
+        ))
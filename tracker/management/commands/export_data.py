@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import exports
+
+
+def parse_date(value, option):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise CommandError(f"{option} must be a date in YYYY-MM-DD format.")
+
+
+class Command(BaseCommand):
+    help = "Stream meal records, payments or member statements as CSV or JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--start', help="First date to include (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last date to include (YYYY-MM-DD).")
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--period', choices=['month', 'week'], default='month',
+                            help="Statement period (statements only).")
+        parser.add_argument('--output', help="File to write (default: standard output).")
+
+    def handle(self, *args, **options):
+        chunks = exports.export(
+            options['kind'],
+            options['format'],
+            parse_date(options['start'], '--start'),
+            parse_date(options['end'], '--end'),
+            options['period']
+        )
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            output.writelines(chunks)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['kind']} export to {options['output']}."))
@@ -0,0 +1,120 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tracker import archive, balances, caching, feed, ledger
+from tracker.models import ArchivedMonth, MealPrice, Member, Payment, SerialCounter
+from tracker.pricing import invalidate_price_index
+from tracker.signals import muted
+from tracker.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate synthetic members, daily meal records, price changes and payments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=100, help="Number of members to create.")
+        parser.add_argument('--years', type=float, default=1, help="Years of daily meal records to create.")
+        parser.add_argument('--end-date', help="Last day to generate (YYYY-MM-DD, default: today).")
+        parser.add_argument('--attendance', type=float, default=0.8, help="Probability a member eats on a given day.")
+        parser.add_argument('--price-every', type=int, default=30, help="Days between price changes.")
+        parser.add_argument('--payment-every', type=int, default=30, help="Days between a member's payments.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for reproducible data.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert.")
+        parser.add_argument('--clear', action='store_true', help="Delete existing members, meals (including archived ones), prices and payments first.")
+
+    def handle(self, *args, **options):
+        if options['members'] < 0 or options['years'] < 0:
+            raise CommandError("--members and --years must not be negative.")
+        try:
+            end_date = date.fromisoformat(options['end_date']) if options['end_date'] else date.today()
+        except ValueError:
+            raise CommandError("--end-date must be a date in YYYY-MM-DD format.")
+
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        days = max(int(options['years'] * 365), 1)
+        start_date = end_date - timedelta(days=days - 1)
+        boundary = archive.archive_boundary()
+        if boundary and start_date < boundary and not options['clear']:
+            raise CommandError(f"Meals before {boundary} are archived; generate fewer years or use --clear.")
+
+        with transaction.atomic():
+            if options['clear']:
+                with muted():
+                    Member.objects.all().delete()
+                    MealPrice.objects.all().delete()
+                    SerialCounter.objects.all().delete()  # number the new members from 1 again
+                    ArchivedMonth.objects.all().delete()  # archived rows went with their members
+                archive.invalidate_boundary()
+                transaction.on_commit(archive.invalidate_boundary)
+
+            first_serial = Member.objects.allocate_serials(options['members'])
+            members = Member.objects.bulk_create(
+                [
+                    Member(name=f"Member {serial:05d}", serial_number=serial, is_active=rng.random() > 0.05)
+                    for serial in range(first_serial, first_serial + options['members'])
+                ],
+                batch_size=batch_size
+            )
+            member_ids = [member.pk for member in members]
+            if None in member_ids:
+                # Backends that can't return ids from bulk inserts.
+                member_ids = list(
+                    Member.objects.filter(serial_number__gte=first_serial).values_list('id', flat=True)
+                )
+
+            price_days = [start_date + timedelta(days=i) for i in range(0, days, max(options['price_every'], 1))]
+            existing_prices = set(MealPrice.objects.filter(date__in=price_days).values_list('date', flat=True))
+            prices = [
+                MealPrice(date=day, price_per_meal=Decimal(rng.randrange(40, 90, 5)))
+                for day in price_days
+                if day not in existing_prices
+            ]
+            MealPrice.objects.bulk_create(prices, batch_size=batch_size)
+            average_price = Decimal(65)
+
+            storage = get_storage()
+            records = {}
+            payments = []
+            meal_total = 0
+            payment_every = max(options['payment_every'], 1)
+            for member_id in member_ids:
+                attendance = min(max(rng.gauss(options['attendance'], 0.1), 0), 1)
+                unpaid_meals = 0
+                for offset in range(days):
+                    day = start_date + timedelta(days=offset)
+                    ate = rng.random() < attendance
+                    unpaid_meals += ate
+                    records[member_id, day] = (ate, 2 if ate and rng.random() < 0.05 else 1)
+                    if offset % payment_every == payment_every - 1 and unpaid_meals:
+                        share = Decimal(rng.uniform(0.7, 1.1)).quantize(Decimal('0.01'))
+                        payments.append(Payment(
+                            member_id=member_id,
+                            amount=(unpaid_meals * average_price * share).quantize(Decimal('0.01')),
+                            payment_date=day,
+                            note="Generated"
+                        ))
+                        unpaid_meals = 0
+                    if len(records) >= batch_size:
+                        meal_total += len(storage.write(records, fill_only=True))
+                        records = {}
+            if records:
+                meal_total += len(storage.write(records, fill_only=True))
+            Payment.objects.bulk_create(payments, batch_size=batch_size)
+
+            # Bulk inserts skip model signals, so rebuild derived data once.
+            invalidate_price_index()
+            transaction.on_commit(invalidate_price_index)
+            ledger.rebuild()
+            balances.rebuild(end_date)
+            caching.invalidate_all()
+            feed.reset()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(member_ids)} members, {meal_total} meal records, "
+            f"{len(prices)} prices and {len(payments)} payments ({start_date} to {end_date})."
+        ))
@@ -0,0 +1,51 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import importer
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import members, prices, meals or payments from a CSV file with a "
+        "header row. Any invalid row rolls the import back unless --skip-invalid is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(importer.IMPORTERS))
+        parser.add_argument('path', help="CSV file to import ('-' for standard input).")
+        parser.add_argument('--skip-invalid', action='store_true', help="Import the valid rows and report the rest.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without saving anything.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['path'] == '-':
+                result = importer.import_csv(
+                    options['kind'], sys.stdin, options['skip_invalid'], options['dry_run']
+                )
+            else:
+                with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                    result = importer.import_csv(
+                        options['kind'], stream, options['skip_invalid'], options['dry_run']
+                    )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f"... and {result.error_count - len(result.errors)} more errors.")
+
+        summary = (
+            f"{result.rows} rows read, {result.imported} {options['kind']} rows imported, "
+            f"{result.error_count} invalid ({elapsed:.2f}s)."
+        )
+        if result.committed:
+            self.stdout.write(self.style.SUCCESS(f"Imported: {summary}"))
+        elif options['dry_run']:
+            self.stdout.write(f"Dry run, nothing saved: {summary}")
+        else:
+            raise CommandError(f"Nothing imported: {summary} Fix the rows above or use --skip-invalid.")
@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import grid
+from tracker.models import Member
+
+
+class Command(BaseCommand):
+    help = (
+        "Create today's (or this week's) meal records for every active member "
+        "ahead of time. Existing records are left unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to fill (YYYY-MM-DD, default: today).")
+        parser.add_argument('--week', action='store_true',
+                            help="Fill the whole Saturday-Friday week containing the day.")
+        parser.add_argument('--default', choices=['skip', 'eat'], default='skip',
+                            help="Meal decision for the new records (default: skip).")
+
+    def handle(self, *args, **options):
+        day = date.today()
+        if options['date']:
+            try:
+                day = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be a date in YYYY-MM-DD format.")
+
+        days = grid.week_days(Member.get_week_start(day)) if options['week'] else [day]
+        created = grid.prepopulate(days, ate_meal=options['default'] == 'eat')
+        span = f"{days[0]} to {days[-1]}" if len(days) > 1 else str(days[0])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} meal records for {span}."))
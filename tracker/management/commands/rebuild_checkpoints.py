@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import balances
+
+
+class Command(BaseCommand):
+    help = "Rebuild balance checkpoints at every month boundary up to a date (default: today)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help="Last date to cover (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        until = None
+        if options['until']:
+            try:
+                until = date.fromisoformat(options['until'])
+            except ValueError:
+                raise CommandError("--until must be a date in YYYY-MM-DD format.")
+
+        rows = balances.rebuild(until)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt balance checkpoints: {rows} rows."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tracker import ledger
+
+
+class Command(BaseCommand):
+    help = "Rebuild the weekly ledger table from raw meals, prices and payments."
+
+    def handle(self, *args, **options):
+        rows = ledger.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt weekly ledger: {rows} rows."))
@@ -0,0 +1,219 @@
+"""
+Per-route request metrics rendered in the Prometheus text format.
+
+``MetricsMiddleware`` records latency, database query count and time,
+response size and status code for every request, keyed by the resolved URL
+pattern (not the raw path) and by method, with non-standard methods counted as
+``OTHER``, so cardinality stays bounded. Everything lives in
+process memory behind one lock; ``tracker.views.metrics`` exposes it to staff.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+
+
+class Histogram:
+    """Cumulative-bucket histogram (not thread-safe; guarded by the registry lock)."""
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.total:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RouteStats:
+    __slots__ = ('latency', 'queries', 'db_seconds', 'response_bytes', 'statuses')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.statuses = defaultdict(int)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(RouteStats)
+
+    def record(self, route, method, status, seconds, queries, db_seconds, size):
+        with self._lock:
+            stats = self._routes[(route, method)]
+            stats.latency.observe(seconds)
+            stats.queries.observe(queries)
+            stats.db_seconds += db_seconds
+            if size is not None:
+                stats.response_bytes.observe(size)
+            stats.statuses[status] += 1
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                '# HELP tracker_request_duration_seconds Request latency by route.',
+                '# TYPE tracker_request_duration_seconds histogram',
+            ]
+            for (route, method), stats in routes:
+                lines.extend(stats.latency.lines('tracker_request_duration_seconds', _labels(route, method)))
+
+            lines += [
+                '# HELP tracker_request_db_queries Database queries per request by route.',
+                '# TYPE tracker_request_db_queries histogram',
+            ]
+            for (route, method), stats in routes:
+                lines.extend(stats.queries.lines('tracker_request_db_queries', _labels(route, method)))
+
+            lines += [
+                '# HELP tracker_request_db_seconds_total Time spent in database queries by route.',
+                '# TYPE tracker_request_db_seconds_total counter',
+            ]
+            for (route, method), stats in routes:
+                lines.append(f'tracker_request_db_seconds_total{{{_labels(route, method)}}} {stats.db_seconds:.6f}')
+
+            lines += [
+                '# HELP tracker_response_size_bytes Response body size by route.',
+                '# TYPE tracker_response_size_bytes histogram',
+            ]
+            for (route, method), stats in routes:
+                if stats.response_bytes.count:
+                    lines.extend(stats.response_bytes.lines('tracker_response_size_bytes', _labels(route, method)))
+
+            lines += [
+                '# HELP tracker_responses_total Responses by route and status code.',
+                '# TYPE tracker_responses_total counter',
+            ]
+            for (route, method), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append(f'tracker_responses_total{{{_labels(route, method)},status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(route, method):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'route="{route}",method="{method}"'
+
+
+registry = Registry()
+
+
+class _QueryCounter:
+    """``connection.execute_wrapper`` hook counting queries and their duration."""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return '/' + match.route
+
+
+@sync_and_async_middleware
+class MetricsMiddleware:
+    """Record per-route latency, query count/time, response size and status."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        with _counting_queries(counter):
+            response = self.get_response(request)
+        _record(request, response, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = _QueryCounter()
+        started = time.perf_counter()
+        # Connections are per thread: hook the ones of the thread that runs
+        # this request's sync (ORM) code, and unhook them on that thread too.
+        hooks = await sync_to_async(_counting_queries)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(hooks.close)()
+        _record(request, response, time.perf_counter() - started, counter)
+        return response
+
+
+def _method(request):
+    return request.method if request.method in METHODS else 'OTHER'
+
+
+def _counting_queries(counter):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(counter))
+    return stack
+
+
+def _record(request, response, elapsed, counter):
+    size = None if response.streaming else len(response.content)
+    registry.record(
+        _route(request),
+        _method(request),
+        response.status_code,
+        elapsed,
+        counter.count,
+        counter.seconds,
+        size
+    )
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:31
+
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_ledger(apps, schema_editor):
+    """Fill the ledger from existing meals, prices and payments."""
+    MealPrice = apps.get_model('tracker', 'MealPrice')
+    MealRecord = apps.get_model('tracker', 'MealRecord')
+    Payment = apps.get_model('tracker', 'Payment')
+    WeeklyLedger = apps.get_model('tracker', 'WeeklyLedger')
+
+    prices = sorted(MealPrice.objects.values_list('date', 'price_per_meal'))
+    price_dates = [day for day, _ in prices]
+
+    def week_start(day):
+        return day - timedelta(days=(day.weekday() + 2) % 7)
+
+    totals = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for member_id, day in MealRecord.objects.filter(ate_meal=True).values_list('member_id', 'date').iterator():
+        i = bisect_right(price_dates, day) - 1
+        row = totals[(member_id, week_start(day))]
+        row[0] += 1
+        row[1] += prices[i][1] if i >= 0 else Decimal('0')
+    for member_id, day, amount in Payment.objects.values_list('member_id', 'payment_date', 'amount').iterator():
+        totals[(member_id, week_start(day))][2] += amount
+
+    WeeklyLedger.objects.bulk_create(
+        [
+            WeeklyLedger(member_id=member_id, week_start=start, meals=meals, bill=bill, paid=paid)
+            for (member_id, start), (meals, bill, paid) in totals.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0003_alter_member_serial_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('meals', models.IntegerField(default=0)),
+                ('bill', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_ledger', to='tracker.member')),
+            ],
+            options={
+                'ordering': ['-week_start', 'member__serial_number'],
+                'indexes': [models.Index(fields=['week_start'], name='tracker_wee_week_st_b756de_idx')],
+                'unique_together': {('member', 'week_start')},
+            },
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
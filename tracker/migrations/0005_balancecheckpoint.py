@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 06:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0004_weeklyledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(help_text='Totals cover everything strictly before this date')),
+                ('billed', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='tracker.member')),
+            ],
+            options={
+                'ordering': ['-as_of', 'member__serial_number'],
+                'indexes': [models.Index(fields=['as_of'], name='tracker_bal_as_of_f3ad4b_idx')],
+                'unique_together': {('member', 'as_of')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:00
+
+from django.db import migrations, models
+
+
+def seed_member_serials(apps, schema_editor):
+    """Start the member serial counter at the highest serial in use."""
+    Member = apps.get_model('tracker', 'Member')
+    SerialCounter = apps.get_model('tracker', 'SerialCounter')
+    last = Member.objects.aggregate(max=models.Max('serial_number'))['max'] or 0
+    SerialCounter.objects.create(name='member', value=last)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerialCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_member_serials, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_serialcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMonth',
+            fields=[
+                ('month', models.DateField(help_text='First day of the month', primary_key=True, serialize=False)),
+                ('records', models.IntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMealRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('ate_meal', models.BooleanField(default=False)),
+                ('meal_count', models.IntegerField(default=1)),
+                ('created_at', models.DateTimeField()),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_meal_records', to='tracker.member')),
+            ],
+            options={
+                'ordering': ['-date', 'member__serial_number'],
+                'indexes': [models.Index(fields=['date'], name='tracker_arc_date_a66baa_idx')],
+                'unique_together': {('member', 'date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyMealSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('meals', models.IntegerField(default=0)),
+                ('bill', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='tracker.member')),
+            ],
+            options={
+                'ordering': ['-month', 'member__serial_number'],
+                'indexes': [models.Index(fields=['month'], name='tracker_mon_month_7da383_idx')],
+                'unique_together': {('member', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealWeek',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('present_mask', models.PositiveSmallIntegerField(default=0, help_text='Bit i: a record exists for week_start + i days')),
+                ('ate_mask', models.PositiveSmallIntegerField(default=0, help_text='Bit i: ate on week_start + i days')),
+                ('meal_counts', models.JSONField(blank=True, default=dict, help_text='Meal counts other than 1, by day offset')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_weeks', to='tracker.member')),
+            ],
+            options={
+                'ordering': ['-week_start', 'member__serial_number'],
+                'indexes': [models.Index(fields=['week_start'], name='tracker_mea_week_st_29627d_idx')],
+                'unique_together': {('member', 'week_start')},
+            },
+        ),
+    ]
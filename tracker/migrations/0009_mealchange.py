@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-17 07:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_mealweek'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('member', models.ForeignKey(blank=True, db_constraint=False, help_text='Empty for a reset: reload the whole grid', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='tracker.member')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -1,9 +1,107 @@
-from django.db import models
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.utils import timezone
 from datetime import date, timedelta
 
 
-class Member(models.Model):
+class TracksLoadedValues(models.Model):
+    """
+    Remember the field values an instance was loaded with.
+
+    ``tracker.signals`` compares them with the saved values to also refresh
+    the ledger and balances for what a change moved away from;
+    ``Member.save`` uses them to tell an explicitly changed serial.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class MemberManager(models.Manager):
+    """
+    Serial numbers come from the ``member`` row of ``SerialCounter``.
+
+    ``allocate_serials(count)`` reserves a block of consecutive serials with
+    one ``UPDATE ... RETURNING`` (the row lock makes concurrent allocations
+    wait for each other), so members can be created with ``bulk_create``.
+    Explicit serials past the counter move it forward (``reserve_serial``).
+    """
+
+    COUNTER = 'member'
+
+    def allocate_serials(self, count=1):
+        """Reserve ``count`` new serial numbers; returns the first of the block."""
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        counters = SerialCounter.objects.using(db).filter(name=self.COUNTER)
+
+        with transaction.atomic(using=db):
+            for _ in range(2):
+                if connection.features.can_return_columns_from_insert:
+                    last = self._increment(connection, count)
+                elif counters.update(value=F('value') + count):
+                    last = counters.values_list('value', flat=True).get()
+                else:
+                    last = None
+                if last is not None:
+                    return last - count + 1
+                self._seed_counter(db)
+        raise IntegrityError("Could not allocate member serial numbers.")
+
+    def reserve_serial(self, serial):
+        """Make sure the counter never hands out ``serial`` (set explicitly)."""
+        db = router.db_for_write(self.model)
+        counters = SerialCounter.objects.using(db).filter(name=self.COUNTER)
+        if not counters.filter(value__lt=serial).update(value=serial) and not counters.exists():
+            self._seed_counter(db)
+
+    def add_members(self, names, is_active=True):
+        """Create one member per name in a single transaction; returns them in order."""
+        from . import caching, feed
+
+        names = list(names)
+        if not names:
+            return []
+        db = router.db_for_write(self.model)
+        with transaction.atomic(using=db):
+            first = self.allocate_serials(len(names))
+            members = self.using(db).bulk_create([
+                self.model(name=name, serial_number=first + i, is_active=is_active)
+                for i, name in enumerate(names)
+            ])
+            feed.reset()
+        caching.invalidate_all()
+        return members
+
+    def _increment(self, connection, count):
+        opts = SerialCounter._meta
+        qn = connection.ops.quote_name
+        value = qn(opts.get_field('value').column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {qn(opts.db_table)} SET {value} = {value} + %s '
+                f'WHERE {qn(opts.get_field("name").column)} = %s RETURNING {value}',
+                [count, self.COUNTER]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _seed_counter(self, db):
+        """Create the counter row from the highest serial in use."""
+        last = self.using(db).aggregate(max=models.Max('serial_number'))['max'] or 0
+        SerialCounter.objects.using(db).get_or_create(name=self.COUNTER, defaults={'value': last})
+
+
+class Member(TracksLoadedValues):
     """Model for tracking meal members"""
     name = models.CharField(max_length=100)
     is_active = models.BooleanField(default=True)
@@ -18,6 +116,8 @@ class Member(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = MemberManager()
+
     class Meta:
         ordering = ['serial_number']
 
@@ -27,55 +127,53 @@ class Member(models.Model):
     def save(self, *args, **kwargs):
         """Auto-assign serial if missing, while allowing admin overrides."""
         if self.serial_number is None:
-            max_serial = Member.objects.aggregate(max=models.Max('serial_number'))['max'] or 0
-            self.serial_number = max_serial + 1
+            # One transaction, so a failed insert hands its serial back.
+            try:
+                with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Member)):
+                    self.serial_number = Member.objects.allocate_serials()
+                    super().save(*args, **kwargs)
+            except Exception:
+                self.serial_number = None
+                raise
+            return
+        explicit = self.serial_number != getattr(self, '_loaded_values', {}).get('serial_number')
         super().save(*args, **kwargs)
+        if explicit:
+            Member.objects.reserve_serial(self.serial_number)
+
+    def _meal_totals(self, start_date=None):
+        from .billing import ZERO, week_totals
 
-    def get_weekly_meals(self, start_date=None):
-        """Calculate total meals for current week"""
         if not start_date:
             start_date = self.get_week_start()
-        end_date = start_date + timedelta(days=6)
-        
-        return MealRecord.objects.filter(
-            member=self,
-            date__gte=start_date,
-            date__lte=end_date,
-            ate_meal=True
-        ).count()
+        return week_totals([self.pk], start_date).get(self.pk, (0, ZERO))
+
+    def get_weekly_meals(self, start_date=None):
+        """Calculate total meals for current week"""
+        return self._meal_totals(start_date)[0]
 
     def get_weekly_total_bill(self, start_date=None):
         """Calculate total bill for current week"""
-        if not start_date:
-            start_date = self.get_week_start()
-        end_date = start_date + timedelta(days=6)
-        
-        total = 0
-        meals = MealRecord.objects.filter(
-            member=self,
-            date__gte=start_date,
-            date__lte=end_date,
-            ate_meal=True
-        )
-        
-        for meal in meals:
-            try:
-                price = MealPrice.objects.get(date=meal.date)
-                total += price.price_per_meal
-            except MealPrice.DoesNotExist:
-                pass
-        
-        return total
+        return self._meal_totals(start_date)[1]
 
     def get_total_paid(self):
         """Calculate total amount paid by member"""
-        return Payment.objects.filter(member=self).aggregate(
-            total=models.Sum('amount')
-        )['total'] or 0
+        from .billing import ZERO, paid_totals
+
+        return paid_totals([self.pk]).get(self.pk, ZERO)
 
     def get_unpaid_balance(self, start_date=None):
-        """Calculate unpaid balance"""
-        return self.get_weekly_total_bill(start_date) - self.get_total_paid()
+        """Calculate unpaid balance at the end of the week"""
+        from .billing import week_end
+
+        return self.get_balance_as_of(week_end(start_date or self.get_week_start()))
+
+    def get_balance_as_of(self, day):
+        """Everything billed minus everything paid up to and including ``day``"""
+        from .balances import ZERO, balances_as_of
+
+        billed, paid = balances_as_of([self.pk], day).get(self.pk, (ZERO, ZERO))
+        return billed - paid
 
     @staticmethod
     def get_week_start(ref_date=None):
@@ -87,7 +185,7 @@ class Member(models.Model):
         return ref_date - timedelta(days=days_since_saturday)
 
 
-class MealPrice(models.Model):
+class MealPrice(TracksLoadedValues):
     """Model for daily meal pricing"""
     date = models.DateField(unique=True)
     price_per_meal = models.DecimalField(max_digits=10, decimal_places=2)
@@ -103,17 +201,97 @@ class MealPrice(models.Model):
     @staticmethod
     def get_price_for_date(target_date):
         """Get price for a specific date, or use most recent price"""
-        try:
-            return MealPrice.objects.get(date=target_date).price_per_meal
-        except MealPrice.DoesNotExist:
-            # Get the most recent price before this date
-            recent = MealPrice.objects.filter(date__lt=target_date).first()
-            if recent:
-                return recent.price_per_meal
-            return 0
+        from .pricing import get_price_index
+
+        return get_price_index().price_for(target_date)
+
+
+class MealRecordManager(models.Manager):
+    """
+    Single-statement writes for one meal cell.
+
+    ``set_meal`` and ``toggle_meal`` run one ``INSERT ... ON CONFLICT DO UPDATE
+    ... RETURNING`` on SQLite and PostgreSQL, so concurrent clicks on the same
+    cell neither fail on the unique constraint nor lose updates. Other backends
+    fall back to ``get_or_create`` plus an F-expression ``UPDATE``. Both send
+    ``meal_records_changed`` because they bypass ``save()``. ``aset_meal`` and
+    ``atoggle_meal`` are the async variants (transactions need a sync thread).
+    With ``MEAL_STORAGE = 'weeks'`` the cell is written to its ``MealWeek``
+    instead (see ``tracker.storage``).
+    """
+
+    def set_meal(self, member, day, ate_meal):
+        """Mark ``member`` as eating (or not) on ``day``; returns the stored value."""
+        return self._upsert(member, day, ate_meal, toggle=False)
+
+    def toggle_meal(self, member, day):
+        """Flip ``member``'s meal on ``day`` (a new cell becomes eating); returns the new value."""
+        return self._upsert(member, day, True, toggle=True)
+
+    async def aset_meal(self, member, day, ate_meal):
+        return await sync_to_async(self.set_meal)(member, day, ate_meal)
+
+    async def atoggle_meal(self, member, day):
+        return await sync_to_async(self.toggle_meal)(member, day)
+
+    def _upsert(self, member, day, ate_meal, toggle):
+        from .archive import check_live
+        from .signals import meal_records_changed
+        from .storage import get_storage
+
+        check_live([day])
+        member_id = getattr(member, 'pk', member)
+        db = router.db_for_write(self.model)
+
+        with transaction.atomic(using=db):
+            ate_meal = get_storage().upsert(db, member_id, day, ate_meal, toggle)
+            meal_records_changed.send(sender=self.model, cells=[(member_id, day)])
+        return ate_meal
+
+    def upsert_row(self, db, member_id, day, ate_meal, toggle):
+        """Write one cell as a ``MealRecord`` row (``storage.RowStorage``)."""
+        connection = connections[db]
+        if connection.features.supports_update_conflicts_with_target and \
+                connection.features.can_return_columns_from_insert:
+            return self._insert_on_conflict(connection, member_id, day, ate_meal, toggle)
 
+        record, created = self.using(db).get_or_create(
+            member_id=member_id, date=day, defaults={'ate_meal': ate_meal}
+        )
+        if created:
+            return ate_meal
+        cell = self.using(db).filter(pk=record.pk)
+        cell.update(ate_meal=~F('ate_meal') if toggle else ate_meal)
+        return cell.values_list('ate_meal', flat=True).get()
+
+    def _insert_on_conflict(self, connection, member_id, day, ate_meal, toggle):
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        column = qn(opts.get_field('ate_meal').column)
+        new_value = f'NOT {table}.{column}' if toggle else f'EXCLUDED.{column}'
+        columns = ', '.join(qn(opts.get_field(name).column) for name in (
+            'member', 'date', 'ate_meal', 'meal_count', 'created_at'
+        ))
+        unique = ', '.join(qn(opts.get_field(name).column) for name in ('member', 'date'))
+        params = [
+            member_id,
+            opts.get_field('date').get_db_prep_value(day, connection),
+            ate_meal,
+            opts.get_field('meal_count').get_default(),
+            opts.get_field('created_at').get_db_prep_value(timezone.now(), connection),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s) '
+                f'ON CONFLICT ({unique}) DO UPDATE SET {column} = {new_value} '
+                f'RETURNING {column}',
+                params
+            )
+            return bool(cursor.fetchone()[0])
 
-class MealRecord(models.Model):
+
+class MealRecord(TracksLoadedValues):
     """Model for tracking daily meals"""
     member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='meal_records')
     date = models.DateField()
@@ -121,6 +299,8 @@ class MealRecord(models.Model):
     meal_count = models.IntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = MealRecordManager()
+
     class Meta:
         unique_together = ['member', 'date']
         ordering = ['-date', 'member__serial_number']
@@ -129,8 +309,155 @@ class MealRecord(models.Model):
         status = "Ate" if self.ate_meal else "Didn't eat"
         return f"{self.member.name} - {self.date}: {status}"
 
+    def clean(self):
+        from .archive import ArchivedDateError, check_live
+
+        if self.date:
+            try:
+                check_live([self.date])
+            except ArchivedDateError as exc:
+                raise ValidationError({'date': str(exc)})
+
+
+class MealWeekManager(models.Manager):
+    """
+    Single-statement writes for one day of a ``MealWeek``.
+
+    Like ``MealRecordManager``: one ``INSERT ... ON CONFLICT DO UPDATE ...
+    RETURNING`` sets the day's bit in ``present_mask`` and sets, clears or
+    flips it in ``ate_mask``, so concurrent clicks on different days of the
+    same week don't overwrite each other. Other backends lock the week row.
+    """
+
+    def upsert_day(self, db, member_id, day, ate_meal, toggle):
+        """Write one day (``storage.WeekStorage``); returns the stored value."""
+        week_start = Member.get_week_start(day)
+        bit = 1 << (day - week_start).days
+        connection = connections[db]
+        if connection.features.supports_update_conflicts_with_target and \
+                connection.features.can_return_columns_from_insert:
+            return self._insert_on_conflict(connection, member_id, week_start, bit, ate_meal, toggle)
+
+        week, _ = self.using(db).select_for_update().get_or_create(member_id=member_id, week_start=week_start)
+        if toggle:
+            # A new cell becomes eating.
+            ate_meal = not (week.present_mask & bit and week.ate_mask & bit)
+        week.set_day(day, ate_meal)
+        week.save(using=db, update_fields=['present_mask', 'ate_mask', 'meal_counts'])
+        return ate_meal
+
+    def _insert_on_conflict(self, connection, member_id, week_start, bit, ate_meal, toggle):
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        present, ate = (f'{table}.{qn(opts.get_field(name).column)}' for name in ('present_mask', 'ate_mask'))
+        if toggle:
+            new_value = f'CASE WHEN ({present} & {bit}) <> 0 AND ({ate} & {bit}) <> 0 THEN {ate} - {bit} ELSE ({ate} | {bit}) END'
+        elif ate_meal:
+            new_value = f'({ate} | {bit})'
+        else:
+            new_value = f'(({ate} | {bit}) - {bit})'
+        columns = ', '.join(qn(opts.get_field(name).column) for name in (
+            'member', 'week_start', 'present_mask', 'ate_mask', 'meal_counts', 'created_at'
+        ))
+        unique = ', '.join(qn(opts.get_field(name).column) for name in ('member', 'week_start'))
+        params = [
+            member_id,
+            opts.get_field('week_start').get_db_prep_value(week_start, connection),
+            bit,
+            bit if ate_meal or toggle else 0,
+            opts.get_field('meal_counts').get_db_prep_save({}, connection),
+            opts.get_field('created_at').get_db_prep_value(timezone.now(), connection),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s, %s) '
+                f'ON CONFLICT ({unique}) DO UPDATE SET '
+                f'{qn(opts.get_field("present_mask").column)} = ({present} | {bit}), '
+                f'{qn(opts.get_field("ate_mask").column)} = {new_value} '
+                f'RETURNING {qn(opts.get_field("ate_mask").column)}',
+                params
+            )
+            return bool(cursor.fetchone()[0] & bit)
+
+
+class MealWeek(models.Model):
+    """One member's meals in one Saturday-Friday week as day bitmasks (see tracker.storage)"""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='meal_weeks')
+    week_start = models.DateField()
+    present_mask = models.PositiveSmallIntegerField(default=0, help_text="Bit i: a record exists for week_start + i days")
+    ate_mask = models.PositiveSmallIntegerField(default=0, help_text="Bit i: ate on week_start + i days")
+    meal_counts = models.JSONField(default=dict, blank=True, help_text="Meal counts other than 1, by day offset")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = MealWeekManager()
+
+    class Meta:
+        unique_together = ['member', 'week_start']
+        ordering = ['-week_start', 'member__serial_number']
+        indexes = [models.Index(fields=['week_start'])]
+
+    def __str__(self):
+        return f"{self.member.name} - week of {self.week_start}: {self.ate_mask.bit_count()} meals"
+
+    @staticmethod
+    def days(week_start, present_mask, ate_mask, meal_counts):
+        """Yield ``(date, ate_meal, meal_count)`` for the days with a record."""
+        for offset in range(7):
+            bit = 1 << offset
+            if present_mask & bit:
+                yield week_start + timedelta(days=offset), bool(ate_mask & bit), meal_counts.get(str(offset), 1)
+
+    def records(self, start_date, end_date):
+        """The days between the dates as unsaved ``MealRecord`` objects."""
+        return [
+            MealRecord(member_id=self.member_id, date=day, ate_meal=ate_meal, meal_count=meal_count,
+                       created_at=self.created_at)
+            for day, ate_meal, meal_count in self.days(self.week_start, self.present_mask, self.ate_mask, self.meal_counts)
+            if start_date <= day <= end_date
+        ]
+
+    def has_day(self, day):
+        return bool(self.present_mask & 1 << (day - self.week_start).days)
+
+    def set_day(self, day, ate_meal, meal_count=None):
+        """Record ``day``; ``meal_count=None`` keeps the stored count (1 for a new day)."""
+        offset = (day - self.week_start).days
+        bit = 1 << offset
+        if meal_count is None and not self.present_mask & bit:
+            meal_count = 1
+        self.present_mask |= bit
+        self.ate_mask = self.ate_mask | bit if ate_meal else self.ate_mask & ~bit
+        if meal_count == 1:
+            self.meal_counts.pop(str(offset), None)
+        elif meal_count is not None:
+            self.meal_counts[str(offset)] = meal_count
+
+    def clear_day(self, day):
+        offset = (day - self.week_start).days
+        self.present_mask &= ~(1 << offset)
+        self.ate_mask &= ~(1 << offset)
+        self.meal_counts.pop(str(offset), None)
+
+
+class MealChange(models.Model):
+    """One entry of the daily meals change feed; the id is the feed version (see tracker.feed)"""
+    # No constraint: deleting a member logs its cascaded meal deletions.
+    member = models.ForeignKey(Member, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                               related_name='+', help_text="Empty for a reset: reload the whole grid")
+    date = models.DateField(null=True, blank=True)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        if self.member_id is None:
+            return f"#{self.pk}: reset"
+        return f"#{self.pk}: member {self.member_id} on {self.date}"
+
 
-class Payment(models.Model):
+class Payment(TracksLoadedValues):
     """Model for tracking payments"""
     member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -143,3 +470,94 @@ class Payment(models.Model):
 
     def __str__(self):
         return f"{self.member.name} - {self.amount} Tk on {self.payment_date}"
+
+
+class SerialCounter(models.Model):
+    """Last number handed out by a named counter (see ``MemberManager``)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class WeeklyLedger(models.Model):
+    """Materialized per-member weekly totals, kept in sync by tracker.ledger"""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='weekly_ledger')
+    week_start = models.DateField()
+    meals = models.IntegerField(default=0)
+    bill = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['member', 'week_start']
+        ordering = ['-week_start', 'member__serial_number']
+        indexes = [models.Index(fields=['week_start'])]
+
+    def __str__(self):
+        return f"{self.member.name} - week of {self.week_start}: {self.bill} Tk"
+
+
+class BalanceCheckpoint(models.Model):
+    """Cumulative billed/paid totals for a member before a period boundary"""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    as_of = models.DateField(help_text="Totals cover everything strictly before this date")
+    billed = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['member', 'as_of']
+        ordering = ['-as_of', 'member__serial_number']
+        indexes = [models.Index(fields=['as_of'])]
+
+    def __str__(self):
+        return f"{self.member.name} before {self.as_of}: {self.billed - self.paid} Tk due"
+
+
+class ArchivedMonth(models.Model):
+    """A month whose meal records were moved to the archive (see tracker.archive)"""
+    month = models.DateField(primary_key=True, help_text="First day of the month")
+    records = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.month:%B %Y}: {self.records} records archived"
+
+
+class MonthlyMealSummary(models.Model):
+    """Meals eaten and billed by a member in one archived month"""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='monthly_summaries')
+    month = models.DateField(help_text="First day of the month")
+    meals = models.IntegerField(default=0)
+    bill = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['member', 'month']
+        ordering = ['-month', 'member__serial_number']
+        indexes = [models.Index(fields=['month'])]
+
+    def __str__(self):
+        return f"{self.member.name} - {self.month:%B %Y}: {self.bill} Tk"
+
+
+class ArchivedMealRecord(models.Model):
+    """A ``MealRecord`` row moved out of the live table by tracker.archive"""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='archived_meal_records')
+    date = models.DateField()
+    ate_meal = models.BooleanField(default=False)
+    meal_count = models.IntegerField(default=1)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['member', 'date']
+        ordering = ['-date', 'member__serial_number']
+        indexes = [models.Index(fields=['date'])]
+
+    def __str__(self):
+        status = "Ate" if self.ate_meal else "Didn't eat"
+        return f"{self.member.name} - {self.date}: {status} (archived)"
@@ -0,0 +1,145 @@
+"""
+In-process index of effective meal prices.
+
+``MealPrice`` rows are sparse: a price applies from its date until the next
+price row (carry-forward). The index keeps the dates and prices sorted in
+memory so any number of dates can be resolved with binary search and no
+queries. Each process keeps its own copy, tagged with a version counter in
+the shared cache; saving or deleting a ``MealPrice`` bumps the counter (see
+``tracker.signals``), and every process reloads its index on its next lookup.
+A transaction that changes prices uses an index of its own until it commits
+or rolls back, so an index holding uncommitted prices is never shared.
+``price_expression`` turns the index into SQL for aggregate queries.
+"""
+import threading
+from bisect import bisect_right
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models import Case, Value, When
+
+ZERO = Decimal('0')
+
+
+class PriceIndex:
+    """Sorted, immutable view of ``MealPrice`` rows with carry-forward lookups."""
+
+    def __init__(self, rows):
+        rows = sorted(rows)
+        self.dates = [day for day, _ in rows]
+        self.prices = [price for _, price in rows]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def price_for(self, day):
+        """Price in effect on ``day``; 0 before the first price was set."""
+        i = bisect_right(self.dates, day) - 1
+        return self.prices[i] if i >= 0 else ZERO
+
+    def prices_for(self, days):
+        """Resolve many dates at once, returning ``{day: price}``."""
+        return {day: self.price_for(day) for day in days}
+
+    def segments(self, start_date, end_date):
+        """
+        Split ``[start_date, end_date]`` into runs with a constant price.
+
+        Returns ``(first_day, last_day, price)`` tuples covering only the days
+        that have a price in effect (days before the first price are skipped).
+        """
+        if start_date > end_date or not self.dates:
+            return []
+
+        i = max(bisect_right(self.dates, start_date) - 1, 0)
+        segments = []
+        while i < len(self.dates) and self.dates[i] <= end_date:
+            first = max(self.dates[i], start_date)
+            if i + 1 < len(self.dates):
+                last = min(self.dates[i + 1] - timedelta(days=1), end_date)
+            else:
+                last = end_date
+            if first <= last:
+                segments.append((first, last, self.prices[i]))
+            i += 1
+        return segments
+
+
+VERSION_KEY = 'tracker:version:prices'
+
+# ``(version, index)``: the index and the shared version it was loaded at.
+_loaded = None
+
+# Per thread: ``marker``, an on-commit callback registered by a transaction
+# that changed prices, and ``loaded``, the ``(version, index)`` it sees.
+_uncommitted = threading.local()
+
+
+def _pending():
+    """Whether this thread's open transaction has uncommitted price changes."""
+    # Django drops on-commit callbacks when their transaction (or savepoint)
+    # rolls back, and runs and drops them when it commits.
+    marker = getattr(_uncommitted, 'marker', None)
+    return marker is not None and any(callback is marker for _, callback, _ in connection.run_on_commit)
+
+
+def get_price_index():
+    """Return the cached index, loading it with one query if it is stale."""
+    global _loaded
+    from .caching import shared_version
+
+    version = shared_version(VERSION_KEY)
+    if _pending():
+        loaded = _uncommitted.loaded
+        if loaded is None or loaded[0] != version:
+            loaded = _uncommitted.loaded = (version, _load())
+        return loaded[1]
+
+    loaded = _loaded
+    if loaded is not None and loaded[0] == version:
+        return loaded[1]
+
+    # Read before loading: a change committed meanwhile bumps the version
+    # again, so an index that missed it is never current.
+    index = _load()
+    _loaded = (version, index)
+    return index
+
+
+def _load():
+    from .models import MealPrice
+
+    return PriceIndex(MealPrice.objects.values_list('date', 'price_per_meal').order_by())
+
+
+def invalidate_price_index():
+    """
+    Make every process's index stale; each reloads it on its next lookup.
+
+    Writers call this both before and after their transaction commits.
+    """
+    global _loaded
+    from .caching import bump_version
+
+    _loaded = None
+    _uncommitted.loaded = None
+    if connection.in_atomic_block and not _pending():
+        _uncommitted.marker = lambda: None
+        transaction.on_commit(_uncommitted.marker)
+    bump_version(VERSION_KEY)
+
+
+def price_expression(start_date, end_date):
+    """Build a CASE expression that prices a meal row by its ``date``."""
+    whens = [
+        When(date__gte=first, date__lte=last, then=Value(price))
+        for first, last, price in get_price_index().segments(start_date, end_date)
+    ]
+    if not whens:
+        return Value(ZERO, output_field=models.DecimalField(max_digits=12, decimal_places=2))
+    return Case(
+        *whens,
+        default=Value(ZERO),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2)
+    )
@@ -0,0 +1,182 @@
+"""
+Optional read-replica routing for the reporting pages.
+
+Installed by ``settings.py`` when a ``replica`` database is configured.
+Reads go to the replica only inside ``reporting()`` (the dashboard, the
+exports and admin changelists, via ``reporting_view``) and only while the
+current request has not written anything. Every write, and every read
+outside a reporting block, uses ``default``.
+
+Read-your-own-writes: a write pins the rest of the request to the primary,
+and ``ReplicaRoutingMiddleware`` keeps the browser pinned for
+``REPLICA_MAX_LAG`` seconds with a cookie, so the page shown after a POST
+never comes from a replica that hasn't caught up yet. Derived data that is
+written back (balance checkpoints) is always built from the primary with
+``primary()``.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_pin'
+
+_reporting = contextvars.ContextVar('tracker_db_reporting', default=False)
+_pinned = contextvars.ContextVar('tracker_db_pinned', default=False)  # by the cookie
+_wrote = contextvars.ContextVar('tracker_db_wrote', default=False)
+_deriving = contextvars.ContextVar('tracker_db_deriving', default=False)  # inside primary()
+
+
+def max_lag():
+    """Seconds the replica may trail the primary (``settings.REPLICA_MAX_LAG``)."""
+    return getattr(settings, 'REPLICA_MAX_LAG', 5)
+
+
+@contextmanager
+def reporting():
+    """Let reads in the block use the replica (unless pinned to the primary)."""
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+@contextmanager
+def primary():
+    """
+    Read from the primary in the block, for building derived data.
+
+    Writes in the block only store what was derived from the primary, so
+    they don't pin the request (or the browser) to it.
+    """
+    tokens = _reporting.set(False), _deriving.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(tokens[0])
+        _deriving.reset(tokens[1])
+
+
+def reporting_view(view):
+    """Run a (sync or async) view inside ``reporting()``."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            with reporting():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with reporting():
+                return view(*args, **kwargs)
+    return wrapper
+
+
+def _routes_to_replica():
+    return _reporting.get() and not _pinned.get() and not _wrote.get()
+
+
+def reading_from_replica():
+    """True when reads right now go to a configured replica."""
+    return _routes_to_replica() and any(isinstance(installed, ReplicaRouter) for installed in router.routers)
+
+
+def reporting_iterator(iterable):
+    """
+    Iterate ``iterable`` with each step inside ``reporting()``.
+
+    For streaming responses, which are consumed after the view (and the
+    middleware) have returned: each step runs in a copy of the request's
+    routing state, so a pinned request keeps reading from the primary.
+    """
+    return _iterate_in(contextvars.copy_context(), iter(iterable))
+
+
+def _iterate_in(context, iterator):
+    def step():
+        with reporting():
+            return next(iterator)
+
+    while True:
+        try:
+            item = context.run(step)
+        except StopIteration:
+            return
+        yield item
+
+
+class ReplicaRouter:
+    """Send reporting reads to the replica; everything else to ``default``."""
+
+    replica_alias = REPLICA
+
+    def db_for_read(self, model, **hints):
+        if _routes_to_replica():
+            return self.replica_alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not _deriving.get():
+            _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        databases = {DEFAULT_DB_ALIAS, self.replica_alias}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Reset routing per request and pin recent writers to the primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        tokens = self._start(request)
+        try:
+            response = self.get_response(request)
+            self._finish(response)
+        finally:
+            self._reset(tokens)
+        return response
+
+    async def __acall__(self, request):
+        tokens = self._start(request)
+        try:
+            response = await self.get_response(request)
+            self._finish(response)
+        finally:
+            self._reset(tokens)
+        return response
+
+    def _start(self, request):
+        # Worker threads reuse their context between requests: start clean.
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        return _reporting.set(False), _pinned.set(pinned), _wrote.set(False)
+
+    def _finish(self, response):
+        if _wrote.get():
+            lag = max_lag()
+            response.set_cookie(PIN_COOKIE, str(int(time.time() + lag)), max_age=lag,
+                                httponly=True, samesite='Lax')
+
+    def _reset(self, tokens):
+        for var, token in zip((_reporting, _pinned, _wrote), tokens):
+            var.reset(token)
@@ -0,0 +1,114 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import archive, balances, caching, feed, ledger
+from .models import MealPrice, MealRecord, Member, Payment
+from .pricing import invalidate_price_index
+
+# Sent by bulk write paths that bypass model signals (bulk upserts, raw SQL).
+# ``cells`` is a list of ``(member_id, date)`` pairs that changed.
+meal_records_changed = Signal()
+
+_state = threading.local()
+
+
+@contextmanager
+def muted():
+    """
+    Skip derived-data maintenance in this thread for the duration of the block.
+
+    For bulk jobs that rebuild the ledger and checkpoints themselves afterwards.
+    The price index is still invalidated.
+    """
+    previous = getattr(_state, 'muted', False)
+    _state.muted = True
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
+
+def _is_muted():
+    return getattr(_state, 'muted', False)
+
+
+def _loaded(instance, field):
+    """Value ``field`` had when ``instance`` was loaded (or last saved), or ``None`` if new."""
+    return getattr(instance, '_loaded_values', {}).get(field)
+
+
+def _remember(instance, *fields):
+    """Record the saved values, so saving the instance again also refreshes what it moves away from."""
+    instance._loaded_values = {
+        **getattr(instance, '_loaded_values', {}),
+        **{field: getattr(instance, field) for field in fields},
+    }
+
+
+def _refresh(cells):
+    """Update derived tables and caches for changed ``(member_id, date)`` cells."""
+    if _is_muted() or not cells:
+        return
+    ledger.refresh(cells)
+    balances.invalidate(min(day for _, day in cells), {member_id for member_id, _ in cells})
+    caching.invalidate_cells(cells)
+
+
+@receiver(post_save, sender=MealPrice)
+@receiver(post_delete, sender=MealPrice)
+def price_changed(sender, instance, **kwargs):
+    """Drop the price index and re-bill every week (and archived month) the price applies to."""
+    invalidate_price_index()
+    transaction.on_commit(invalidate_price_index)
+
+    days = [instance.date]
+    if _loaded(instance, 'date'):
+        days.append(_loaded(instance, 'date'))
+    _remember(instance, 'date')
+    if _is_muted():
+        return
+    archive.reprice(min(days))
+    ledger.refresh_for_price(*days)
+    balances.invalidate(min(days))
+    caching.invalidate_all()
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def member_changed(sender, **kwargs):
+    caching.invalidate_all()
+    if not _is_muted():
+        feed.reset()
+
+
+@receiver(post_save, sender=MealRecord)
+@receiver(post_delete, sender=MealRecord)
+def meal_record_changed(sender, instance, **kwargs):
+    cells = [(instance.member_id, instance.date)]
+    if _loaded(instance, 'date'):
+        cells.append((_loaded(instance, 'member_id'), _loaded(instance, 'date')))
+    _refresh(cells)
+    if not _is_muted():
+        feed.record(cells)
+    _remember(instance, 'member_id', 'date')
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def payment_changed(sender, instance, **kwargs):
+    cells = [(instance.member_id, instance.payment_date)]
+    if _loaded(instance, 'payment_date'):
+        cells.append((_loaded(instance, 'member_id'), _loaded(instance, 'payment_date')))
+    _refresh(cells)
+    _remember(instance, 'member_id', 'payment_date')
+
+
+@receiver(meal_records_changed)
+def meal_records_bulk_changed(sender, cells, **kwargs):
+    _refresh(cells)
+    if not _is_muted() and cells:
+        feed.record(cells)
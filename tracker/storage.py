@@ -0,0 +1,348 @@
+"""
+Storage formats for live meal attendance.
+
+``settings.MEAL_STORAGE`` picks one of two interchangeable formats:
+
+* ``'rows'`` (default): one ``MealRecord`` per member and day.
+* ``'weeks'``: one ``MealWeek`` per member and Saturday-Friday week, with a
+  7-bit mask of the days that have a record, a 7-bit mask of the days eaten
+  and the few meal counts other than 1. About a seventh of the rows, and no
+  per-day index entries or timestamps.
+
+Everything that reads or writes live meals goes through ``get_storage()``:
+the cell upserts behind ``MealRecord.objects.set_meal``/``toggle_meal``, the
+grid (``load_week_records``, ``apply_meal_changes``, ``prepopulate``),
+``billing.meal_totals``, exports, imports and archiving. Both formats hand
+out ``MealRecord`` objects (unsaved ones for weeks), so pages and caches
+don't care which is in use. ``convert`` moves the data from one format to
+the other (``manage.py convert_meal_storage``).
+"""
+from datetime import date, timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Min, Sum
+
+from .models import MealRecord, MealWeek, Member
+from .pricing import ZERO, get_price_index, price_expression
+
+BATCH_SIZE = 2000
+
+
+class RowStorage:
+    """One ``MealRecord`` row per member and day."""
+
+    name = 'rows'
+    model = MealRecord
+
+    def records(self, members, start_date, end_date):
+        """``MealRecord``s of ``members`` between the dates (inclusive)."""
+        return MealRecord.objects.filter(
+            member__in=members,
+            date__gte=start_date,
+            date__lte=end_date
+        ).order_by()
+
+    def upsert(self, db, member_id, day, ate_meal, toggle):
+        """Set or toggle one cell in a single statement; returns the stored value."""
+        return MealRecord.objects.upsert_row(db, member_id, day, ate_meal, toggle)
+
+    def write(self, cells, fill_only=False):
+        """
+        Store ``{(member_id, date): (ate_meal, meal_count)}``.
+
+        ``meal_count`` may be ``None`` to keep the stored count. With
+        ``fill_only`` existing cells are left alone. Returns the cells written.
+        """
+        if fill_only:
+            member_ids = {member_id for member_id, _ in cells}
+            days = [day for _, day in cells]
+            existing = set(self.records(member_ids, min(days), max(days)).values_list('member_id', 'date'))
+            cells = {cell: value for cell, value in cells.items() if cell not in existing}
+            # ignore_conflicts covers rows created by a click since the read above.
+            MealRecord.objects.bulk_create(
+                [
+                    MealRecord(member_id=member_id, date=day, ate_meal=ate_meal, meal_count=meal_count or 1)
+                    for (member_id, day), (ate_meal, meal_count) in cells.items()
+                ],
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True
+            )
+            return list(cells)
+
+        without_count = []
+        with_count = []
+        for (member_id, day), (ate_meal, meal_count) in cells.items():
+            if meal_count is None:
+                without_count.append(MealRecord(member_id=member_id, date=day, ate_meal=ate_meal))
+            else:
+                with_count.append(MealRecord(member_id=member_id, date=day, ate_meal=ate_meal, meal_count=meal_count))
+        if without_count:
+            MealRecord.objects.bulk_create(
+                without_count,
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['member', 'date'],
+                update_fields=['ate_meal']
+            )
+        if with_count:
+            MealRecord.objects.bulk_create(
+                with_count,
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['member', 'date'],
+                update_fields=['ate_meal', 'meal_count']
+            )
+        return list(cells)
+
+    def totals(self, members, start_date, end_date):
+        """``{member_id: (meals, bill)}`` for meals eaten between the dates."""
+        rows = (
+            MealRecord.objects.filter(
+                member__in=members,
+                date__gte=start_date,
+                date__lte=end_date,
+                ate_meal=True
+            )
+            .order_by()
+            .values('member_id')
+            .annotate(meals=Count('id'), bill=Sum(price_expression(start_date, end_date)))
+        )
+        return {row['member_id']: (row['meals'], row['bill'] or ZERO) for row in rows}
+
+    def export_rows(self, start_date=None, end_date=None, chunk_size=BATCH_SIZE):
+        """``(member_id, serial_number, name, date, ate_meal, meal_count)`` by date and serial."""
+        records = MealRecord.objects.all()
+        if start_date:
+            records = records.filter(date__gte=start_date)
+        if end_date:
+            records = records.filter(date__lte=end_date)
+        return records.order_by('date', 'member__serial_number').values_list(
+            'member_id', 'member__serial_number', 'member__name', 'date', 'ate_meal', 'meal_count'
+        ).iterator(chunk_size=chunk_size)
+
+    def first_date(self, before=None):
+        records = MealRecord.objects.filter(date__lt=before) if before else MealRecord.objects.all()
+        return records.aggregate(first=Min('date'))['first']
+
+    def last_date(self):
+        return MealRecord.objects.aggregate(last=Max('date'))['last']
+
+    def count(self, before):
+        return MealRecord.objects.filter(date__lt=before).count()
+
+    def take(self, start_date, end_date):
+        """Remove the records in ``[start_date, end_date)`` and return them."""
+        from .signals import muted
+
+        records = MealRecord.objects.filter(date__gte=start_date, date__lt=end_date).order_by()
+        taken = list(records)
+        # Callers store the records elsewhere: derived data stays valid.
+        with muted():
+            records.delete()
+        return taken
+
+
+def _week_start(day):
+    """``Member.get_week_start`` that also takes open-ended ranges (``date.min``)."""
+    return Member.get_week_start(day) if day > date.min + timedelta(days=6) else date.min
+
+
+class WeekStorage:
+    """One ``MealWeek`` row of day bitmasks per member and week."""
+
+    name = 'weeks'
+    model = MealWeek
+
+    def _weeks(self, members, start_date, end_date):
+        return MealWeek.objects.filter(
+            member__in=members,
+            week_start__gte=_week_start(start_date),
+            week_start__lte=end_date
+        ).order_by()
+
+    def records(self, members, start_date, end_date):
+        weeks = self._weeks(members, start_date, end_date).values_list(
+            'member_id', 'week_start', 'present_mask', 'ate_mask', 'meal_counts', 'created_at'
+        )
+        return [
+            MealRecord(member_id=member_id, date=day, ate_meal=ate_meal, meal_count=meal_count, created_at=created_at)
+            for member_id, week_start, present, ate, counts, created_at in weeks
+            for day, ate_meal, meal_count in MealWeek.days(week_start, present, ate, counts)
+            if start_date <= day <= end_date
+        ]
+
+    def upsert(self, db, member_id, day, ate_meal, toggle):
+        return MealWeek.objects.upsert_day(db, member_id, day, ate_meal, toggle)
+
+    def _locked_weeks(self, cells):
+        """``{(member_id, week_start): MealWeek}`` for ``cells``, created if missing and locked."""
+        keys = {(member_id, Member.get_week_start(day)) for member_id, day in cells}
+        MealWeek.objects.bulk_create(
+            [MealWeek(member_id=member_id, week_start=week_start) for member_id, week_start in keys],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        weeks = MealWeek.objects.select_for_update().filter(
+            member_id__in={member_id for member_id, _ in keys},
+            week_start__in={week_start for _, week_start in keys}
+        ).order_by()
+        return {(week.member_id, week.week_start): week for week in weeks if (week.member_id, week.week_start) in keys}
+
+    def write(self, cells, fill_only=False):
+        weeks = self._locked_weeks(cells)
+        written = []
+        for (member_id, day), (ate_meal, meal_count) in cells.items():
+            week = weeks[member_id, Member.get_week_start(day)]
+            if fill_only and week.has_day(day):
+                continue
+            week.set_day(day, ate_meal, meal_count)
+            written.append((member_id, day))
+        MealWeek.objects.bulk_update(weeks.values(), ['present_mask', 'ate_mask', 'meal_counts'], batch_size=BATCH_SIZE)
+        return written
+
+    def totals(self, members, start_date, end_date):
+        # One row per member-week; each (week, mask) is priced once from the
+        # price index, since members mostly share a handful of masks.
+        index = get_price_index()
+        weeks = self._weeks(members, start_date, end_date).filter(ate_mask__gt=0)
+        priced = {}
+        totals = {}
+        for member_id, week_start, ate_mask in weeks.values_list('member_id', 'week_start', 'ate_mask'):
+            week = priced.get((week_start, ate_mask))
+            if week is None:
+                days = [
+                    week_start + timedelta(days=offset)
+                    for offset in range(7)
+                    if ate_mask & 1 << offset and start_date <= week_start + timedelta(days=offset) <= end_date
+                ]
+                week = priced[week_start, ate_mask] = (len(days), sum((index.price_for(day) for day in days), ZERO))
+            meals, bill = totals.get(member_id, (0, ZERO))
+            totals[member_id] = (meals + week[0], bill + week[1])
+        return {member_id: (meals, bill) for member_id, (meals, bill) in totals.items() if meals}
+
+    def export_rows(self, start_date=None, end_date=None, chunk_size=BATCH_SIZE):
+        weeks = MealWeek.objects.all()
+        if start_date:
+            weeks = weeks.filter(week_start__gte=_week_start(start_date))
+        if end_date:
+            weeks = weeks.filter(week_start__lte=end_date)
+        rows = weeks.order_by('week_start', 'member__serial_number').values_list(
+            'member_id', 'member__serial_number', 'member__name', 'week_start', 'present_mask', 'ate_mask', 'meal_counts'
+        ).iterator(chunk_size=chunk_size)
+        for _, week in groupby(rows, key=lambda row: row[3]):
+            days = [
+                (member_id, serial, name, day, ate_meal, meal_count)
+                for member_id, serial, name, week_start, present, ate, counts in week
+                for day, ate_meal, meal_count in MealWeek.days(week_start, present, ate, counts)
+                if (not start_date or day >= start_date) and (not end_date or day <= end_date)
+            ]
+            # Stable sort: members stay in serial order within each day.
+            yield from sorted(days, key=lambda row: row[3])
+
+    def first_date(self, before=None):
+        weeks = MealWeek.objects.filter(present_mask__gt=0)
+        if before:
+            weeks = weeks.filter(week_start__lt=before)
+        first = weeks.aggregate(first=Min('week_start'))['first']
+        if first is None:
+            return None
+        days = [day for week in weeks.filter(week_start=first) for day, _, _ in week.days(
+            week.week_start, week.present_mask, week.ate_mask, week.meal_counts
+        )]
+        days = [day for day in days if not before or day < before]
+        return min(days) if days else None
+
+    def last_date(self):
+        weeks = MealWeek.objects.filter(present_mask__gt=0)
+        last = weeks.aggregate(last=Max('week_start'))['last']
+        if last is None:
+            return None
+        return max(day for week in weeks.filter(week_start=last) for day, _, _ in week.days(
+            week.week_start, week.present_mask, week.ate_mask, week.meal_counts
+        ))
+
+    def count(self, before):
+        return sum(
+            1
+            for week in MealWeek.objects.filter(week_start__lt=before).order_by().iterator(chunk_size=BATCH_SIZE)
+            for day, _, _ in week.days(week.week_start, week.present_mask, week.ate_mask, week.meal_counts)
+            if day < before
+        )
+
+    def take(self, start_date, end_date):
+        weeks = list(MealWeek.objects.select_for_update().filter(
+            week_start__gte=_week_start(start_date),
+            week_start__lt=end_date
+        ).order_by())
+        taken = []
+        for week in weeks:
+            records = week.records(start_date, end_date - timedelta(days=1))
+            for record in records:
+                week.clear_day(record.date)
+            taken.extend(records)
+        MealWeek.objects.bulk_update(weeks, ['present_mask', 'ate_mask', 'meal_counts'], batch_size=BATCH_SIZE)
+        MealWeek.objects.filter(pk__in=[week.pk for week in weeks if not week.present_mask]).delete()
+        return taken
+
+
+STORAGES = {storage.name: storage for storage in (RowStorage(), WeekStorage())}
+
+
+def get_storage(name=None):
+    """The storage named ``name``, by default the configured ``settings.MEAL_STORAGE``."""
+    return STORAGES[name or getattr(settings, 'MEAL_STORAGE', 'rows')]
+
+
+def convert(target):
+    """
+    Move every live meal record into the ``target`` format, a month at a time,
+    in one transaction. Returns the number of records moved.
+    """
+    from . import caching
+
+    source = next(storage for name, storage in STORAGES.items() if name != target)
+    target = STORAGES[target]
+    moved = 0
+    with transaction.atomic(using=router.db_for_write(MealRecord)):
+        if target.last_date() is not None and source.last_date() is not None:
+            raise ValueError(f"Both formats hold meal records; expected only '{source.name}'.")
+        first, last = source.first_date(), source.last_date()
+        month = first.replace(day=1) if first else None
+        while month and month <= last:
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            cells = {
+                (record.member_id, record.date): (record.ate_meal, record.meal_count)
+                for record in source.take(month, next_month)
+            }
+            if cells:
+                target.write(cells)
+            moved += len(cells)
+            month = next_month
+        # Same data, new objects: drop cached grids.
+        caching.invalidate_all()
+    return moved
+
+
+def table_sizes(db=None):
+    """
+    Bytes used by each format's table and its indexes (SQLite ``dbstat``;
+    PostgreSQL ``pg_total_relation_size``).
+    """
+    connection = connections[db or router.db_for_read(MealRecord)]
+    sizes = {}
+    with connection.cursor() as cursor:
+        for name, storage in STORAGES.items():
+            table = storage.model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+                sizes[name] = cursor.fetchone()[0]
+                continue
+            cursor.execute(
+                "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = %s "
+                "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                [table, table]
+            )
+            sizes[name] = cursor.fetchone()[0]
+    return sizes
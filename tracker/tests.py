@@ -1,3 +1,1848 @@
-from django.test import TestCase
+import contextlib
+import contextvars
+import importlib.util
+import json
+import os
+import random
+import tempfile
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+import desktop_main
+from meal_tracker import settings as project_settings
+
+from . import (
+    archive, async_views, balances, caching, exports, feed, importer, ledger, pricing, routers, storage,
+    urls as tracker_urls,
+)
+from .billing import meal_totals, paid_totals, weekly_summary
+from .grid import apply_meal_changes, build_week_matrix, load_week_records, prepopulate, week_days
+from .management.commands import benchmark_views
+from .metrics import registry as metrics_registry
+from .models import (
+    ArchivedMealRecord, ArchivedMonth, BalanceCheckpoint, MealChange, MealPrice, MealRecord, MealWeek, Member, MonthlyMealSummary, Payment,
+    SerialCounter, WeeklyLedger,
+)
+from .pricing import get_price_index, invalidate_price_index
+
+
+# With a replica configured, the test runner points it at the test database
+# (TEST MIRROR), but through a second connection that can't see a TestCase's
+# uncommitted data. Keep reads on the primary; ReplicaRouterTests install
+# their own router.
+_without_replica_router = override_settings(DATABASE_ROUTERS=[])
+
+
+def setUpModule():
+    _without_replica_router.enable()
+
+
+def tearDownModule():
+    _without_replica_router.disable()
+
+
+class AsyncURLConf:
+    """The project URLconf as served over ASGI, with the async hot views."""
+    urlpatterns = [
+        path('admin/', admin.site.urls),
+        path('', include(tracker_urls.build_urlpatterns(async_views))),
+    ]
+
+
+def brute_force_price(day):
+    price = MealPrice.objects.filter(date__lte=day).order_by('-date').first()
+    return price.price_per_meal if price else Decimal('0')
+
+
+def brute_force_totals(member_id, start_date, end_date):
+    """``(meals, bill)`` summed day by day from the raw meal and price rows."""
+    days = list(MealRecord.objects.filter(
+        member_id=member_id, date__gte=start_date, date__lte=end_date, ate_meal=True
+    ).values_list('date', flat=True))
+    return len(days), sum((brute_force_price(day) for day in days), Decimal('0'))
+
+
+def brute_force_paid(member_id, start_date, end_date):
+    amounts = Payment.objects.filter(
+        member_id=member_id, payment_date__gte=start_date, payment_date__lte=end_date
+    ).values_list('amount', flat=True)
+    return sum(amounts, Decimal('0'))
+
+
+def seed_history(members, start, days, seed=0):
+    """Random meals and payments for ``members`` over ``days`` days from ``start``."""
+    rng = random.Random(seed)
+    apply_meal_changes([
+        (member.pk, start + timedelta(days=offset), rng.random() < 0.7, None)
+        for member in members
+        for offset in range(days)
+    ])
+    for member in members:
+        for _ in range(3):
+            Payment.objects.create(
+                member=member, amount=Decimal(rng.randint(100, 900)),
+                payment_date=start + timedelta(days=rng.randrange(days))
+            )
+
+
+def retry_when_locked(write, *args, **kwargs):
+    while True:
+        try:
+            return write(*args, **kwargs)
+        except OperationalError as exc:
+            # The in-memory SQLite test database uses a shared cache, which
+            # fails fast on lock contention instead of waiting. A failed
+            # write rolled back completely, so just retry.
+            if 'locked' not in str(exc):
+                raise
+
+
+def ledger_rows():
+    return list(WeeklyLedger.objects.order_by('member_id', 'week_start').values_list(
+        'member_id', 'week_start', 'meals', 'bill', 'paid'
+    ))
+
+
+class BillingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.members = [Member.objects.create(name=f"Member {i}") for i in range(4)]
+        self.start = date(2025, 1, 4)  # a Saturday
+        for day, price in [(date(2025, 1, 1), '50'), (date(2025, 1, 15), '55.50'), (date(2025, 2, 5), '60')]:
+            MealPrice.objects.create(date=day, price_per_meal=Decimal(price))
+        seed_history(self.members[:3], self.start, 42)  # the last member never eats or pays
+
+    def test_totals_match_day_by_day_sums(self):
+        end = self.start + timedelta(days=41)
+        for start_date, end_date in [(self.start, end), (date(2025, 1, 10), date(2025, 1, 20)), (end, end)]:
+            expected_meals, expected_paid = {}, {}
+            for member in self.members:
+                meals, bill = brute_force_totals(member.pk, start_date, end_date)
+                if meals:
+                    expected_meals[member.pk] = (meals, bill)
+                paid = brute_force_paid(member.pk, start_date, end_date)
+                if paid:
+                    expected_paid[member.pk] = paid
+
+            self.assertEqual(meal_totals(Member.objects.all(), start_date, end_date), expected_meals)
+            self.assertEqual(meal_totals([member.pk for member in self.members], start_date, end_date), expected_meals)
+            self.assertEqual(paid_totals(self.members, start_date, end_date), expected_paid)
+
+    def test_weekly_summary_matches_day_by_day_sums(self):
+        for week in range(6):
+            week_start = self.start + timedelta(days=7 * week)
+            week_end = week_start + timedelta(days=6)
+            summary = weekly_summary(self.members, week_start)
+            self.assertEqual([row['member'] for row in summary], self.members)
+            for row in summary:
+                member_id = row['member'].pk
+                meals, bill = brute_force_totals(member_id, week_start, week_end)
+                billed = brute_force_totals(member_id, date.min, week_end)[1]
+                paid = brute_force_paid(member_id, date.min, week_end)
+                self.assertEqual(
+                    (row['meals'], row['total_bill'], row['paid'], row['unpaid']),
+                    (meals, bill, paid, billed - paid)
+                )
+
+
+class WeeklyLedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.members = [Member.objects.create(name=f"Member {i}") for i in range(3)]
+        self.start = date(2025, 1, 4)  # a Saturday
+        for day, price in [(date(2025, 1, 1), '50'), (date(2025, 2, 1), '60'), (date(2025, 3, 1), '70')]:
+            MealPrice.objects.create(date=day, price_per_meal=Decimal(price))
+        seed_history(self.members, self.start, 84)
+
+    def expected_rows(self):
+        """Ledger rows summed day by day: member-weeks with meals or payments."""
+        rows = []
+        for member in Member.objects.order_by('pk'):
+            for week in range(13):
+                week_start = self.start + timedelta(days=7 * week)
+                week_end = week_start + timedelta(days=6)
+                meals, bill = brute_force_totals(member.pk, week_start, week_end)
+                paid = brute_force_paid(member.pk, week_start, week_end)
+                if meals or Payment.objects.filter(member=member, payment_date__range=(week_start, week_end)).exists():
+                    rows.append((member.pk, week_start, meals, bill, paid))
+        return rows
+
+    def assertLedgerIsExact(self):
+        maintained = ledger_rows()
+        self.assertEqual(maintained, self.expected_rows())
+        ledger.rebuild()
+        self.assertEqual(ledger_rows(), maintained)
+
+    def test_meal_and_payment_changes_update_only_their_weeks(self):
+        self.assertLedgerIsExact()
+        member = self.members[0]
+        day = self.start + timedelta(days=10)
+
+        before = {row[:2]: row for row in ledger_rows()}
+        MealRecord.objects.toggle_meal(member, day)
+        after = {row[:2]: row for row in ledger_rows()}
+        changed = {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+        self.assertEqual(changed, {(member.pk, self.start + timedelta(days=7))})
+
+        MealRecord.objects.set_meal(self.members[1], day, True)
+        payment = Payment.objects.create(member=member, amount=Decimal('40'), payment_date=day)
+        payment.amount = Decimal('45')
+        payment.payment_date = day + timedelta(days=30)  # moves to another week
+        payment.save()
+        Payment.objects.filter(member=self.members[2]).first().delete()
+        self.assertLedgerIsExact()
+
+    def test_deleting_a_member_drops_its_rows(self):
+        self.members[1].delete()
+        self.assertFalse(WeeklyLedger.objects.filter(member_id=self.members[1].pk).exists())
+        self.assertLedgerIsExact()
+
+    def test_price_changes_refresh_the_weeks_they_bill(self):
+        with mock.patch.object(ledger, 'refresh_range', wraps=ledger.refresh_range) as refresh_range:
+            MealPrice.objects.create(date=date(2025, 1, 15), price_per_meal=Decimal('55'))
+            refresh_range.assert_called_once_with(date(2025, 1, 15), date(2025, 1, 31))
+
+            refresh_range.reset_mock()
+            price = MealPrice.objects.get(date=date(2025, 2, 1))
+            price.date = date(2025, 2, 10)
+            price.save()
+            # From the old date (now billed at the January 15 price) to the next price.
+            refresh_range.assert_called_once_with(date(2025, 2, 1), date(2025, 2, 28))
+
+            refresh_range.reset_mock()
+            MealPrice.objects.get(date=date(2025, 3, 1)).delete()
+            refresh_range.assert_called_once_with(date(2025, 3, 1), None)
+        self.assertLedgerIsExact()
+
+
+class LedgerAtomicityTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.member = Member.objects.create(name="Payer")
+        self.client.force_login(self.staff)
+
+    def test_failed_ledger_refresh_rolls_back_the_view_write(self):
+        day = date(2025, 1, 6)
+        MealRecord.objects.set_meal(self.member, day, True)
+        with mock.patch.object(ledger, '_refresh_week', side_effect=OperationalError("ledger down")):
+            with self.assertRaises(OperationalError):
+                self.client.post(reverse('manage_payments'), {'member_id': self.member.pk, 'amount': '40', 'date': day})
+            with self.assertRaises(OperationalError):
+                self.client.post(reverse('manage_price'), {'date': day, 'price': '50'})
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(MealPrice.objects.exists())
+
+        self.client.post(reverse('manage_payments'), {'member_id': self.member.pk, 'amount': '40', 'date': day})
+        self.assertEqual(ledger_rows(), [(self.member.pk, date(2025, 1, 4), 1, Decimal('0'), Decimal('40'))])
+
+
+class BalanceCheckpointRaceTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.member = Member.objects.create(name="Late payer")
+        MealPrice.objects.create(date=date(2025, 1, 1), price_per_meal=Decimal('50'))
+        seed_history([self.member], date(2025, 1, 4), 60)
+
+    def test_back_dated_change_during_a_build_drops_its_checkpoint(self):
+        build_totals = balances._range_totals
+        writer = threading.Thread(target=self.back_dated_payment)
+
+        def totals_then_write(*args):
+            totals = build_totals(*args)
+            if writer.ident is None:
+                # The build has read the old history; a back-dated payment
+                # arrives before its checkpoint is stored. The payment waits
+                # for the build's locks, so give it a moment to get stuck.
+                writer.start()
+                writer.join(timeout=0.5)
+            return totals
+
+        with mock.patch.object(balances, '_range_totals', side_effect=totals_then_write):
+            balances.balances_as_of([self.member], date(2025, 3, 5))
+        writer.join()
+
+        checkpoints = list(BalanceCheckpoint.objects.values_list('as_of', 'billed', 'paid'))
+        self.assertIn(checkpoints, ([], [(date(2025, 3, 1), *self.running_totals(date(2025, 2, 28)))]))
+        self.assertEqual(
+            balances.balances_as_of([self.member], date(2025, 3, 5)),
+            {self.member.pk: self.running_totals(date(2025, 3, 5))}
+        )
+
+    def back_dated_payment(self):
+        try:
+            retry_when_locked(Payment.objects.create, member=self.member, amount=Decimal('75'), payment_date=date(2025, 1, 20))
+        finally:
+            connections.close_all()
+
+    def running_totals(self, day):
+        return (
+            brute_force_totals(self.member.pk, date.min, day)[1],
+            brute_force_paid(self.member.pk, date.min, day),
+        )
+
+
+class BalanceCheckpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.members = [Member.objects.create(name=f"Member {i}") for i in range(3)]
+        for day, price in [(date(2025, 1, 1), '50'), (date(2025, 3, 10), '65')]:
+            MealPrice.objects.create(date=day, price_per_meal=Decimal(price))
+        seed_history(self.members, date(2025, 1, 4), 120)  # into May
+
+    def expected(self, day):
+        """``{member_id: (billed, paid)}`` up to ``day``, summed from the raw rows."""
+        return {
+            member.pk: (brute_force_totals(member.pk, date.min, day)[1], brute_force_paid(member.pk, date.min, day))
+            for member in self.members
+        }
+
+    def assertCheckpointsAreExact(self):
+        for checkpoint in BalanceCheckpoint.objects.all():
+            self.assertEqual(
+                (checkpoint.billed, checkpoint.paid),
+                self.expected(checkpoint.as_of - timedelta(days=1))[checkpoint.member_id],
+                checkpoint.as_of
+            )
+
+    def test_balances_build_checkpoints_on_demand(self):
+        self.assertFalse(BalanceCheckpoint.objects.exists())
+        for day in [date(2024, 12, 31), date(2025, 2, 1), date(2025, 4, 17), date(2025, 6, 3)]:
+            self.assertEqual(balances.balances_as_of(self.members, day), self.expected(day))
+        self.assertEqual(
+            set(BalanceCheckpoint.objects.values_list('as_of', flat=True)),
+            {date(2024, 12, 1), date(2025, 2, 1), date(2025, 4, 1), date(2025, 6, 1)}
+        )
+        self.assertCheckpointsAreExact()
+
+        # Stored checkpoints are reused.
+        expected = self.expected(date(2025, 4, 20))
+        with self.assertNumQueries(3):  # checkpoints, then this month's meals and payments
+            self.assertEqual(balances.balances_as_of(self.members, date(2025, 4, 20)), expected)
+        self.assertEqual(BalanceCheckpoint.objects.count(), 4 * 3)
+
+    def test_back_dated_changes_drop_later_checkpoints(self):
+        balances.rebuild(date(2025, 5, 31))
+
+        def boundaries(member):
+            return sorted(BalanceCheckpoint.objects.filter(member=member).values_list('as_of', flat=True))
+
+        self.assertEqual(boundaries(self.members[0]), [date(2025, month, 1) for month in (2, 3, 4, 5)])
+        MealRecord.objects.toggle_meal(self.members[0], date(2025, 2, 10))
+        self.assertEqual(boundaries(self.members[0]), [date(2025, 2, 1)])
+        self.assertEqual(len(boundaries(self.members[1])), 4)
+
+        Payment.objects.create(member=self.members[1], amount=Decimal('75'), payment_date=date(2025, 3, 5))
+        self.assertEqual(boundaries(self.members[1]), [date(2025, 2, 1), date(2025, 3, 1)])
+
+        MealPrice.objects.create(date=date(2025, 2, 20), price_per_meal=Decimal('55'))
+        self.assertEqual(boundaries(self.members[2]), [date(2025, 2, 1)])
+        self.assertCheckpointsAreExact()
+
+        for day in [date(2025, 2, 28), date(2025, 5, 3)]:
+            self.assertEqual(balances.balances_as_of(self.members, day), self.expected(day))
+        self.assertCheckpointsAreExact()
+
+
+class PriceIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+
+    def test_carry_forward_lookups_and_segments(self):
+        for day, price in [(date(2025, 1, 1), '50'), (date(2025, 1, 10), '60'), (date(2025, 2, 1), '55')]:
+            MealPrice.objects.create(date=day, price_per_meal=Decimal(price))
+        index = get_price_index()
+
+        days = [date(2024, 12, 25) + timedelta(days=offset) for offset in range(50)]
+        self.assertEqual(index.prices_for(days), {day: brute_force_price(day) for day in days})
+        self.assertEqual(MealPrice.get_price_for_date(date(2024, 12, 31)), Decimal('0'))
+        self.assertEqual(MealPrice.get_price_for_date(date(2030, 1, 1)), Decimal('55'))
+
+        self.assertEqual(index.segments(date(2024, 12, 25), date(2025, 2, 3)), [
+            (date(2025, 1, 1), date(2025, 1, 9), Decimal('50')),
+            (date(2025, 1, 10), date(2025, 1, 31), Decimal('60')),
+            (date(2025, 2, 1), date(2025, 2, 3), Decimal('55')),
+        ])
+        self.assertEqual(index.segments(date(2025, 1, 5), date(2025, 1, 10)), [
+            (date(2025, 1, 5), date(2025, 1, 9), Decimal('50')),
+            (date(2025, 1, 10), date(2025, 1, 10), Decimal('60')),
+        ])
+        self.assertEqual(index.segments(date(2024, 12, 1), date(2024, 12, 31)), [])
+        self.assertEqual(index.segments(date(2025, 1, 5), date(2025, 1, 4)), [])
+
+    def test_other_processes_reload_after_a_price_change(self):
+        MealPrice.objects.create(date=date(2025, 1, 1), price_per_meal=Decimal('50'))
+        self.assertEqual(get_price_index().price_for(date(2025, 2, 1)), Decimal('50'))
+
+        # Another worker saves a price: no signal runs in this process, only
+        # the shared version moves.
+        MealPrice.objects.bulk_create([MealPrice(date=date(2025, 2, 1), price_per_meal=Decimal('60'))])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_price_index().price_for(date(2025, 2, 1)), Decimal('50'))
+        caching.bump_version(pricing.VERSION_KEY)
+        self.assertEqual(get_price_index().price_for(date(2025, 2, 1)), Decimal('60'))
+
+
+class WeekGridTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.members = [Member.objects.create(name=name) for name in ("Ada", "Ben", "Cy")]
+        self.week_start = Member.get_week_start()
+        self.days = week_days(self.week_start)
+
+    def test_matrix_pivots_the_week_from_one_query(self):
+        ada, ben, _ = self.members
+        apply_meal_changes([
+            (ada.pk, self.days[0], True, None),
+            (ada.pk, self.days[3], False, None),
+            (ben.pk, self.days[6], True, 2),
+            (ben.pk, self.week_start - timedelta(days=1), True, None),  # previous week
+        ])
+        archive.archive_boundary()  # loaded once per process
+
+        with self.assertNumQueries(1):
+            matrix = build_week_matrix(self.members, self.days)
+        self.assertEqual([row['member'] for row in matrix], self.members)
+        self.assertEqual([[cell['date'] for cell in row['meals']] for row in matrix], [self.days] * 3)
+        self.assertEqual([[cell['ate'] for cell in row['meals']] for row in matrix], [
+            [True, False, False, False, False, False, False],
+            [False, False, False, False, False, False, True],
+            [False] * 7,
+        ])
+        self.assertEqual(matrix[1]['meals'][6]['record'].meal_count, 2)
+        self.assertFalse(matrix[0]['meals'][3]['record'].ate_meal)  # stored, not eaten
+        self.assertIsNone(matrix[2]['meals'][0]['record'])
+
+    def test_toggle_does_not_build_the_grid(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        with mock.patch('tracker.grid.build_week_matrix') as build:
+            response = self.client.post(
+                reverse('daily_meals'), {'member_id': self.members[0].pk, 'date': self.days[2].isoformat()},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+        self.assertTrue(json.loads(response.content)['ate'])
+        build.assert_not_called()
+
+
+class MealBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.members = [Member.objects.create(name="Ada"), Member.objects.create(name="Ben")]
+        self.days = week_days(Member.get_week_start())
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def post(self, changes):
+        return self.client.post(reverse('daily_meals_batch'), json.dumps({'changes': changes}),
+                                content_type='application/json')
+
+    def test_batch_applies_every_change_and_returns_the_cells(self):
+        ada, ben = self.members
+        MealRecord.objects.toggle_meal(ben, self.days[1])
+        response = self.post([
+            {'member_id': ada.pk, 'date': self.days[0].isoformat(), 'ate_meal': True},
+            {'member_id': ada.pk, 'date': self.days[0].isoformat(), 'ate_meal': False},  # last one wins
+            {'member_id': ben.pk, 'date': self.days[1].isoformat(), 'ate_meal': True, 'meal_count': 3},
+            {'member_id': ben.pk, 'date': self.days[2].isoformat(), 'ate_meal': True},
+        ])
+        data = json.loads(response.content)
+        self.assertEqual(data['updated'], 3)
+        self.assertEqual(sorted(data['cells'], key=lambda cell: (cell['member_id'], cell['date'])), [
+            {'member_id': ada.pk, 'date': self.days[0].isoformat(), 'ate': False, 'meal_count': 1},
+            {'member_id': ben.pk, 'date': self.days[1].isoformat(), 'ate': True, 'meal_count': 3},
+            {'member_id': ben.pk, 'date': self.days[2].isoformat(), 'ate': True, 'meal_count': 1},
+        ])
+        self.assertEqual(
+            set(MealRecord.objects.values_list('member_id', 'date', 'ate_meal', 'meal_count')),
+            {(ada.pk, self.days[0], False, 1), (ben.pk, self.days[1], True, 3), (ben.pk, self.days[2], True, 1)}
+        )
+        self.assertEqual(ben.get_weekly_meals(), 2)
+
+    def test_invalid_batches_change_nothing(self):
+        cell = {'member_id': self.members[0].pk, 'date': self.days[0].isoformat(), 'ate_meal': True}
+        for change in [
+            {**cell, 'ate_meal': 'yes'},
+            {**cell, 'meal_count': -1},
+            {**cell, 'date': 'Monday'},
+            {'member_id': cell['member_id'], 'ate_meal': True},
+        ]:
+            self.assertEqual(self.post([cell, change]).status_code, 400, change)
+
+        response = self.post([cell, {**cell, 'member_id': 0}])
+        self.assertEqual(json.loads(response.content)['member_ids'], [0])
+        with mock.patch('tracker.grid.MAX_BATCH_CHANGES', 1):
+            self.assertEqual(self.post([cell, cell]).status_code, 400)
+        self.assertFalse(MealRecord.objects.exists())
+
+        self.client.force_login(User.objects.create_user('member', password='pw'))
+        self.assertEqual(self.post([cell]).status_code, 403)
+        self.assertFalse(MealRecord.objects.exists())
+
+
+class QueryScalingTests(TestCase):
+    """
+    Guard every tracker view and admin changelist against N+1 queries.
+
+    Each check requests a page at a small and a larger data size (more
+    members and more meals per week) and requires the same number of queries.
+    """
+
+    SMALL = (3, 2)   # (active members, meals per member per week)
+    LARGE = (12, 6)
+
+    # URL names from tracker/urls.py covered by the tests below.
+    VIEW_NAMES = {
+        'admin_signup', 'login', 'logout', 'password_change', 'password_change_done',
+        'my_meals', 'dashboard', 'daily_meals', 'daily_meals_batch', 'daily_meals_grid', 'daily_meals_changes',
+        'manage_price', 'manage_payments', 'manage_members', 'metrics', 'export_data',
+        'import_data',
+    }
+
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.today = date.today()
+        self.week_start = Member.get_week_start(self.today)
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.user)
+        MealPrice.objects.create(date=self.week_start - timedelta(days=3), price_per_meal=Decimal('50'))
+        MealPrice.objects.create(date=self.week_start + timedelta(days=2), price_per_meal=Decimal('60'))
+
+    def seed(self, members, meals_per_week):
+        """Grow the data set to ``members`` active members eating ``meals_per_week`` days."""
+        existing = list(Member.objects.all())
+        for i in range(len(existing), members):
+            existing.append(Member.objects.create(name=f"Member {i}"))
+        if existing[0].user_id is None:
+            existing[0].user = self.user
+            existing[0].save()
+
+        apply_meal_changes([
+            (member.pk, self.week_start + timedelta(days=day), True, None)
+            for member in existing
+            for day in range(meals_per_week)
+        ])
+        for member in existing:
+            Payment.objects.create(member=member, amount=Decimal('25'), payment_date=self.week_start)
+
+    def seed_stored_rows(self):
+        """Archived and week-storage rows for every member, as the admins for those tables list them."""
+        members = list(Member.objects.all())
+        month, last_week = date(2020, 1, 1), self.week_start - timedelta(days=7)
+        MonthlyMealSummary.objects.bulk_create([
+            MonthlyMealSummary(member=member, month=month, meals=20, bill=Decimal('1000'))
+            for member in members
+        ], ignore_conflicts=True)
+        ArchivedMealRecord.objects.bulk_create([
+            ArchivedMealRecord(member=member, date=month, ate_meal=True, created_at=timezone.now())
+            for member in members
+        ], ignore_conflicts=True)
+        MealWeek.objects.bulk_create([
+            MealWeek(member=member, week_start=last_week, present_mask=0b1111111, ate_mask=0b0110101)
+            for member in members
+        ], ignore_conflicts=True)
+
+    def count_queries(self, request):
+        request()  # warm-up: loads the price index and builds missing balance checkpoints
+        cache.clear()  # measure the uncached path
+        with CaptureQueriesContext(connection) as queries:
+            request()
+        return queries.captured_queries
+
+    def assertQueriesIndependentOfScale(self, name, request, seed=None):
+        """``seed``, if given, grows further data after each ``self.seed()``."""
+        self.seed(*self.SMALL)
+        if seed:
+            seed()
+        small = self.count_queries(request)
+        self.seed(*self.LARGE)
+        if seed:
+            seed()
+        large = self.count_queries(request)
+
+        if len(small) != len(large):
+            sql = '\n'.join(f"  {i}. {query['sql']}" for i, query in enumerate(large, 1))
+            self.fail(
+                f"{name} ran {len(small)} queries with {self.SMALL[0]} members but "
+                f"{len(large)} with {self.LARGE[0]} members (N+1 regression?). "
+                f"Queries at the larger size:\n{sql}"
+            )
+
+    def get(self, url):
+        def request():
+            response = self.client.get(url)
+            self.assertLess(response.status_code, 400, url)
+        return request
+
+    def test_every_tracker_view_is_guarded(self):
+        names = {pattern.name for pattern in tracker_urls.urlpatterns}
+        self.assertEqual(names - self.VIEW_NAMES, set(), "Add query-scaling checks for new views.")
+
+    def test_every_admin_changelist_is_guarded(self):
+        registered = {model._meta.model_name for model in admin.site._registry if model._meta.app_label == 'tracker'}
+        guarded = {
+            name.removeprefix('test_admin_').removesuffix('_changelist')
+            for name in dir(self)
+            if name.startswith('test_admin_') and name.endswith('_changelist')
+        }
+        self.assertEqual(registered - guarded, set(), "Add query-scaling checks for new admin changelists.")
+
+    def test_dashboard(self):
+        self.assertQueriesIndependentOfScale('dashboard', self.get(reverse('dashboard')))
+
+    # seed() only grows the data, so each check needs its own test.
+    def test_daily_meals(self):
+        self.assertQueriesIndependentOfScale('daily_meals', self.get(reverse('daily_meals') + '?render=client'))
+
+    def test_daily_meals_server_render(self):
+        self.assertQueriesIndependentOfScale(
+            'daily_meals (server render)', self.get(reverse('daily_meals') + '?render=server')
+        )
+
+    def test_daily_meals_grid(self):
+        self.assertQueriesIndependentOfScale('daily_meals_grid', self.get(reverse('daily_meals_grid')))
+
+    def test_daily_meals_toggle(self):
+        def request():
+            member = Member.objects.order_by('pk').last()
+            response = self.client.post(
+                reverse('daily_meals'),
+                {'member_id': member.pk, 'date': self.today.isoformat()},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertQueriesIndependentOfScale('daily_meals toggle', request)
+
+    def test_daily_meals_batch(self):
+        def request():
+            member = Member.objects.order_by('pk').last()
+            response = self.client.post(
+                reverse('daily_meals_batch'),
+                json.dumps({'changes': [{'member_id': member.pk, 'date': self.today.isoformat(), 'ate_meal': True}]}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertQueriesIndependentOfScale('daily_meals_batch', request)
+
+    def test_daily_meals_changes(self):
+        def request():
+            since = MealChange.objects.filter(member=None).latest('id').pk  # after the last new member
+            response = self.client.get(reverse('daily_meals_changes'), {'since': since, 'week': self.week_start})
+            self.assertTrue(json.loads(response.content)['cells'])
+        self.assertQueriesIndependentOfScale('daily_meals_changes', request)
+
+    def test_my_meals(self):
+        self.assertQueriesIndependentOfScale('my_meals', self.get(reverse('my_meals')))
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    def test_async_my_meals(self):
+        self.assertQueriesIndependentOfScale('async my_meals', self.get(reverse('my_meals')))
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    def test_async_dashboard(self):
+        self.assertQueriesIndependentOfScale('async dashboard', self.get(reverse('dashboard')))
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    def test_async_daily_meals(self):
+        self.assertQueriesIndependentOfScale('async daily_meals', self.get(reverse('daily_meals')))
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    def test_async_daily_meals_grid(self):
+        self.assertQueriesIndependentOfScale('async daily_meals_grid', self.get(reverse('daily_meals_grid')))
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    def test_async_daily_meals_toggle(self):
+        self.test_daily_meals_toggle()
+
+    def test_manage_price(self):
+        self.assertQueriesIndependentOfScale('manage_price', self.get(reverse('manage_price')))
+
+    def test_manage_payments(self):
+        self.assertQueriesIndependentOfScale('manage_payments', self.get(reverse('manage_payments')))
+
+    def test_manage_members(self):
+        self.assertQueriesIndependentOfScale('manage_members', self.get(reverse('manage_members')))
+
+    def test_metrics(self):
+        self.assertQueriesIndependentOfScale('metrics', self.get(reverse('metrics')))
+
+    def export(self, kind, **params):
+        url = reverse('export_data', args=[kind])
+
+        def request():
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            b''.join(response.streaming_content)  # queries run while streaming
+        return request
+
+    def test_export_meals(self):
+        self.assertQueriesIndependentOfScale('export meals', self.export('meals'))
+
+    def test_export_payments(self):
+        self.assertQueriesIndependentOfScale('export payments', self.export('payments', format='json'))
+
+    def test_export_statements(self):
+        request = self.export('statements', start=self.week_start.isoformat(), period='week')
+        self.assertQueriesIndependentOfScale('export statements', request)
+
+    def test_import_data(self):
+        self.assertQueriesIndependentOfScale('import_data', self.get(reverse('import_data')))
+
+    def test_import_data_upload(self):
+        def request():
+            upload = SimpleUploadedFile('meals.csv', f"serial_number,date,ate_meal\n1,{self.today},yes\n".encode())
+            response = self.client.post(reverse('import_data'), {'kind': 'meals', 'file': upload})
+            self.assertEqual(response.status_code, 200)
+        self.assertQueriesIndependentOfScale('import_data upload', request)
+
+    def test_admin_signup(self):
+        self.assertQueriesIndependentOfScale('admin_signup', self.get(reverse('admin_signup')))
+
+    def test_login(self):
+        self.assertQueriesIndependentOfScale('login', self.get(reverse('login')))
+
+    def test_password_change(self):
+        self.assertQueriesIndependentOfScale('password_change', self.get(reverse('password_change')))
+
+    def test_password_change_done(self):
+        self.assertQueriesIndependentOfScale('password_change_done', self.get(reverse('password_change_done')))
+
+    def test_logout(self):
+        def request():
+            self.client.force_login(self.user)
+            self.client.get(reverse('logout'))
+        self.assertQueriesIndependentOfScale('logout', request)
+
+    def test_admin_member_changelist(self):
+        url = reverse('admin:tracker_member_changelist')
+        self.assertQueriesIndependentOfScale('admin member changelist', self.get(url))
+
+    def test_admin_mealprice_changelist(self):
+        url = reverse('admin:tracker_mealprice_changelist')
+        self.assertQueriesIndependentOfScale('admin mealprice changelist', self.get(url))
+
+    def test_admin_mealrecord_changelist(self):
+        url = reverse('admin:tracker_mealrecord_changelist')
+        self.assertQueriesIndependentOfScale('admin mealrecord changelist', self.get(url))
+
+    def test_admin_payment_changelist(self):
+        url = reverse('admin:tracker_payment_changelist')
+        self.assertQueriesIndependentOfScale('admin payment changelist', self.get(url))
+
+    def test_admin_weeklyledger_changelist(self):
+        url = reverse('admin:tracker_weeklyledger_changelist')
+        self.assertQueriesIndependentOfScale('admin weeklyledger changelist', self.get(url))
+
+    def test_admin_monthlymealsummary_changelist(self):
+        url = reverse('admin:tracker_monthlymealsummary_changelist')
+        self.assertQueriesIndependentOfScale(
+            'admin monthlymealsummary changelist', self.get(url), seed=self.seed_stored_rows
+        )
+
+    def test_admin_archivedmealrecord_changelist(self):
+        url = reverse('admin:tracker_archivedmealrecord_changelist')
+        self.assertQueriesIndependentOfScale(
+            'admin archivedmealrecord changelist', self.get(url), seed=self.seed_stored_rows
+        )
+
+    def test_admin_mealweek_changelist(self):
+        url = reverse('admin:tracker_mealweek_changelist')
+        self.assertQueriesIndependentOfScale('admin mealweek changelist', self.get(url), seed=self.seed_stored_rows)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        self.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def test_records_route_latency_queries_and_status(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('dashboard'))
+        self.client.get('/missing-page/')
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('tracker_request_duration_seconds_count{route="/",method="GET"} 1', body)
+        self.assertIn('tracker_request_db_queries_bucket{route="/",method="GET",le="+Inf"} 1', body)
+        self.assertIn('tracker_responses_total{route="<unmatched>",method="GET",status="404"} 1', body)
+
+    def test_non_standard_methods_share_one_label(self):
+        for method in ('BREW', 'PROPFIND', 'X-ANYTHING'):
+            self.client.generic(method, '/missing-page/')
+
+        body = metrics_registry.render()
+        self.assertIn('tracker_responses_total{route="<unmatched>",method="OTHER",status="404"} 3', body)
+        self.assertNotIn('BREW', body)
+
+    def test_metrics_are_staff_only(self):
+        user = User.objects.create_user('member', password='pw')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    async def test_async_requests_count_their_queries(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+        body = metrics_registry.render()
+        self.assertIn('tracker_request_db_queries_count{route="/",method="GET"} 1', body)
+        self.assertIn('tracker_request_db_queries_bucket{route="/",method="GET",le="0"} 0', body)
+        # The query hooks come off the thread that ran the view's ORM code.
+        wrappers = await sync_to_async(lambda: [list(c.execute_wrappers) for c in connections.all()])()
+        self.assertEqual(wrappers, [[] for _ in connections.all()])
+
+
+class WeekCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.week_start = Member.get_week_start()
+        self.member = Member.objects.create(name="Cached")
+        MealPrice.objects.create(date=self.week_start, price_per_meal=Decimal('40'))
+
+    def test_summary_is_cached_until_the_week_changes(self):
+        self.assertEqual(caching.week_summary(self.week_start)[0]['meals'], 0)
+        with self.assertNumQueries(0):
+            caching.week_summary(self.week_start)
+
+        MealRecord.objects.create(member=self.member, date=self.week_start, ate_meal=True)
+        self.assertEqual(caching.week_summary(self.week_start)[0]['meals'], 1)
+
+    def test_matrix_is_invalidated_by_bulk_changes_and_members(self):
+        self.assertFalse(caching.week_matrix(self.week_start)[0]['meals'][0]['ate'])
+        apply_meal_changes([(self.member.pk, self.week_start, True, None)])
+        self.assertTrue(caching.week_matrix(self.week_start)[0]['meals'][0]['ate'])
+
+        Member.objects.create(name="Joined")
+        self.assertEqual(len(caching.week_matrix(self.week_start)), 2)
+
+    def test_price_change_invalidates_every_week(self):
+        MealRecord.objects.create(member=self.member, date=self.week_start, ate_meal=True)
+        self.assertEqual(caching.week_summary(self.week_start)[0]['total_bill'], 40)
+        MealPrice.objects.filter(date=self.week_start).update(price_per_meal=Decimal('55'))
+        MealPrice.objects.get(date=self.week_start).save()
+        self.assertEqual(caching.week_summary(self.week_start)[0]['total_bill'], 55)
+
+
+class MyMealsConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.user = User.objects.create_user('member', password='pw')
+        self.member = Member.objects.create(name="Self", user=self.user)
+        self.client.force_login(self.user)
+
+    def deadline_at(self, hour, minute, second=0):
+        """Freeze the page's clock at ``hour:minute:second`` today."""
+        now = timezone.localtime().replace(hour=hour, minute=minute, second=second, microsecond=0)
+        deadline = now.replace(hour=10, minute=30, second=0)
+        return mock.patch('tracker.views._meal_deadline', return_value=(now, deadline, now >= deadline))
+
+    def test_repeat_load_gets_not_modified(self):
+        with self.deadline_at(9, 15, 5):
+            response = self.client.get(reverse('my_meals'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.deadline_at(9, 15, 50):
+            response = self.client.get(reverse('my_meals'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_a_new_minute_produces_a_new_etag(self):
+        with self.deadline_at(9, 15):
+            etag = self.client.get(reverse('my_meals'))['ETag']
+
+        with self.deadline_at(9, 16):
+            response = self.client.get(reverse('my_meals'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Current time: 9:16 AM")
+
+    def test_member_changes_produce_a_new_etag(self):
+        etag = self.client.get(reverse('my_meals'))['ETag']
+        MealRecord.objects.create(member=self.member, date=date.today(), ate_meal=True)
+
+        response = self.client.get(reverse('my_meals'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_week_renders_with_constant_queries(self):
+        self.client.get(reverse('my_meals'))
+        # Session, user and member profile only.
+        with self.assertNumQueries(3):
+            self.client.get(reverse('my_meals'))
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.user = User.objects.create_user('member', password='pw')
+        self.member = Member.objects.create(name="Self", user=self.user)
+        self.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    async def test_my_meals_revalidates_and_saves(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('my_meals'))
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.get(reverse('my_meals'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        open_deadline = (timezone.localtime(), timezone.localtime(), False)
+        with mock.patch('tracker.views._meal_deadline', return_value=open_deadline):
+            response = await self.async_client.post(reverse('my_meals'), {'decision': 'eat'})
+        self.assertRedirects(response, reverse('my_meals'), fetch_redirect_response=False)
+        record = await MealRecord.objects.aget(member=self.member, date=timezone.localdate())
+        self.assertTrue(record.ate_meal)
+
+    async def test_toggle_and_dashboard_are_staff_only(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertRedirects(response, reverse('my_meals'), fetch_redirect_response=False)
+
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('dashboard'))
+        self.assertContains(response, "Self")
+        response = await self.async_client.post(
+            reverse('daily_meals'),
+            {'member_id': self.member.pk, 'date': date.today().isoformat()},
+            headers={'x-requested-with': 'XMLHttpRequest'},
+        )
+        self.assertTrue(json.loads(response.content)['ate'])
+        response = await self.async_client.post(
+            reverse('daily_meals'), {'member_id': 0, 'date': date.today().isoformat()}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class RecordingReplicaRouter(routers.ReplicaRouter):
+    """``ReplicaRouter`` whose "replica" is the test database; records what it routes there."""
+    replica_alias = 'default'
+    routed = []
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        if alias:
+            self.routed.append(model._meta.model_name)
+        return alias
+
+
+class ReplicaRouterTests(TestCase):
+    def test_only_unpinned_reporting_reads_use_the_replica(self):
+        def check():
+            router = RecordingReplicaRouter()
+            self.assertIsNone(router.db_for_read(Member))
+            with routers.reporting():
+                self.assertEqual(router.db_for_read(Member), router.replica_alias)
+                with routers.primary():
+                    self.assertIsNone(router.db_for_read(Member))
+                    router.db_for_write(Member)  # derived data doesn't pin
+                self.assertEqual(router.db_for_read(Member), router.replica_alias)
+                self.assertEqual(router.db_for_write(Member), 'default')
+                # Read-your-own-writes: the rest of the request stays on the primary.
+                self.assertIsNone(router.db_for_read(Member))
+
+        contextvars.Context().run(check)  # fresh routing state
+
+    @override_settings(DATABASE_ROUTERS=['tracker.tests.RecordingReplicaRouter'])
+    @modify_settings(MIDDLEWARE={'prepend': 'tracker.routers.ReplicaRoutingMiddleware'})
+    def test_reporting_pages_read_from_the_replica_until_a_write(self):
+        routed = RecordingReplicaRouter.routed
+        member = Member.objects.create(name="Reader")
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+        def reads_replica(url):
+            cache.clear()  # measure the uncached path
+            routed.clear()
+            response = self.client.get(url)
+            b''.join(response.streaming_content) if response.streaming else response.content
+            return bool(routed)
+
+        self.assertTrue(reads_replica(reverse('dashboard')))
+        self.assertTrue(reads_replica(reverse('export_data', args=['meals'])))
+        self.assertTrue(reads_replica(reverse('admin:tracker_member_changelist')))
+        self.assertFalse(reads_replica(reverse('daily_meals')))
+
+        response = self.client.post(reverse('daily_meals'), {'member_id': member.pk, 'date': date.today().isoformat()})
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertFalse(reads_replica(reverse('dashboard')))
+
+        del self.client.cookies[routers.PIN_COOKIE]
+        self.assertTrue(reads_replica(reverse('dashboard')))
+
+
+class MealRecordUpsertTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.member = Member.objects.create(name="Busy")
+        self.day = date.today()
+
+    def test_set_and_toggle_meal(self):
+        self.assertTrue(MealRecord.objects.toggle_meal(self.member, self.day))
+        self.assertFalse(MealRecord.objects.toggle_meal(self.member.pk, self.day))
+        self.assertTrue(MealRecord.objects.set_meal(self.member, self.day, True))
+        self.assertTrue(MealRecord.objects.set_meal(self.member, self.day, True))
+
+        record = MealRecord.objects.get(member=self.member, date=self.day)
+        self.assertTrue(record.ate_meal)
+        self.assertEqual(record.meal_count, 1)
+        self.assertEqual(self.member.get_weekly_meals(), 1)
+
+    def test_toggle_statements(self):
+        MealPrice.objects.create(date=self.day, price_per_meal=Decimal('50'))
+        get_price_index()
+        archive.archive_boundary()
+        # BEGIN; the cell upsert; the ledger row (meals and payments, then one
+        # upsert or delete); stale balance checkpoints; the change feed entry;
+        # COMMIT. Plus the member lock where rows can be locked (PostgreSQL).
+        statements = 8 + connection.features.has_select_for_update
+        for ate_meal in (True, False):
+            with self.assertNumQueries(statements):
+                self.assertEqual(MealRecord.objects.toggle_meal(self.member, self.day), ate_meal)
+            self.assertEqual(ledger_rows(), [
+                (self.member.pk, Member.get_week_start(self.day), 1, Decimal('50'), Decimal('0'))
+            ] if ate_meal else [])
+
+    def retry(self, write, *args, **kwargs):
+        return retry_when_locked(write, *args, **kwargs)
+
+    def run_threads(self, threads, work, barrier):
+        errors = []
+
+        def run(i):
+            try:
+                work(i)
+            except Exception as exc:  # surfaced by the assertions below
+                errors.append(exc)
+                barrier.abort()
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=run, args=[i]) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+    def test_concurrent_toggles_of_one_cell_are_not_lost(self):
+        threads, toggles = 8, 25
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def hammer(i):
+            barrier.wait()
+            for _ in range(toggles):
+                results.append(self.retry(MealRecord.objects.toggle_meal, self.member.pk, self.day))
+
+        self.run_threads(threads, hammer, barrier)
+        total = threads * toggles
+        # Every toggle flipped the cell exactly once: half of them saw it turn on.
+        self.assertEqual(results.count(True), total // 2)
+        record = MealRecord.objects.get(member=self.member, date=self.day)
+        self.assertEqual(record.ate_meal, total % 2 == 1)
+
+    def test_concurrent_changes_to_one_member_week_keep_the_ledger_exact(self):
+        MealPrice.objects.create(date=self.day - timedelta(days=30), price_per_meal=Decimal('50'))
+        week_start = Member.get_week_start(self.day)
+        days = [week_start + timedelta(days=offset) for offset in range(7)]
+        threads, rounds = 7, 15
+        stale = []
+
+        def check_round():
+            # Runs once every thread's change of the round has committed.
+            eaten = MealRecord.objects.filter(member=self.member, date__in=days, ate_meal=True).count()
+            row = WeeklyLedger.objects.filter(member=self.member, week_start=week_start).first()
+            if (row.meals if row else 0) != eaten:
+                stale.append((row and row.meals, eaten))
+
+        barrier = threading.Barrier(threads, action=check_round)
+
+        def hammer(i):
+            for round in range(rounds):
+                barrier.wait()
+                # Different cells of one member-week, plus a payment: each
+                # commit recomputes the same ledger row.
+                if i == 0:
+                    self.retry(
+                        Payment.objects.create, member=self.member, amount=Decimal('5'), payment_date=days[round % 7]
+                    )
+                else:
+                    self.retry(MealRecord.objects.toggle_meal, self.member.pk, days[i])
+            barrier.wait()
+
+        self.run_threads(threads, hammer, barrier)
+        self.assertEqual(stale, [])
+        maintained = ledger_rows()
+        ledger.rebuild()
+        self.assertEqual(maintained, ledger_rows())
+
+
+class MemberSerialTests(TransactionTestCase):
+    def test_serials_come_from_the_counter(self):
+        first = Member.objects.create(name="First")
+        Member.objects.create(name="Explicit", serial_number=10)
+        after = Member.objects.create(name="After")
+        self.assertEqual((first.serial_number, after.serial_number), (1, 11))
+        self.assertEqual(SerialCounter.objects.get(name='member').value, 11)
+
+        # Lowering a serial never rewinds the counter.
+        after.serial_number = 5
+        after.save()
+        self.assertEqual(Member.objects.allocate_serials(3), 12)
+        self.assertEqual(Member.objects.create(name="Next").serial_number, 15)
+
+    def test_counter_is_seeded_from_existing_members(self):
+        Member.objects.bulk_create([Member(name="Old", serial_number=40)])
+        SerialCounter.objects.all().delete()
+        self.assertEqual(Member.objects.create(name="New").serial_number, 41)
+
+    def test_bulk_add_from_manage_members(self):
+        Member.objects.create(name="Existing")
+        staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(staff)
+
+        response = self.client.post(
+            reverse('manage_members'), {'action': 'bulk_add', 'names': "Ana\n\n  Bo  \r\nCy\n"}, follow=True
+        )
+        self.assertContains(response, "Added 3 members (#2-#4)")
+        self.assertEqual(
+            list(Member.objects.values_list('serial_number', 'name')),
+            [(1, "Existing"), (2, "Ana"), (3, "Bo"), (4, "Cy")]
+        )
+
+        response = self.client.post(
+            reverse('manage_members'), {'action': 'bulk_add', 'names': "Dee\n" + "x" * 101}, follow=True
+        )
+        self.assertContains(response, "nothing was added")
+        self.assertEqual(Member.objects.count(), 4)
+
+    def test_concurrent_adds_get_distinct_serials(self):
+        threads, adds = 6, 10
+        barrier = threading.Barrier(threads)
+        errors = []
+
+        def add(index):
+            while True:
+                try:
+                    if index % 2:
+                        return Member.objects.add_members([f"Bulk {index}-a", f"Bulk {index}-b"])
+                    return Member.objects.create(name=f"Single {index}")
+                except OperationalError as exc:
+                    # Shared-cache in-memory SQLite fails fast on lock contention.
+                    if 'locked' not in str(exc):
+                        raise
+
+        def hammer(index):
+            try:
+                barrier.wait()
+                for _ in range(adds):
+                    add(index)
+            except Exception as exc:  # surfaced by the assertions below
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=hammer, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        serials = list(Member.objects.values_list('serial_number', flat=True))
+        self.assertEqual(serials, list(range(1, len(serials) + 1)))
+        self.assertEqual(len(serials), threads // 2 * adds + threads // 2 * adds * 2)
+
+
+class PrepopulateMealsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.week_start = Member.get_week_start()
+        self.active = Member.objects.create(name="Active")
+        self.inactive = Member.objects.create(name="Away", is_active=False)
+        MealPrice.objects.create(date=self.week_start, price_per_meal=Decimal('40'))
+
+    def test_fills_missing_days_for_active_members_only(self):
+        MealRecord.objects.create(member=self.active, date=self.week_start, ate_meal=True)
+
+        call_command('prepopulate_meals', date=self.week_start.isoformat(), week=True, stdout=StringIO())
+
+        records = MealRecord.objects.filter(member=self.active)
+        self.assertEqual(records.count(), 7)
+        self.assertEqual(records.filter(ate_meal=True).count(), 1)  # existing row untouched
+        self.assertFalse(MealRecord.objects.filter(member=self.inactive).exists())
+
+    def test_default_eat_is_billed(self):
+        out = StringIO()
+        call_command('prepopulate_meals', date=self.week_start.isoformat(), default='eat', stdout=out)
+        self.assertIn("Created 1 meal records", out.getvalue())
+        self.assertEqual(self.active.get_weekly_total_bill(self.week_start), 40)
+
+        call_command('prepopulate_meals', date=self.week_start.isoformat(), default='eat', stdout=out)
+        self.assertIn("Created 0 meal records", out.getvalue())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(self.staff)
+        self.start = date(2024, 1, 1)
+        self.member = Member.objects.create(name="Exporter")
+        MealPrice.objects.create(date=self.start, price_per_meal=Decimal('50'))
+        for day in (self.start, self.start + timedelta(days=1), self.start + timedelta(days=40)):
+            MealRecord.objects.create(member=self.member, date=day, ate_meal=True)
+        Payment.objects.create(member=self.member, amount=Decimal('30'), payment_date=self.start, note="cash")
+
+    def download(self, kind, **params):
+        response = self.client.get(reverse('export_data', args=[kind]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_meals_csv_respects_the_date_range(self):
+        body = self.download('meals', start='2024-01-02', end='2024-01-31')
+        self.assertEqual(body.splitlines(), [
+            'member_id,serial_number,name,date,ate_meal,meal_count',
+            f'{self.member.pk},1,Exporter,2024-01-02,True,1',
+        ])
+
+    def test_payments_json(self):
+        rows = json.loads(self.download('payments', format='json'))
+        self.assertEqual(rows, [{
+            'member_id': self.member.pk, 'serial_number': 1, 'name': 'Exporter',
+            'payment_date': '2024-01-01', 'amount': '30.00', 'note': 'cash',
+        }])
+        self.assertEqual(json.loads(self.download('payments', format='json', start='2030-01-01')), [])
+
+    def test_monthly_statements_carry_balances_forward(self):
+        rows = json.loads(self.download('statements', format='json', start='2024-01-01', end='2024-03-31'))
+        self.assertEqual(
+            [(row['period_start'], row['opening_balance'], row['billed'], row['paid'], row['closing_balance'])
+             for row in rows],
+            [
+                ('2024-01-01', '0.00', '100.00', '30.00', '70.00'),
+                ('2024-02-01', '70.00', '50.00', '0.00', '120.00'),
+                ('2024-03-01', '120.00', '0.00', '0.00', '120.00'),
+            ]
+        )
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(reverse('export_data', args=['meals']), {'start': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('export_data', args=['secrets'])).status_code, 400)
+
+        self.client.force_login(User.objects.create_user('member', password='pw'))
+        self.assertEqual(self.client.get(reverse('export_data', args=['meals'])).status_code, 403)
+
+    def test_command_writes_the_same_export(self):
+        out = StringIO()
+        call_command('export_data', 'meals', start='2024-01-02', end='2024-01-31', stdout=out)
+        self.assertEqual(out.getvalue(), self.download('meals', start='2024-01-02', end='2024-01-31'))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        archive.invalidate_boundary()
+        self.addCleanup(archive.invalidate_boundary)
+        self.members = [Member.objects.create(name="Old timer"), Member.objects.create(name="Newcomer")]
+        MealPrice.objects.create(date=date(2025, 1, 1), price_per_meal=Decimal('50'))
+        MealPrice.objects.create(date=date(2025, 2, 15), price_per_meal=Decimal('60'))
+        start, days = date(2025, 1, 10), 100
+        apply_meal_changes([
+            (member.pk, start + timedelta(days=offset), offset % (i + 2) != 0, None)
+            for i, member in enumerate(self.members)
+            for offset in range(days)
+        ])
+        for member in self.members:
+            Payment.objects.create(member=member, amount=Decimal('500'), payment_date=date(2025, 2, 20))
+
+    def history(self):
+        return {
+            'statements': list(exports.statement_rows(date(2025, 1, 1), date(2025, 4, 30), 'week')),
+            'totals': meal_totals(self.members, date(2025, 1, 20), date(2025, 3, 10)),
+            'meals': list(exports.meal_rows()),
+        }
+
+    def test_archiving_keeps_history_exact(self):
+        before = self.history()
+        live = MealRecord.objects.count()
+
+        moved = archive.archive_before(date(2025, 4, 15))
+        self.assertEqual(archive.archive_boundary(), date(2025, 4, 1))
+        self.assertEqual(moved, ArchivedMealRecord.objects.count())
+        self.assertEqual(MealRecord.objects.count(), live - moved)
+        self.assertFalse(MealRecord.objects.filter(date__lt=date(2025, 4, 1)).exists())
+        self.assertEqual(MonthlyMealSummary.objects.filter(month=date(2025, 2, 1)).count(), 2)
+
+        # Derived data rebuilt from the archive matches too.
+        ledger.rebuild()
+        balances.rebuild(date(2025, 5, 1))
+        self.assertEqual(self.history(), before)
+        self.assertEqual(archive.archive_before(date(2025, 4, 1)), 0)
+
+    def test_archived_days_are_read_only(self):
+        archive.archive_before(date(2025, 3, 1))
+        member = self.members[0]
+        with self.assertRaises(archive.ArchivedDateError):
+            MealRecord.objects.toggle_meal(member, date(2025, 2, 10))
+        with self.assertRaises(archive.ArchivedDateError):
+            apply_meal_changes([(member.pk, date(2025, 2, 10), True, None)])
+        MealRecord.objects.toggle_meal(member, date(2025, 4, 25))  # live days still change
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.post(
+            reverse('daily_meals'), {'member_id': member.pk, 'date': '2025-02-10'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("archived", json.loads(response.content)['error'])  # shown by the grid
+        self.assertFalse(MealRecord.objects.filter(date=date(2025, 2, 10)).exists())
+
+    def test_other_processes_see_a_new_boundary(self):
+        self.assertIsNone(archive.archive_boundary())
+        # Another worker archives January and February.
+        ArchivedMonth.objects.bulk_create([ArchivedMonth(month=date(2025, 1, 1)), ArchivedMonth(month=date(2025, 2, 1))])
+        self.assertIsNone(archive.archive_boundary())
+        caching.bump_version(archive.VERSION_KEY)
+        self.assertEqual(archive.archive_boundary(), date(2025, 3, 1))
+        with self.assertRaises(archive.ArchivedDateError):
+            MealRecord.objects.toggle_meal(self.members[0], date(2025, 2, 10))
+
+    def test_price_change_rebills_archived_months(self):
+        archive.archive_before(date(2025, 4, 1))
+        price = MealPrice.objects.get(date=date(2025, 2, 15))
+        price.price_per_meal = Decimal('70')
+        price.save()
+
+        index = get_price_index()
+        expected = {
+            member.pk: sum(
+                (index.price_for(day) for day in ArchivedMealRecord.objects.filter(
+                    member=member, ate_meal=True, date__gte=date(2025, 2, 1), date__lt=date(2025, 4, 1)
+                ).values_list('date', flat=True)),
+                Decimal('0')
+            )
+            for member in self.members
+        }
+        totals = meal_totals(self.members, date(2025, 2, 1), date(2025, 3, 31))
+        self.assertEqual({member_id: bill for member_id, (_, bill) in totals.items()}, expected)
+
+    def test_command_archives_closed_months(self):
+        out = StringIO()
+        call_command('archive_meals', '--before=2025-03-01', '--dry-run', stdout=out)
+        self.assertIn('Would archive', out.getvalue())
+        self.assertFalse(ArchivedMealRecord.objects.exists())
+
+        call_command('archive_meals', '--before=2025-03-01', stdout=StringIO())
+        self.assertEqual(archive.archive_boundary(), date(2025, 3, 1))
+
+
+class MealWeekStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        archive.invalidate_boundary()
+        self.addCleanup(archive.invalidate_boundary)
+        self.members = [Member.objects.create(name="Regular"), Member.objects.create(name="Sometimes")]
+        MealPrice.objects.create(date=date(2025, 1, 1), price_per_meal=Decimal('50'))
+        MealPrice.objects.create(date=date(2025, 2, 15), price_per_meal=Decimal('60'))
+        self.start = date(2025, 1, 10)  # a Friday: the first week has one day
+        apply_meal_changes([
+            (member.pk, self.start + timedelta(days=offset), offset % (i + 2) != 0, 2 if offset % 9 == 0 else None)
+            for i, member in enumerate(self.members)
+            for offset in range(60)
+        ])
+
+    def history(self):
+        days = [self.start + timedelta(days=offset) for offset in range(0, 60, 5)]
+        grid = load_week_records(self.members, days)
+        return {
+            'grid': {
+                (member_id, day): (record.ate_meal, record.meal_count)
+                for member_id, records in grid.items()
+                for day, record in records.items()
+                if day in days
+            },
+            'totals': meal_totals(self.members, date(2025, 1, 20), date(2025, 3, 1)),
+            'meals': list(exports.meal_rows()),
+            'statements': list(exports.statement_rows(date(2025, 1, 1), date(2025, 3, 31), 'week')),
+        }
+
+    def test_converted_weeks_give_the_same_history(self):
+        before = self.history()
+        self.assertEqual(storage.convert('weeks'), 120)
+        self.assertFalse(MealRecord.objects.exists())
+        # One row per member-week; counts other than 1 are kept sparsely.
+        self.assertEqual(MealWeek.objects.count(), 2 * 10)
+        week = MealWeek.objects.get(member=self.members[0], week_start=date(2025, 1, 4))
+        self.assertEqual((week.present_mask, week.ate_mask, week.meal_counts), (0b1000000, 0, {'6': 2}))
+
+        with override_settings(MEAL_STORAGE='weeks'):
+            self.assertEqual(self.history(), before)
+        stray = MealRecord.objects.create(member=self.members[0], date=self.start)
+        with self.assertRaises(ValueError):
+            storage.convert('rows')
+        stray.delete()
+        self.assertEqual(storage.convert('rows'), 120)
+        self.assertEqual(self.history(), before)
+
+    @override_settings(MEAL_STORAGE='weeks')
+    def test_cell_writes_update_the_week_bits(self):
+        member = self.members[0]
+        day = Member.get_week_start() + timedelta(days=2)
+        self.assertTrue(MealRecord.objects.toggle_meal(member, day))
+        self.assertFalse(MealRecord.objects.toggle_meal(member.pk, day))
+        self.assertTrue(MealRecord.objects.set_meal(member, day, True))
+        self.assertFalse(MealRecord.objects.set_meal(member, day - timedelta(days=1), False))
+        records = apply_meal_changes([(member.pk, day, True, 3), (member.pk, day + timedelta(days=1), True, None)])
+        self.assertEqual(
+            sorted((record.date, record.ate_meal, record.meal_count) for record in records),
+            [(day, True, 3), (day + timedelta(days=1), True, 1)]
+        )
+        self.assertEqual(prepopulate([day, day + timedelta(days=2)], members=[member]), 1)
+
+        week = MealWeek.objects.get(member=member, week_start=Member.get_week_start())
+        self.assertEqual((week.present_mask, week.ate_mask, week.meal_counts), (0b11110, 0b01100, {'2': 3}))
+        self.assertFalse(MealRecord.objects.filter(date__gte=Member.get_week_start()).exists())
+        self.assertEqual(member.get_weekly_meals(), 2)
+
+        importer.import_csv('meals', StringIO(f"member_id,date,ate_meal,meal_count\n{member.pk},{day},no,1\n"))
+        week.refresh_from_db()
+        self.assertEqual((week.ate_mask, week.meal_counts), (0b01000, {}))
+
+    def test_admin_edits_meal_records_only_in_rows_storage(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        add_url = reverse('admin:tracker_mealrecord_add')
+        self.assertEqual(self.client.get(add_url).status_code, 200)
+        with override_settings(MEAL_STORAGE='weeks'):
+            self.assertEqual(self.client.get(add_url).status_code, 403)
+            record = MealRecord.objects.first()
+            response = self.client.post(
+                reverse('admin:tracker_mealrecord_change', args=[record.pk]),
+                {'member': record.member_id, 'date': record.date, 'ate_meal': 'on', 'meal_count': 5}
+            )
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(self.client.get(reverse('admin:tracker_mealrecord_changelist')).status_code, 200)
+
+    def test_archiving_takes_days_out_of_weeks(self):
+        storage.convert('weeks')
+        with override_settings(MEAL_STORAGE='weeks'):
+            before = self.history()
+            call_command('archive_meals', '--before=2025-02-01', '--dry-run', stdout=StringIO())
+            moved = archive.archive_before(date(2025, 2, 1))
+            self.assertEqual(moved, ArchivedMealRecord.objects.count())
+            self.assertEqual(moved, 2 * 22)
+            # The week of Feb 1 keeps its February days only.
+            week = MealWeek.objects.get(member=self.members[0], week_start=date(2025, 2, 1))
+            self.assertEqual(week.present_mask, 0b1111111)
+            self.assertFalse(MealWeek.objects.filter(week_start__lt=date(2025, 1, 25)).exists())
+            self.assertEqual(self.history(), before)
+
+
+class MealChangeFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.members = [Member.objects.create(name="Left"), Member.objects.create(name="Right")]
+        self.week_start = Member.get_week_start()
+        self.days = [self.week_start + timedelta(days=offset) for offset in range(7)]
+
+    def changes(self, since, **params):
+        response = self.client.get(reverse('daily_meals_changes'), {'since': since, 'week': self.week_start, **params})
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_feed_returns_changed_cells_of_the_week(self):
+        version = feed.current_version()
+        MealRecord.objects.toggle_meal(self.members[0], self.days[1])
+        apply_meal_changes([
+            (self.members[1].pk, self.days[2], True, 2),
+            (self.members[1].pk, self.week_start - timedelta(days=1), True, None),  # another week
+        ])
+
+        self.client.force_login(self.staff)
+        data = self.changes(version)
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['version'], feed.current_version())
+        self.assertEqual(data['cells'], [
+            {'member_id': self.members[0].pk, 'date': self.days[1].isoformat(), 'ate': True, 'meal_count': 1},
+            {'member_id': self.members[1].pk, 'date': self.days[2].isoformat(), 'ate': True, 'meal_count': 2},
+        ])
+
+        # Recent entries are re-sent below the version, in case of late commits.
+        self.assertEqual(len(self.changes(data['version'])['cells']), 2)
+        with mock.patch.object(feed, 'LATE_SECONDS', 0):
+            self.assertEqual(self.changes(data['version'])['cells'], [])
+
+    def test_members_and_stale_versions_reset_the_grid(self):
+        version = feed.current_version()
+        Member.objects.create(name="Joined")
+        self.assertTrue(feed.changes_since(version, self.days)['reset'])
+        self.assertFalse(feed.changes_since(feed.current_version(), self.days)['reset'])
+        self.assertTrue(feed.changes_since(feed.current_version() + 1, self.days)['reset'])
+
+        with mock.patch.object(feed, 'KEEP', 2), mock.patch.object(feed, 'PRUNE_EVERY', 1):
+            stale = feed.current_version()
+            for day in self.days[:4]:
+                MealRecord.objects.toggle_meal(self.members[0], day)
+        self.assertEqual(MealChange.objects.count(), 2)
+        self.assertTrue(feed.changes_since(stale, self.days)['reset'])
+
+    def test_page_and_requests(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('daily_meals'), {'render': 'server'})
+        self.assertContains(response, f"let feedVersion = {feed.current_version()};")
+        self.assertEqual(self.client.get(reverse('daily_meals_changes')).status_code, 400)
+        self.assertEqual(self.client.get(reverse('daily_meals_changes'), {'since': 0, 'week': self.days[1]}).status_code, 400)
+
+        self.client.force_login(User.objects.create_user('member', password='pw'))
+        self.assertEqual(self.client.get(reverse('daily_meals_changes'), {'since': 0}).status_code, 403)
+
+    def test_compact_grid(self):
+        MealRecord.objects.toggle_meal(self.members[1], self.days[0])
+        MealRecord.objects.toggle_meal(self.members[1], self.days[6])
+        Member.objects.create(name="Left", is_active=False)
+        version = feed.current_version()
+
+        self.client.force_login(self.staff)
+        data = json.loads(self.client.get(reverse('daily_meals_grid'), {'week': self.week_start}).content)
+        self.assertEqual(data, {
+            'success': True,
+            'version': version,
+            'week_start': self.week_start.isoformat(),
+            'dates': [day.isoformat() for day in self.days],
+            'members': [[self.members[0].pk, "Left"], [self.members[1].pk, "Right"]],
+            'ate': ['0000000', '1000001'],
+        })
+
+        # The cached grid follows toggles.
+        MealRecord.objects.toggle_meal(self.members[0], self.days[3])
+        data = json.loads(self.client.get(reverse('daily_meals_grid')).content)
+        self.assertEqual(data['ate'], ['0001000', '1000001'])
+        self.assertEqual(self.client.get(reverse('daily_meals_grid'), {'week': self.days[1]}).status_code, 400)
+
+        # Client rendering serves the page without the rows; ?render=server keeps them.
+        with override_settings(DAILY_MEALS_CLIENT_RENDER=True):
+            response = self.client.get(reverse('daily_meals'))
+            self.assertContains(response, reverse('daily_meals_grid'))
+            self.assertNotContains(response, 'data-member-id="%d"' % self.members[0].pk)
+            response = self.client.get(reverse('daily_meals'), {'render': 'server'})
+            self.assertContains(response, 'data-member-id="%d"' % self.members[0].pk)
+        with override_settings(DAILY_MEALS_CLIENT_RENDER=False):
+            self.assertContains(self.client.get(reverse('daily_meals')), 'data-member-id="%d"' % self.members[0].pk)
+
+        self.client.force_login(User.objects.create_user('member', password='pw'))
+        self.assertEqual(self.client.get(reverse('daily_meals_grid')).status_code, 403)
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    async def test_long_poll_waits_for_a_newer_version(self):
+        await self.async_client.aforce_login(self.staff)
+        cell = {'member_id': self.members[0].pk, 'date': self.days[3].isoformat(), 'ate': True, 'meal_count': 1}
+        polls = [
+            {'version': 5, 'reset': False, 'cells': [cell]},  # a late entry re-sent: keep waiting
+            {'version': 5, 'reset': False, 'cells': []},
+            {'version': 6, 'reset': False, 'cells': [cell]},
+        ]
+        with mock.patch.object(feed, 'changes_since', side_effect=polls) as changes_since, \
+                mock.patch.object(feed, 'POLL_INTERVAL', 0.01):
+            response = await self.async_client.get(
+                reverse('daily_meals_changes'), {'since': 5, 'week': self.week_start, 'wait': 5}
+            )
+        self.assertEqual(changes_since.call_count, 3)
+        self.assertEqual(json.loads(response.content), {'success': True, **polls[2]})
+
+        with mock.patch.object(feed, 'changes_since', return_value=polls[1]) as changes_since:
+            response = await self.async_client.get(reverse('daily_meals_changes'), {'since': 5, 'week': self.week_start})
+        self.assertEqual(changes_since.call_count, 1)  # no wait: answers at once
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+        self.staff = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.week_start = Member.get_week_start()
+
+    def run_import(self, kind, text, **options):
+        return importer.import_csv(kind, StringIO(text), **options)
+
+    def test_imports_every_kind_and_updates_derived_data(self):
+        self.run_import('members', "name,serial_number\nAsha,7\nBilal,\n")
+        self.run_import('prices', f"date,price_per_meal\n{self.week_start},45.50\n")
+        self.run_import('meals', (
+            "serial_number,date,ate_meal,meal_count\n"
+            f"7,{self.week_start},yes,\n"
+            f"8,{self.week_start},no,\n"
+            f"7,{self.week_start + timedelta(days=1)},1,2\n"
+        ))
+        result = self.run_import('payments', f"serial_number,amount,payment_date,note\n7,50,{self.week_start},cash\n")
+
+        self.assertTrue(result.committed)
+        asha = Member.objects.get(serial_number=7)
+        self.assertEqual(Member.objects.get(name="Bilal").serial_number, 8)
+        self.assertEqual(asha.get_weekly_meals(), 2)
+        self.assertEqual(asha.get_weekly_total_bill(), Decimal('91.00'))
+        self.assertEqual(asha.get_unpaid_balance(), Decimal('41.00'))
+
+    def test_existing_rows_are_updated(self):
+        member = Member.objects.create(name="Old name", serial_number=3)
+        MealRecord.objects.create(member=member, date=self.week_start, ate_meal=False)
+
+        self.run_import('members', "name,serial_number,is_active\nNew name,3,no\n")
+        self.run_import('meals', f"member_id,date,ate_meal\n{member.pk},{self.week_start},yes\n")
+
+        member.refresh_from_db()
+        self.assertEqual((member.name, member.is_active), ("New name", False))
+        self.assertTrue(MealRecord.objects.get(member=member, date=self.week_start).ate_meal)
+        self.assertEqual(Member.objects.count(), 1)
+
+    def test_invalid_rows_roll_back_unless_skipped(self):
+        Member.objects.create(name="Only", serial_number=1)
+        text = (
+            "serial_number,date,ate_meal\n"
+            f"1,{self.week_start},yes\n"
+            f"2,{self.week_start},yes\n"
+            "1,someday,yes\n"
+        )
+        result = self.run_import('meals', text)
+        self.assertFalse(result.committed)
+        self.assertEqual(result.errors, [
+            (3, "No member with serial number 2."),
+            (4, "date must be a date in YYYY-MM-DD format, not 'someday'."),
+        ])
+        self.assertFalse(MealRecord.objects.exists())
+
+        result = self.run_import('meals', text, skip_invalid=True)
+        self.assertEqual((result.committed, result.imported, result.error_count), (True, 1, 2))
+        self.assertEqual(MealRecord.objects.count(), 1)
+
+    def test_explicit_serials_in_later_chunks_keep_numbered_members(self):
+        with mock.patch.object(importer, 'CHUNK_SIZE', 2):
+            result = self.run_import('members', "name,serial_number\nA,\nB,\nC,1\nD,\n")
+
+        self.assertEqual((result.committed, result.imported), (True, 4))
+        self.assertEqual(
+            list(Member.objects.order_by('serial_number').values_list('serial_number', 'name')),
+            [(1, 'C'), (2, 'A'), (3, 'B'), (4, 'D')]
+        )
+
+    def test_missing_columns_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Missing CSV columns: price_per_meal."):
+            self.run_import('prices', "date\n2024-01-01\n")
+
+    def test_importers_must_parse_rows(self):
+        class Incomplete(importer._Importer):
+            model = Member
+
+        with self.assertRaises(TypeError):
+            Incomplete(['name'])
+
+    def test_upload_page_and_command(self):
+        self.client.force_login(self.staff)
+        upload = SimpleUploadedFile('members.csv', b"name\nUploaded\n")
+        response = self.client.post(reverse('import_data'), {'kind': 'members', 'file': upload, 'dry_run': '1'})
+        self.assertContains(response, "Dry run: 1 members rows")
+        self.assertFalse(Member.objects.exists())
+
+        upload = SimpleUploadedFile('members.csv', b"name\nUploaded\n")
+        response = self.client.post(reverse('import_data'), {'kind': 'members', 'file': upload})
+        self.assertContains(response, "Imported 1 members rows")
+        self.assertTrue(Member.objects.filter(name="Uploaded").exists())
+
+
+class GenerateDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+
+    def test_generates_every_kind_and_derived_data(self):
+        out = StringIO()
+        call_command('generate_data', members=3, years=0.1, end_date='2025-03-31', seed=1, stdout=out)
+
+        # 0.1 years is 36 days, from 2025-02-24: one record per member and day, a price every 30 days.
+        self.assertEqual(Member.objects.count(), 3)
+        self.assertEqual(MealRecord.objects.count(), 3 * 36)
+        self.assertEqual(list(MealPrice.objects.order_by('date').values_list('date', flat=True)), [
+            date(2025, 2, 24), date(2025, 3, 26),
+        ])
+        self.assertEqual(
+            out.getvalue().strip(),
+            f"Generated 3 members, 108 meal records, 2 prices and {Payment.objects.count()} payments "
+            "(2025-02-24 to 2025-03-31)."
+        )
+        self.assertTrue(Payment.objects.exists())
+        maintained = ledger_rows()
+        self.assertTrue(maintained)
+        ledger.rebuild()
+        self.assertEqual(ledger_rows(), maintained)
+
+
+class BenchmarkViewsTests(TransactionTestCase):
+    def test_writes_one_timing_per_view_and_size(self):
+        self.enterContext(mock.patch('tracker.benchmarks._git_commit', return_value='abc1234'))
+        path = f'{self.enterContext(tempfile.TemporaryDirectory())}/bench.json'
+        # The test database stands in for the scratch one.
+        with mock.patch('tracker.management.commands.benchmark_views.scratch_database', contextlib.nullcontext):
+            call_command('benchmark_views', sizes='2x0.02,3x0.02', repeat=1, output=path, stdout=StringIO())
+
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(
+            {key: report[key] for key in ('benchmark', 'commit', 'database', 'sizes', 'repeat', 'cache')},
+            {
+                'benchmark': 'views', 'commit': 'abc1234', 'database': connection.vendor,
+                'sizes': [[2, 0.02], [3, 0.02]], 'repeat': 1, 'cache': ['uncached', 'cached'],
+            }
+        )
+        self.assertEqual(
+            [(result['view'], result['members'], result['cache']) for result in report['results']],
+            [
+                (name, members, mode)
+                for members in (2, 3) for name, _, _ in benchmark_views.VIEWS for mode in ('uncached', 'cached')
+            ]
+        )
+        results = {(result['view'], result['members'], result['cache']): result for result in report['results']}
+        for result in report['results']:
+            self.assertEqual(result['runs'], 1)
+            self.assertGreater(result['bytes'], 0)
+            self.assertGreater(result['queries'], 0)
+            self.assertLessEqual(result['min_ms'], result['median_ms'])
+        # Uncached requests do the billing and grid work the cache skips.
+        for view in ('dashboard', 'daily_meals_grid', 'my_meals'):
+            self.assertGreater(results[view, 3, 'uncached']['queries'], results[view, 3, 'cached']['queries'], view)
+
+
+class DesktopLauncherTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_price_index()
+
+    def test_wait_until_ready(self):
+        with mock.patch.object(desktop_main, 'fetch', side_effect=[ConnectionRefusedError(), 503, 302]) as fetch, \
+                mock.patch.object(desktop_main.time, 'sleep'):
+            self.assertTrue(desktop_main.wait_until_ready(timeout=30))
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_wait_until_ready_gives_up_after_the_timeout(self):
+        clock = iter(range(0, 100, 4))  # seconds: each poll moves the clock on
+        with mock.patch.object(desktop_main, 'fetch', side_effect=ConnectionRefusedError()) as fetch, \
+                mock.patch.object(desktop_main.time, 'monotonic', side_effect=lambda: next(clock)), \
+                mock.patch.object(desktop_main.time, 'sleep'):
+            self.assertFalse(desktop_main.wait_until_ready(timeout=10))
+        self.assertEqual(fetch.call_count, 3)  # at 4, 8 and 12 seconds
+
+    def test_warm_up_survives_a_missing_server_and_database(self):
+        with mock.patch.object(desktop_main, 'fetch', side_effect=OSError("refused")) as fetch, \
+                mock.patch.object(caching, 'week_grid', side_effect=OperationalError("no such table")), \
+                mock.patch.object(caching, 'week_matrix', side_effect=OperationalError("no such table")), \
+                mock.patch.object(caching, 'week_summary') as week_summary:
+            desktop_main.warm_up()
+        # Every page is still tried; the summary is skipped with the grid.
+        self.assertEqual([call.args[0] for call in fetch.call_args_list], desktop_main.WARM_UP_PATHS)
+        week_summary.assert_not_called()
+
+    def test_warm_up_loads_the_week_and_pages(self):
+        with mock.patch.object(desktop_main, 'fetch', return_value=200) as fetch:
+            desktop_main.warm_up()
+        self.assertEqual(fetch.call_count, len(desktop_main.WARM_UP_PATHS))
+        with self.assertNumQueries(0):
+            caching.week_summary(Member.get_week_start())
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """The database profiles settings.py builds from the environment."""
+
+    def load_settings(self, **environ):
+        """Run settings.py with only ``environ`` among the DB_*/DJANGO_* variables."""
+        environ = {
+            **{key: value for key, value in os.environ.items() if not key.startswith(('DB_', 'DJANGO_'))},
+            **environ,
+        }
+        with mock.patch.dict(os.environ, environ, clear=True):
+            spec = importlib.util.spec_from_file_location('settings_under_test', project_settings.__file__)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        return module
+
+    def test_default_sqlite(self):
+        database = self.load_settings().DATABASES['default']
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertNotIn('OPTIONS', database)
+        self.assertNotIn('CONN_MAX_AGE', database)
+
+    def test_tuned_sqlite_profile(self):
+        database = self.load_settings(DJANGO_SQLITE_TUNED='true').DATABASES['default']
+        self.assertEqual((database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS']), (600, True))
+        self.assertEqual(database['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(
+            self.load_settings(DJANGO_SQLITE_TUNED='true', DJANGO_CONN_MAX_AGE='30').DATABASES['default']['CONN_MAX_AGE'],
+            30
+        )
+
+        # The PRAGMAs take effect on a real connection.
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = ConnectionHandler({'default': {}, 'tuned': dict(database, NAME=f'{tmp}/tuned.sqlite3')})
+            try:
+                with handler['tuned'].cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                handler.close_all()
+        # synchronous 1 is NORMAL, temp_store 2 is MEMORY.
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 10000, 'temp_store': 2})
+
+    def test_postgres_persistent_connections(self):
+        database = self.load_settings(DB_ENGINE='django.db.backends.postgresql', DB_HOST='pg').DATABASES['default']
+        self.assertEqual(
+            {key: database[key] for key in ('ENGINE', 'HOST', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')},
+            {'ENGINE': 'django.db.backends.postgresql', 'HOST': 'pg', 'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True}
+        )
+        self.assertNotIn('OPTIONS', database)
+
+        database = self.load_settings(
+            DB_ENGINE='django.db.backends.postgresql', DJANGO_CONN_MAX_AGE='0'
+        ).DATABASES['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+
+    def test_postgres_pool(self):
+        database = self.load_settings(
+            DB_ENGINE='django.db.backends.postgresql', DB_POOL='true', DJANGO_CONN_MAX_AGE='60',
+            DB_POOL_MIN_SIZE='4', DB_POOL_MAX_SIZE='20', DB_POOL_TIMEOUT='2.5',
+        ).DATABASES['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)  # Django rejects persistent connections with a pool
+        self.assertEqual(database['OPTIONS'], {'pool': {'min_size': 4, 'max_size': 20, 'timeout': 2.5}})
+
+        database = self.load_settings(DB_ENGINE='django.db.backends.postgresql', DB_POOL='true').DATABASES['default']
+        self.assertEqual(database['OPTIONS'], {'pool': {'min_size': 2, 'max_size': 10, 'timeout': 10.0}})
@@ -1,23 +1,36 @@
+from django.conf import settings
 from django.urls import path, reverse_lazy
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.decorators import login_required
-from . import views
+from . import async_views, views
 
-urlpatterns = [
-    path('signup/', views.admin_signup, name='admin_signup'),
-    path('login/', views.login_view, name='login'),
-    path('logout/', views.logout_view, name='logout'),
-    path('password/change/', login_required(auth_views.PasswordChangeView.as_view(
-        template_name='password_change.html',
-        success_url=reverse_lazy('password_change_done')
-    )), name='password_change'),
-    path('password/change/done/', login_required(auth_views.PasswordChangeDoneView.as_view(
-        template_name='password_change_done.html'
-    )), name='password_change_done'),
-    path('me/', views.my_meals, name='my_meals'),
-    path('', views.dashboard, name='dashboard'),
-    path('daily-meals/', views.daily_meals, name='daily_meals'),
-    path('manage-price/', views.manage_price, name='manage_price'),
-    path('manage-payments/', views.manage_payments, name='manage_payments'),
-    path('manage-members/', views.manage_members, name='manage_members'),
-]
+
+def build_urlpatterns(hot_views):
+    """Return the app's URL patterns, taking the busiest pages from ``hot_views``."""
+    return [
+        path('signup/', views.admin_signup, name='admin_signup'),
+        path('login/', views.login_view, name='login'),
+        path('logout/', views.logout_view, name='logout'),
+        path('password/change/', login_required(auth_views.PasswordChangeView.as_view(
+            template_name='password_change.html',
+            success_url=reverse_lazy('password_change_done')
+        )), name='password_change'),
+        path('password/change/done/', login_required(auth_views.PasswordChangeDoneView.as_view(
+            template_name='password_change_done.html'
+        )), name='password_change_done'),
+        path('me/', hot_views.my_meals, name='my_meals'),
+        path('', hot_views.dashboard, name='dashboard'),
+        path('daily-meals/', hot_views.daily_meals, name='daily_meals'),
+        path('daily-meals/batch/', views.daily_meals_batch, name='daily_meals_batch'),
+        path('daily-meals/grid/', hot_views.daily_meals_grid, name='daily_meals_grid'),
+        path('daily-meals/changes/', hot_views.daily_meals_changes, name='daily_meals_changes'),
+        path('manage-price/', views.manage_price, name='manage_price'),
+        path('manage-payments/', views.manage_payments, name='manage_payments'),
+        path('manage-members/', views.manage_members, name='manage_members'),
+        path('import/', views.import_data, name='import_data'),
+        path('metrics/', views.metrics, name='metrics'),
+        path('export/<str:kind>/', views.export_data, name='export_data'),
+    ]
+
+
+urlpatterns = build_urlpatterns(async_views if settings.ASYNC_VIEWS else views)
@@ -1,12 +1,25 @@
+import hashlib
+import io
+import json
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import date, timedelta
+from . import archive, billing, caching, exports, feed, grid, importer
+from .routers import reporting_iterator, reporting_view
+from .metrics import registry as metrics_registry
 from .models import Member, MealPrice, MealRecord, Payment
 
 
@@ -118,58 +131,84 @@ def logout_view(request):
     return redirect('login')
 
 
-@login_required
-def my_meals(request):
-    """Allow a user to view and set their own meal decision before 10:30 AM."""
-    member = getattr(request.user, 'member_profile', None)
-    today = timezone.localdate()
+def _meal_deadline():
+    """Return ``(now, deadline, locked)`` for today's 10:30 AM cutoff."""
     now = timezone.localtime()
     deadline = now.replace(hour=10, minute=30, second=0, microsecond=0)
-    locked = now >= deadline
+    return now, deadline, now >= deadline
 
-    if request.method == 'POST':
-        if not member:
-            messages.error(request, "Your account is not linked to a member. Please contact an admin.")
-            return redirect('my_meals')
 
-        if locked:
-            messages.error(request, "Changes are locked after 10:30 AM.")
-            return redirect('my_meals')
+def _my_meals_etag(request):
+    """
+    ETag for the member's own page, derived from their data version and the
+    minute it shows as the current time.
 
-        decision = request.POST.get('decision')
-        if decision not in ('eat', 'skip'):
-            messages.error(request, "Invalid meal selection.")
-            return redirect('my_meals')
+    Skipped when the page must be rendered anyway (pending flash messages,
+    non-GET requests or users without a member profile).
+    """
+    return _my_meals_etag_for(request, getattr(request.user, 'member_profile', None))
 
-        record, _ = MealRecord.objects.get_or_create(member=member, date=today)
-        record.ate_meal = decision == 'eat'
-        record.save()
-        status_label = "eating" if record.ate_meal else "skipping"
-        messages.success(request, f"You are marked as {status_label} today.")
-        return redirect('my_meals')
 
-    today_record = None
-    if member:
-        today_record = MealRecord.objects.filter(member=member, date=today).first()
+def _my_meals_etag_for(request, member):
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None
+    if member is None:
+        return None
+
+    global_version, member_version = caching.member_versions(member.pk)
+    now, _, locked = _meal_deadline()
+    get_token(request)  # the page embeds a CSRF token; make sure its secret exists
+    # The page shows the current time to the minute.
+    raw = ':'.join(str(part) for part in (
+        member.pk, global_version, member_version, now.date(), now.strftime('%H%M'), locked,
+        request.META['CSRF_COOKIE'],
+    ))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _my_meals_decision(request, member, locked):
+    """Validate a my_meals POST; returns ``'eat'``/``'skip'``, or ``None`` after flashing why not."""
+    if not member:
+        messages.error(request, "Your account is not linked to a member. Please contact an admin.")
+        return None
+
+    if locked:
+        messages.error(request, "Changes are locked after 10:30 AM.")
+        return None
+
+    decision = request.POST.get('decision')
+    if decision not in ('eat', 'skip'):
+        messages.error(request, "Invalid meal selection.")
+        return None
+    return decision
 
+
+def _my_meals_saved(request, ate_meal):
+    status_label = "eating" if ate_meal else "skipping"
+    messages.success(request, f"You are marked as {status_label} today.")
+    return redirect('my_meals')
+
+
+def _my_meals_context(member, today):
+    """Template context for ``my_meals.html`` (week data cached per member)."""
+    now, deadline, locked = _meal_deadline()
     week_start = Member.get_week_start(today)
-    week_days = [week_start + timedelta(days=i) for i in range(7)]
-    week_records = {}
-    if member:
-        week_records = {
-            rec.date: rec
-            for rec in MealRecord.objects.filter(
-                member=member,
-                date__gte=week_start,
-                date__lte=week_start + timedelta(days=6)
-            )
-        }
+    week_days = grid.week_days(week_start)
+
+    def build_week():
+        # One range query for the week (today included) plus the summary.
+        records = grid.load_week_records([member], week_days).get(member.pk, {})
+        return {'records': records, 'summary': billing.member_summary(member, week_start)}
+
+    week = caching.member_week(member, week_start, build_week) if member else None
+    week_records = week['records'] if week else {}
+    summary = week['summary'] if week else None
     week_rows = [{'date': day, 'record': week_records.get(day)} for day in week_days]
 
-    context = {
+    return {
         'member': member,
         'today': today,
-        'today_record': today_record,
+        'today_record': week_records.get(today),
         'locked': locked,
         'deadline': deadline,
         'current_time': now,
@@ -178,64 +217,97 @@ def my_meals(request):
         'week_days': week_days,
         'week_records': week_records,
         'week_rows': week_rows,
-        'week_meals': member.get_weekly_meals(week_start) if member else 0,
-        'week_total': member.get_weekly_total_bill(week_start) if member else 0,
-        'unpaid_balance': member.get_unpaid_balance(week_start) if member else 0,
+        'week_meals': summary['meals'] if summary else 0,
+        'week_total': summary['total_bill'] if summary else 0,
+        'unpaid_balance': summary['unpaid'] if summary else 0,
         'price_today': MealPrice.get_price_for_date(today) if member else 0,
     }
 
-    return render(request, 'my_meals.html', context)
+
+def _my_meals_response(request, context):
+    response = render(request, 'my_meals.html', context)
+    # Let browsers keep the page but revalidate it with If-None-Match every time.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
-def dashboard(request):
-    """Main dashboard showing weekly summary"""
-    redirect_resp = _redirect_non_staff(request)
-    if redirect_resp:
-        return redirect_resp
+@condition(etag_func=_my_meals_etag)
+def my_meals(request):
+    """Allow a user to view and set their own meal decision before 10:30 AM."""
+    member = getattr(request.user, 'member_profile', None)
+    today = timezone.localdate()
+    _, _, locked = _meal_deadline()
+
+    if request.method == 'POST':
+        decision = _my_meals_decision(request, member, locked)
+        if decision is None:
+            return redirect('my_meals')
+        return _my_meals_saved(request, MealRecord.objects.set_meal(member, today, decision == 'eat'))
 
+    return _my_meals_response(request, _my_meals_context(member, today))
+
+
+def _dashboard_context():
     # Get current week start (Saturday)
     today = date.today()
     week_start = Member.get_week_start(today)
     week_end = week_start + timedelta(days=6)
     
-    # Get all active members
-    members = Member.objects.filter(is_active=True)
-    
-    # Prepare data for each member
-    member_data = []
-    for member in members:
-        meals = member.get_weekly_meals(week_start)
-        total_bill = member.get_weekly_total_bill(week_start)
-        paid = member.get_total_paid()
-        unpaid = total_bill - paid
-        
-        member_data.append({
-            'serial': member.serial_number,
-            'name': member.name,
-            'meals': meals,
-            'total_bill': total_bill,
-            'paid': paid,
-            'unpaid': unpaid
-        })
+    # Summarize all active members (cached until the week's data changes)
+    member_data = caching.week_summary(week_start)
     
-    context = {
+    return {
         'member_data': member_data,
         'week_start': week_start,
         'week_end': week_end,
         'today': today
     }
-    
-    return render(request, 'dashboard.html', context)
 
 
 @login_required
-def daily_meals(request):
-    """Interface for marking daily meals"""
+@reporting_view
+def dashboard(request):
+    """Main dashboard showing weekly summary"""
     redirect_resp = _redirect_non_staff(request)
     if redirect_resp:
         return redirect_resp
 
+    return render(request, 'dashboard.html', _dashboard_context())
+
+
+def _toggle_cell(request):
+    """Parse a daily_meals toggle POST into ``(member_id, date)``, or ``None``."""
+    member_id = request.POST.get('member_id')
+    meal_date = request.POST.get('date')
+    if member_id and meal_date:
+        return member_id, date.fromisoformat(meal_date)
+    return None
+
+
+def _toggled(request, member, meal_date, ate_meal):
+    # Check if this is an AJAX request
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        # Return JSON response for AJAX
+        return JsonResponse({
+            'success': True,
+            'ate': ate_meal,
+            'message': f"Updated meal for {member.name} on {meal_date.strftime('%b %d, %Y')}"
+        })
+    else:
+        # Traditional form submission - redirect with message
+        messages.success(request, f"Updated meal for {member.name} on {meal_date}")
+        return redirect('daily_meals')
+
+
+def _toggle_refused(request, error):
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({'success': False, 'error': str(error)}, status=400)
+    messages.error(request, str(error))
+    return redirect('daily_meals')
+
+
+def _daily_meals_context(request):
     # Get week offset from URL parameter (0 = current week, -1 = previous, +1 = next)
     week_offset = int(request.GET.get('week', 0))
     
@@ -245,71 +317,188 @@ def daily_meals(request):
     week_start = current_week_start + timedelta(weeks=week_offset)
     
     # Generate 7 days of the week
-    week_days = [week_start + timedelta(days=i) for i in range(7)]
-    
-    # Get all active members
-    members = Member.objects.filter(is_active=True)
-    
-    # Prepare meal records matrix
-    meal_matrix = []
-    for member in members:
-        row = {'member': member, 'meals': []}
-        for day in week_days:
-            try:
-                record = MealRecord.objects.get(member=member, date=day)
-            except MealRecord.DoesNotExist:
-                record = None
-            row['meals'].append({
-                'date': day,
-                'record': record,
-                'ate': record.ate_meal if record else False
-            })
-        meal_matrix.append(row)
+    week_days = grid.week_days(week_start)
     
-    # Handle POST request (toggling meal status)
-    if request.method == 'POST':
-        member_id = request.POST.get('member_id')
-        meal_date = request.POST.get('date')
-        
-        if member_id and meal_date:
-            member = get_object_or_404(Member, id=member_id)
-            meal_date = date.fromisoformat(meal_date)
-            
-            # Toggle meal status
-            record, created = MealRecord.objects.get_or_create(
-                member=member,
-                date=meal_date,
-                defaults={'ate_meal': True}
-            )
-            
-            if not created:
-                record.ate_meal = not record.ate_meal
-                record.save()
-            
-            # Check if this is an AJAX request
-            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                # Return JSON response for AJAX
-                return JsonResponse({
-                    'success': True,
-                    'ate': record.ate_meal,
-                    'message': f"Updated meal for {member.name} on {meal_date.strftime('%b %d, %Y')}"
-                })
-            else:
-                # Traditional form submission - redirect with message
-                messages.success(request, f"Updated meal for {member.name} on {meal_date}")
-                return redirect('daily_meals')
+    # The browser renders the rows from the compact JSON grid unless asked
+    # for server rendering (the fallback when the JSON can't be loaded).
+    client_render = request.GET.get(
+        'render', 'client' if settings.DAILY_MEALS_CLIENT_RENDER else 'server'
+    ) != 'server'
+    feed_version = meal_matrix = None
+    if not client_render:
+        # Read the feed version first: changes made while the grid loads are
+        # replayed by the page's first poll.
+        feed_version = feed.current_version()
+
+        # Load the whole week in one query and pivot it into member rows
+        # (cached until the week's data changes)
+        meal_matrix = caching.week_matrix(week_start)
     
-    context = {
+    return {
         'week_days': week_days,
         'meal_matrix': meal_matrix,
+        'client_render': client_render,
+        'render_query': '' if 'render' not in request.GET else f"&render={'client' if client_render else 'server'}",
         'week_start': week_start,
         'week_end': week_start + timedelta(days=6),
         'today': today,
         'week_offset': week_offset,
-        'is_current_week': week_offset == 0
+        'is_current_week': week_offset == 0,
+        'feed_version': feed_version,
     }
-    
-    return render(request, 'daily_meals.html', context)
+
+
+@login_required
+def daily_meals(request):
+    """Interface for marking daily meals"""
+    redirect_resp = _redirect_non_staff(request)
+    if redirect_resp:
+        return redirect_resp
+
+    # Handle POST request (toggling meal status) before any grid work
+    if request.method == 'POST':
+        cell = _toggle_cell(request)
+        if cell:
+            member = get_object_or_404(Member, id=cell[0])
+            # Toggle meal status in one atomic statement (a new cell becomes eating)
+            try:
+                ate_meal = MealRecord.objects.toggle_meal(member, cell[1])
+            except archive.ArchivedDateError as exc:
+                return _toggle_refused(request, exc)
+            return _toggled(request, member, cell[1], ate_meal)
+
+    return render(request, 'daily_meals.html', _daily_meals_context(request))
+
+
+@login_required
+@require_POST
+def daily_meals_batch(request):
+    """Apply many meal cell changes at once and return the new cell states."""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': "Admin access required."}, status=403)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+        raw_changes = payload.get('changes', [])
+        if not isinstance(raw_changes, list):
+            raise ValueError
+        if len(raw_changes) > grid.MAX_BATCH_CHANGES:
+            return JsonResponse({
+                'success': False,
+                'error': f"At most {grid.MAX_BATCH_CHANGES} changes per request."
+            }, status=400)
+
+        changes = []
+        for change in raw_changes:
+            if not isinstance(change.get('ate_meal'), bool):
+                raise ValueError
+            meal_count = change.get('meal_count')
+            if meal_count is not None:
+                meal_count = int(meal_count)
+                if meal_count < 0:
+                    raise ValueError
+            changes.append((
+                int(change['member_id']),
+                date.fromisoformat(change['date']),
+                change['ate_meal'],
+                meal_count
+            ))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'success': False, 'error': "Invalid changes payload."}, status=400)
+
+    member_ids = {member_id for member_id, _, _, _ in changes}
+    known_ids = set(Member.objects.filter(id__in=member_ids).values_list('id', flat=True))
+    if member_ids - known_ids:
+        return JsonResponse({
+            'success': False,
+            'error': "Unknown member ids.",
+            'member_ids': sorted(member_ids - known_ids)
+        }, status=400)
+
+    try:
+        records = grid.apply_meal_changes(changes)
+    except archive.ArchivedDateError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    return JsonResponse({
+        'success': True,
+        'updated': len(records),
+        'cells': [
+            {
+                'member_id': record.member_id,
+                'date': record.date.isoformat(),
+                'ate': record.ate_meal,
+                'meal_count': record.meal_count,
+            }
+            for record in records
+        ],
+        'message': f"Updated {len(records)} meal{'s' if len(records) != 1 else ''}"
+    })
+
+
+def _requested_week(request):
+    """The Saturday in ``?week=YYYY-MM-DD`` (default: this week); ``ValueError`` otherwise."""
+    if 'week' not in request.GET:
+        return Member.get_week_start()
+    week_start = date.fromisoformat(request.GET['week'])
+    if week_start != Member.get_week_start(week_start):
+        raise ValueError
+    return week_start
+
+
+def _daily_meals_grid(week_start):
+    """The compact week grid plus the feed version it is current as of."""
+    # Version first: changes made while the grid loads are replayed by the
+    # page's first poll.
+    version = feed.current_version()
+    return {'success': True, 'version': version, 'week_start': week_start.isoformat(), **caching.week_grid(week_start)}
+
+
+@login_required
+def daily_meals_grid(request):
+    """
+    The week grid as compact JSON for client-side rendering: ``dates``,
+    ``members`` (``[id, name]``) and one ``ate`` bit string per member.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': "Admin access required."}, status=403)
+    try:
+        week_start = _requested_week(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': "Expected week=<Saturday>."}, status=400)
+    return JsonResponse(_daily_meals_grid(week_start))
+
+
+def _meal_changes_request(request):
+    """
+    Parse a change feed request: ``(since, week_start, wait)`` or an error
+    ``JsonResponse``. ``week`` is the week's Saturday (default: this week).
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': "Admin access required."}, status=403)
+    try:
+        since = int(request.GET['since'])
+        week_start = _requested_week(request)
+        wait = min(max(float(request.GET.get('wait', 0)), 0), feed.MAX_WAIT)
+        if since < 0:
+            raise ValueError
+    except (KeyError, ValueError):
+        return JsonResponse({'success': False, 'error': "Expected since=<version> and week=<Saturday>."}, status=400)
+    return since, week_start, wait
+
+
+@login_required
+def daily_meals_changes(request):
+    """
+    Cells of one week changed since a feed version (``tracker.feed``).
+
+    Answers at once; the async variant can hold the request open for up to
+    ``wait`` seconds until something changes (long poll).
+    """
+    parsed = _meal_changes_request(request)
+    if isinstance(parsed, JsonResponse):
+        return parsed
+    since, week_start, _ = parsed
+    return JsonResponse({'success': True, **feed.changes_since(since, grid.week_days(week_start))})
 
 
 @login_required
@@ -325,14 +514,17 @@ def manage_price(request):
         
         if price_date and price_amount:
             price_date = date.fromisoformat(price_date)
-            price_obj, created = MealPrice.objects.get_or_create(
-                date=price_date,
-                defaults={'price_per_meal': price_amount}
-            )
-            
+            # The price and the ledger weeks it re-bills commit together.
+            with transaction.atomic():
+                price_obj, created = MealPrice.objects.get_or_create(
+                    date=price_date,
+                    defaults={'price_per_meal': price_amount}
+                )
+
+                if not created:
+                    price_obj.price_per_meal = price_amount
+                    price_obj.save()
             if not created:
-                price_obj.price_per_meal = price_amount
-                price_obj.save()
                 messages.success(request, f"Updated price for {price_date}")
             else:
                 messages.success(request, f"Added price for {price_date}")
@@ -367,22 +559,25 @@ def manage_payments(request):
             member = get_object_or_404(Member, id=member_id)
             payment_date = date.fromisoformat(payment_date) if payment_date else date.today()
             
-            Payment.objects.create(
-                member=member,
-                amount=amount,
-                payment_date=payment_date,
-                note=note
-            )
+            # The payment and its ledger week commit together.
+            with transaction.atomic():
+                Payment.objects.create(
+                    member=member,
+                    amount=amount,
+                    payment_date=payment_date,
+                    note=note
+                )
             
             messages.success(request, f"Payment recorded for {member.name}")
             return redirect('manage_payments')
     
-    # Get all members and recent payments
-    members = Member.objects.filter(is_active=True)
-    recent_payments = Payment.objects.all()[:20]
+    # Get all members (with their balances) and recent payments
+    members = list(Member.objects.filter(is_active=True))
+    recent_payments = Payment.objects.select_related('member')[:20]
     
     context = {
         'members': members,
+        'member_balances': billing.weekly_summary(members, Member.get_week_start(date.today())),
         'recent_payments': recent_payments,
         'today': date.today()
     }
@@ -416,6 +611,19 @@ def manage_members(request):
                 member.save()
                 messages.success(request, f"Added member: {member.name} (#{member.serial_number})")
         
+        elif action == 'bulk_add':
+            names = [line.strip() for line in request.POST.get('names', '').splitlines() if line.strip()]
+            max_length = Member._meta.get_field('name').max_length
+            too_long = [name for name in names if len(name) > max_length]
+            if too_long:
+                messages.error(request, f"Names must be at most {max_length} characters; nothing was added.")
+            elif names:
+                members = Member.objects.add_members(names)
+                messages.success(
+                    request,
+                    f"Added {len(members)} members (#{members[0].serial_number}-#{members[-1].serial_number})"
+                )
+
         elif action == 'edit':
             member_id = request.POST.get('member_id')
             new_name = request.POST.get('name')
@@ -437,11 +645,89 @@ def manage_members(request):
         
         return redirect('manage_members')
     
-    # Get all members
-    all_members = Member.objects.all()
+    # Get all members with this week's meals and their total payments
+    all_members = list(Member.objects.all())
+    week_totals = billing.week_totals(all_members, Member.get_week_start(date.today()))
+    paid_totals = billing.paid_totals(all_members)
+    for member in all_members:
+        member.weekly_meals = week_totals.get(member.pk, (0, billing.ZERO))[0]
+        member.total_paid = paid_totals.get(member.pk, billing.ZERO)
     
     context = {
         'members': all_members
     }
     
     return render(request, 'manage_members.html', context)
+
+
+@login_required
+def import_data(request):
+    """Upload CSV files of members, prices, meals or payments"""
+    redirect_resp = _redirect_non_staff(request)
+    if redirect_resp:
+        return redirect_resp
+
+    result = None
+    if request.method == 'POST':
+        kind = request.POST.get('kind')
+        upload = request.FILES.get('file')
+        if kind not in importer.IMPORTERS or upload is None:
+            messages.error(request, "Choose what to import and a CSV file.")
+            return redirect('import_data')
+
+        try:
+            result = importer.import_csv(
+                kind,
+                io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                skip_invalid=bool(request.POST.get('skip_invalid')),
+                dry_run=bool(request.POST.get('dry_run'))
+            )
+        except (ValueError, UnicodeDecodeError) as exc:
+            messages.error(request, f"Could not import {upload.name}: {exc}")
+            return redirect('import_data')
+
+        if result.committed:
+            messages.success(request, f"Imported {result.imported} {kind} rows from {upload.name}.")
+        elif result.error_count:
+            messages.error(request, f"Nothing was imported: {result.error_count} invalid rows in {upload.name}.")
+        else:
+            messages.info(request, f"Dry run: {result.imported} {kind} rows in {upload.name} are valid.")
+
+    context = {
+        'kinds': sorted(importer.IMPORTERS),
+        'result': result,
+    }
+    return render(request, 'import_data.html', context)
+
+
+@login_required
+def metrics(request):
+    """Request metrics in the Prometheus text format (staff only)."""
+    if not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@login_required
+def export_data(request, kind):
+    """
+    Stream meal records, payments or member statements as CSV or JSON (staff only).
+
+    Query parameters: ``start`` and ``end`` (YYYY-MM-DD, optional), ``format``
+    (``csv`` or ``json``) and, for statements, ``period`` (``month`` or ``week``).
+    """
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+    fmt = request.GET.get('format', 'csv')
+    try:
+        start_date = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        end_date = date.fromisoformat(request.GET['end']) if request.GET.get('end') else None
+        chunks = exports.export(kind, fmt, start_date, end_date, request.GET.get('period', 'month'))
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    response = StreamingHttpResponse(reporting_iterator(chunks), content_type=f'{exports.FORMATS[fmt]}; charset=utf-8')
+    span = '_'.join(day.isoformat() for day in (start_date, end_date) if day) or 'all'
+    response['Content-Disposition'] = f'attachment; filename="{kind}_{span}.{fmt}"'
+    return response